@@ -1,78 +1,279 @@
+import asyncio
 import logging
 import os
+import signal
 import threading
 import time
-from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
 from flask import Flask
-from config import Config
-from routes import secrets_bp, health_bp
+from config import CONFIG_FILE, SECRETS_FILE, Config
+from routes import secrets_bp, health_bp, install_fast_path, metrics_bp
+from services.config_watcher import RELOAD_ENABLED, ConfigWatcher
+from services.log_writer import BatchFlushingFileHandler, QueueLogWriter
+from services.metrics import metrics
+from services.profiling import (
+    PROFILE_ENABLED,
+    PROFILE_REQUESTS,
+    Profiler,
+    init_request_profiling,
+)
+from services.rate_limit import FailureLimiter
+from services.readiness import Readiness
+from services.startup import StartupPipeline
 from services.token_service import TokenService
 
 DEV_MODE = os.environ.get("DEV_MODE", "false").lower() == "true"
+# 1より大きい場合はワーカープロセスを fork して処理する（server.PreforkServer）
+WORKERS = int(os.environ.get("WORKERS", "1"))
+# 同一ホストの利用者向けに Unix ドメインソケットでも待ち受ける（LISTEN_TCP=false で TCP を無効化）
+UNIX_SOCKET = os.environ.get("UNIX_SOCKET")
+UNIX_SOCKET_MODE = int(os.environ.get("UNIX_SOCKET_MODE", "660"), 8)
+LISTEN_TCP = os.environ.get("LISTEN_TCP", "true").lower() == "true"
+# 接続ごとにスレッドを使わず、一つのイベントループで待ち受ける（asgi.AsyncHTTPServer。WORKERS は無視される）
+ASYNC_SERVER = os.environ.get("ASYNC_SERVER", "false").lower() == "true"
 
 def create_app() -> Flask:
-    """Flaskアプリケーションのファクトリ."""
-    # 設定の読み込み
-    Config.load_app_config()
-    
-    app = Flask(__name__)
+    """Flaskアプリケーションのファクトリ.
 
-    # ブループリントの登録
-    app.register_blueprint(health_bp)
-    app.register_blueprint(secrets_bp)
+    鍵導出と復号はバックグラウンドで実行し、その間に Flask・ログ・トークンの準備を進めます。
+    復号の完了を待ってから返すため、リクエストの受け付けは全ての準備が整った後になります。
+
+    PROFILE=true の場合、起動処理と最初の PROFILE_REQUESTS 件のリクエストのプロファイルを
+    LOG_DIR に書き出します（services.profiling）。それ以外の場合、秘密情報ルートへのリクエストは
+    Flask のディスパッチを経由しない高速パスで処理します（routes.fast_path）。
+
+    RELOAD_CONFIG=true の場合、config.yaml と暗号化ファイルの変更を監視し、
+    変更された値のみを復号して設定を置き換えます（services.config_watcher）。"""
+    # 異常終了した前回のプロセスの完了マーカーとトークンファイルを、新しいバッチの公開前に片付ける
+    TokenService.remove_stale_batch()
+    profiler = Profiler("startup", enabled=PROFILE_ENABLED)
+    with profiler.profile():
+        app = _build_app(profiler)
+
+    if profiler.enabled:
+        log_dir = app.extensions["log_dir"]
+        report_file = profiler.dump(log_dir, Config.sensitive_values())
+        app.logger.info(f"Startup profile written: {report_file}")
+        init_request_profiling(app, log_dir, PROFILE_REQUESTS, Config.sensitive_values)
+    else:
+        # リクエストのプロファイルは Flask のフックで取得するため、プロファイリング中は高速パスを使わない
+        install_fast_path(app)
+    return app
+
+def _build_app(profiler: Profiler) -> Flask:
+    """設定の読み込みからトークンの生成までを行い、Flaskアプリケーションを返す."""
+    pipeline = StartupPipeline()
+    readiness = Readiness()
+    if RELOAD_ENABLED:
+        # 初回の再読み込みから、変更された値のみを復号できるよう復号結果を保持する
+        Config.enable_reload()
+
+    # 設定の読み込み（機密情報の復号はバックグラウンドで並行実行）
+    with pipeline.phase("config"):
+        Config.load_base_config()
+    if Config.CONFIG_LOADED:
+        readiness.mark_ready("config")
+    else:
+        readiness.mark_failed("config", "config.yaml could not be loaded")
+
+    def load_secrets() -> None:
+        Config.load_secrets()
+        missing = Config.missing_secrets()
+        if missing:
+            readiness.mark_failed("secrets", f"unavailable: {', '.join(missing)}")
+        else:
+            readiness.mark_ready("secrets")
+
+    pipeline.run_in_background("secrets", profiler.wrap(load_secrets))
+
+    with pipeline.phase("flask"):
+        app = Flask(__name__)
+        app.extensions["readiness"] = readiness
+        app.extensions["auth_limiter"] = FailureLimiter()
+
+        # ブループリントの登録（メトリクスは全てのリクエストの処理時間を記録するため最初に登録）
+        app.register_blueprint(metrics_bp)
+        app.register_blueprint(health_bp)
+        app.register_blueprint(secrets_bp)
 
     # ログ設定
-    log_dir = Path(os.environ.get("LOG_DIR", "/app/logs"))
-    try:
-        log_dir.mkdir(parents=True, exist_ok=True)
-    except PermissionError:
-        # ローカル環境などで /app に権限がない場合のフォールバック
-        log_dir = Path("logs")
-        log_dir.mkdir(parents=True, exist_ok=True)
-    
-    file_handler = RotatingFileHandler(
-        log_dir / "secrets.log", maxBytes=10 * 1024 * 1024, backupCount=5
-    )
-    file_handler.setFormatter(logging.Formatter(
-        "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"
-    ))
-    app.logger.addHandler(file_handler)
-    app.logger.setLevel(logging.INFO)
-
-    # 起動時にトークンを生成
-    with app.app_context(): # アプリケーションコンテキスト内で実行
-        TokenService.generate_tokens()
+    with pipeline.phase("logging"):
+        log_dir = Path(os.environ.get("LOG_DIR", "/app/logs"))
+        try:
+            log_dir.mkdir(parents=True, exist_ok=True)
+        except PermissionError:
+            # ローカル環境などで /app に権限がない場合のフォールバック
+            log_dir = Path("logs")
+            log_dir.mkdir(parents=True, exist_ok=True)
+        app.extensions["log_dir"] = log_dir
+
+        file_handler = BatchFlushingFileHandler(
+            log_dir / "secrets.log", maxBytes=10 * 1024 * 1024, backupCount=5
+        )
+        file_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"
+        ))
+        # ファイルへの書き込みはバックグラウンドで行い、リクエスト処理をディスクI/Oで待たせない
+        log_writer = QueueLogWriter(file_handler)
+        log_writer.start()
+        app.extensions["log_writer"] = log_writer
+        app.logger.addHandler(log_writer.queue_handler())
+        app.logger.setLevel(logging.INFO)
+
+    # 起動時にトークンを生成（サービス定義のみに依存し、復号済みの機密情報には依存しない）
+    with pipeline.phase("tokens"), app.app_context(): # アプリケーションコンテキスト内で実行
+        try:
+            TokenService.generate_tokens()
+        except OSError as e:
+            readiness.mark_failed("tokens", str(e))
+            raise
+        readiness.mark_ready("tokens")
         app.logger.info("One-time tokens generated successfully.")
 
+    # 復号の完了を待ってからリクエストを受け付ける
+    pipeline.join()
+    app.logger.info(f"Startup completed: {pipeline.summary()}")
+    app.extensions["startup_timings"] = dict(pipeline.timings)
+    metrics.set_phases(pipeline.timings)
+
+    if RELOAD_ENABLED:
+        watcher = ConfigWatcher([CONFIG_FILE, SECRETS_FILE], lambda: _reload_config(app))
+        watcher.start()
+        app.extensions["config_watcher"] = watcher
+        app.logger.info("Watching configuration files for changes.")
+
     return app
 
+def _reload_config(app: Flask) -> None:
+    """設定ファイルの変更を反映する（ConfigWatcher から呼ばれる）."""
+    started_at = time.perf_counter()
+    try:
+        reloaded = Config.reload()
+    except Exception:
+        app.logger.exception("Failed to reload configuration.")
+        return
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    if reloaded:
+        app.logger.info(f"Configuration reloaded in {elapsed_ms:.1f}ms.")
+    else:
+        app.logger.warning("Configuration reload failed; keeping the current configuration.")
+
 app = create_app()
 
+# SIGTERM による終了処理中にセットされる（残りのトークンの削除で起こされた自動終了を重ねて行わない）
+_terminating = threading.Event()
+
 def monitor_shutdown():
-    """トークンの使用状況とタイムアウトを監視し、自動終了する."""
-    start_time = time.time()
-    timeout = 300  # 5分
-    
-    while True:
-        # 両方のトークンが使用済み（ファイルが削除された）かチェック
-        if TokenService.check_all_tokens_consumed():
-            app.logger.info("All tokens consumed. Shutting down secrets-api.")
-            os._exit(0)
-            
-        # タイムアウトチェック
-        if time.time() - start_time > timeout:
-            app.logger.info("Token lifetime expired. Cleaning up remaining tokens and shutting down.")
-            TokenService.delete_remaining_tokens()
-            os._exit(0)
-            
-        time.sleep(5)
+    """全てのトークンが消費または失効した時点で自動終了する.
+
+    消費と失効はイベントで通知されるため、最後のトークンが使えなくなった直後に終了します。
+    各トークンの有効期限は TokenService が個別に管理します。"""
+    TokenService.wait_for_all_consumed()
+    if _terminating.is_set():
+        return
+    _log_shutdown_reason()
+    shutdown(0)
+
+def _terminate(signum, frame) -> None:
+    """SIGTERM を受け取った場合に終了する."""
+    _terminating.set()
+    app.logger.info("Received SIGTERM. Shutting down secrets-api.")
+    shutdown(0)
+
+def _log_shutdown_reason() -> None:
+    """自動終了の理由（全消費または失効）をログに出力する."""
+    expired = TokenService.expired_services()
+    if expired:
+        app.logger.info(
+            f"Token lifetime expired for: {', '.join(expired)}. Shutting down secrets-api."
+        )
+    else:
+        app.logger.info("All tokens consumed. Shutting down secrets-api.")
+
+async def serve_async() -> None:
+    """イベントループで待ち受け、停止するまで待機する（ASYNC_SERVER=true）.
+
+    本番モードでは、全てのトークンが消費または失効した時点で待ち受けを停止し、処理中のリクエストの
+    完了を待ってから戻ります（monitor_shutdown のスレッドの代わりにイベントループ上で待機する）。
+    SIGTERM を受け取った場合も同様に停止します。"""
+    from asgi import AsyncHTTPServer, SecretsASGI
+
+    asgi_app = SecretsASGI(app)
+    server = AsyncHTTPServer(asgi_app)
+    await server.start(
+        "0.0.0.0" if LISTEN_TCP else None,
+        Config.PORT,
+        unix_socket=UNIX_SOCKET,
+        unix_socket_mode=UNIX_SOCKET_MODE,
+    )
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(server.shutdown()))
+
+    async def shutdown_when_consumed() -> None:
+        await TokenService.wait_for_all_consumed_async()
+        _log_shutdown_reason()
+        await server.shutdown()
+
+    monitor = None if DEV_MODE else asyncio.create_task(shutdown_when_consumed())
+    try:
+        await server.serve_forever()
+    finally:
+        if monitor is not None:
+            monitor.cancel()
+        asgi_app.close()
+
+def shutdown(code: int) -> None:
+    """ワーカープロセスを停止し、未書き込みのログを全て書き出してからプロセスを終了する.
+
+    トークンの消費は応答の書き込み前に確定するため、最後のトークンを消費したリクエストの応答を
+    書き終えるまで待ってから終了します。終了後は使用できない未消費のトークンのファイルと完了マーカーも削除します。"""
+    from server import wait_for_active_requests
+
+    server = app.extensions.get("server")
+    if server is not None:
+        server.stop()
+    elif not wait_for_active_requests():
+        app.logger.warning("Shutting down with requests still in progress.")
+    TokenService.delete_remaining_tokens()
+    app.logger.info(f"Metrics summary: {metrics.summary()}")
+    log_writer = app.extensions.get("log_writer")
+    if log_writer is not None:
+        log_writer.stop()
+    os._exit(code)
 
 if __name__ == "__main__":
+    if ASYNC_SERVER:
+        if DEV_MODE:
+            app.logger.info("DEV_MODE=true: auto-shutdown disabled. Tokens will not be consumed.")
+        asyncio.run(serve_async())
+        shutdown(0)  # プロセスを終了するため戻らない
+    # SIGTERM でも未消費のトークンのファイルと完了マーカーを片付けてから終了する
+    signal.signal(signal.SIGTERM, _terminate)
     if not DEV_MODE:
         # 本番モードのみ自動終了スレッドを起動
         threading.Thread(target=monitor_shutdown, daemon=True).start()
     else:
         app.logger.info("DEV_MODE=true: auto-shutdown disabled. Tokens will not be consumed.")
-    app.run(host="0.0.0.0", port=5000, debug=Config.DEBUG)
+    if WORKERS > 1 or UNIX_SOCKET or not LISTEN_TCP:
+        from server import PreforkServer, create_servers
+
+        servers = create_servers(
+            app,
+            "0.0.0.0" if LISTEN_TCP else None,
+            Config.PORT,
+            unix_socket=UNIX_SOCKET,
+            unix_socket_mode=UNIX_SOCKET_MODE,
+        )
+        server = PreforkServer(app, servers, WORKERS)
+        app.extensions["server"] = server
+        server.serve_forever()
+    else:
+        from server import TrackingRequestHandler
+
+        app.run(
+            host="0.0.0.0",
+            port=Config.PORT,
+            debug=Config.DEBUG,
+            request_handler=TrackingRequestHandler,
+        )
@@ -0,0 +1,511 @@
+"""イベントループで待ち受ける非同期サーバー（環境変数 ASYNC_SERVER=true で有効化）.
+
+多数のレプリカが同時に起動し、/ready での待機や秘密情報の取得が一斉に集中しても、
+接続ごとにスレッドを割り当てずに一つのイベントループで処理します。
+
+SecretsASGI は /health・/api/health・/ready と秘密情報ルート（routes.fast_path と同じ処理）を
+イベントループ上で直接処理する ASGI アプリケーションです。/ready の待機はスレッドを占有しません。
+それ以外のリクエスト（/metrics や GET 以外のメソッドなど）は、スレッドプールで Flask アプリケーションに渡します。
+
+AsyncHTTPServer は asyncio のみで実装した HTTP/1.1（keep-alive 対応）のサーバーで、SecretsASGI を
+TCP または Unix ドメインソケットで提供します（uvicorn などの ASGI サーバーで SecretsASGI を動かすこともできます）。
+
+トークンの消費は routes.secrets_routes.authorize（TokenService.consume_token）で行うため、
+同じトークンによる並行リクエストのうち成功するのは一つだけです。停止（shutdown）は待機可能で、
+待ち受けを止めてから処理中のリクエストの完了を待ちます。"""
+
+import asyncio
+import io
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, unquote
+
+from flask import Flask
+
+from routes.fast_path import FAST_ROUTES, SecretsFastPath
+from routes.health import MAX_READY_WAIT
+from server import DEFAULT_UNIX_SOCKET_MODE
+from services.metrics import metrics
+
+# Flask アプリケーションに渡すリクエストを処理するスレッド数
+WSGI_THREADS = int(os.environ.get("ASYNC_WSGI_THREADS", "8"))
+# 接続の受け付け待ちキューの長さ（一斉に接続されても取りこぼさないようにする）
+LISTEN_BACKLOG = 1024
+# keep-alive 接続で次のリクエストを待つ秒数
+KEEPALIVE_TIMEOUT = 5.0
+# 停止時に処理中のリクエストの完了を待つ秒数
+SHUTDOWN_GRACE = 5.0
+# リクエストヘッダーと本文の上限（バイト）
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+HEALTH_PATHS = ("/health", "/api/health")
+READY_PATH = "/ready"
+
+Headers = List[Tuple[str, str]]
+# ステータスコード・応答ヘッダー・本文
+Response = Tuple[int, Headers, bytes]
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+_logger = logging.getLogger(__name__)
+
+
+class SecretsASGI:
+    """秘密情報APIの ASGI アプリケーション."""
+
+    def __init__(self, app: Flask, wsgi_threads: int = WSGI_THREADS):
+        """初期化.
+
+        Args:
+            app: 起動処理を終えたFlaskアプリケーション（create_app の戻り値）
+            wsgi_threads: Flask アプリケーションに渡すリクエストを処理するスレッド数"""
+        self.app = app
+        # 高速パスが組み込まれていない場合（プロファイリング中）は、全てのリクエストを Flask で処理する
+        fast_path = app.wsgi_app
+        self.fast_path = fast_path if isinstance(fast_path, SecretsFastPath) else None
+        self._executor = ThreadPoolExecutor(wsgi_threads, thread_name_prefix="asgi-wsgi")
+        self._health_body = self._serialize({"status": "OK", "message": "Secrets API is running"})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """ASGI アプリケーションとしてリクエストを処理する."""
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        status, headers, body = await self.handle(scope, receive)
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def handle(self, scope: Scope, receive: Receive) -> Response:
+        """リクエストを処理し、応答を返す."""
+        path = scope["path"]
+        if self.fast_path is None or scope["method"] != "GET":
+            return await self._call_flask(scope, receive)
+        if path in FAST_ROUTES:
+            return self.fast_path.respond(
+                path, _header(scope, b"authorization"), _client(scope)
+            )
+
+        started_at = time.perf_counter()
+        if path in HEALTH_PATHS:
+            response = self._response(200, self._health_body)
+        elif path == READY_PATH:
+            response = await self._ready(scope.get("query_string", b""))
+        else:
+            return await self._call_flask(scope, receive)
+        metrics.observe_request(path, time.perf_counter() - started_at)
+        return response
+
+    async def _ready(self, query_string: bytes) -> Response:
+        """レディネス（routes.health.ready と同じ応答）を返す（待機中もスレッドを占有しない）."""
+        readiness = self.app.extensions["readiness"]
+        values = parse_qs(query_string.decode("latin-1"), keep_blank_values=True).get("wait")
+        try:
+            wait = min(max(float(values[0]) if values else 0.0, 0.0), MAX_READY_WAIT)
+        except ValueError:
+            return self._response(
+                400, self._serialize({"error": "wait must be a number of seconds"})
+            )
+
+        is_ready = await readiness.wait_async(wait) if wait > 0 else readiness.is_ready()
+        body = self._serialize({"ready": is_ready, "stages": readiness.snapshot()})
+        return self._response(200 if is_ready else 503, body)
+
+    async def _call_flask(self, scope: Scope, receive: Receive) -> Response:
+        """リクエストをスレッドプールで Flask アプリケーションに渡す."""
+        environ = _build_environ(scope, await _read_body(receive))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run_wsgi, environ)
+
+    def _run_wsgi(self, environ: Dict[str, Any]) -> Response:
+        """WSGI アプリケーションとして Flask を呼び出す（スレッドプールから呼ばれる）."""
+        started: List[Any] = []
+        chunks: List[bytes] = []
+
+        def start_response(status: str, headers: Headers, exc_info: Any = None) -> Callable:
+            started[:] = [int(status.split(" ", 1)[0]), list(headers)]
+            return chunks.append
+
+        result = self.app(environ, start_response)
+        try:
+            chunks.extend(result)
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                close()
+        return started[0], started[1], b"".join(chunks)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        """ASGI サーバーの起動・停止の通知に応答する."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def close(self) -> None:
+        """Flask アプリケーションに渡すスレッドプールを停止する."""
+        self._executor.shutdown(wait=False)
+
+    def _response(self, status: int, body: bytes) -> Response:
+        """JSON の応答を返す."""
+        headers = [("Content-Type", "application/json"), ("Content-Length", str(len(body)))]
+        return status, headers, body
+
+    def _serialize(self, obj: dict) -> bytes:
+        """jsonify と同じ形式でシリアライズする."""
+        return self.app.json.response(obj).get_data()
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    """リクエストヘッダーの値を返す（name は小文字）."""
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _client(scope: Scope) -> str:
+    """クライアントの識別子（接続元アドレス）を返す（Unix ドメインソケット経由の場合は local）."""
+    client = scope.get("client")
+    return client[0] if client else "local"
+
+
+async def _read_body(receive: Receive) -> bytes:
+    """リクエストの本文を読み込む."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def _build_environ(scope: Scope, body: bytes) -> Dict[str, Any]:
+    """ASGI の scope から WSGI の environ を作成する."""
+    server = scope.get("server") or ("localhost", None)
+    client = scope.get("client")
+    environ: Dict[str, Any] = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0] if client else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = f"HTTP_{key}"
+        text = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{text}" if key in environ else text
+    return environ
+
+
+class _Request(NamedTuple):
+    """解析済みの HTTP リクエスト."""
+
+    method: str
+    target: str
+    version: str
+    headers: List[Tuple[bytes, bytes]]  # 名前は小文字
+    body: bytes
+
+
+class _HTTPError(Exception):
+    """リクエストを解析できない場合の例外（応答後に接続を閉じる）."""
+
+    def __init__(self, status: int):
+        super().__init__(status)
+        self.status = status
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[_Request]:
+    """HTTP リクエストを一件読み込む.
+
+    Returns:
+        リクエスト。リクエストの前に接続が閉じられた場合はNone
+
+    Raises:
+        _HTTPError: リクエストの形式が不正、または大きすぎる場合"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise _HTTPError(400) from e
+    except asyncio.LimitOverrunError as e:
+        raise _HTTPError(431) from e
+
+    request_line, *header_lines = head[:-4].decode("latin-1").split("\r\n")
+    parts = request_line.split(" ")
+    if len(parts) != 3 or not parts[2].startswith("HTTP/1."):
+        raise _HTTPError(400)
+    method, target, version = parts
+
+    headers = []
+    for line in header_lines:
+        name, sep, value = line.partition(":")
+        if not sep or not name or name != name.strip():
+            raise _HTTPError(400)
+        headers.append((name.lower().encode("latin-1"), value.strip().encode("latin-1")))
+
+    fields = dict(headers)
+    if b"transfer-encoding" in fields:
+        raise _HTTPError(501)
+    try:
+        length = int(fields.get(b"content-length", b"0"))
+    except ValueError as e:
+        raise _HTTPError(400) from e
+    if length < 0:
+        raise _HTTPError(400)
+    if length > MAX_BODY_BYTES:
+        raise _HTTPError(413)
+    body = await reader.readexactly(length) if length else b""
+    return _Request(method, target, version, headers, body)
+
+
+def _status_line(status: int) -> bytes:
+    """応答のステータス行を返す."""
+    try:
+        phrase = HTTPStatus(status).phrase
+    except ValueError:
+        phrase = ""
+    return f"HTTP/1.1 {status} {phrase}\r\n".encode("latin-1")
+
+
+class AsyncHTTPServer:
+    """ASGI アプリケーションを HTTP/1.1 で提供する asyncio のサーバー."""
+
+    def __init__(self, asgi_app: ASGIApp, keepalive_timeout: float = KEEPALIVE_TIMEOUT):
+        """初期化.
+
+        Args:
+            asgi_app: ASGI アプリケーション（SecretsASGI）
+            keepalive_timeout: keep-alive 接続で次のリクエストを待つ秒数"""
+        self.asgi_app = asgi_app
+        self.keepalive_timeout = keepalive_timeout
+        self.servers: List[asyncio.AbstractServer] = []
+        self.unix_socket: Optional[str] = None
+        # 接続を処理中のタスク -> リクエストを処理中かどうか（停止時に待機中の接続のみ閉じるため）
+        self._connections: Dict[asyncio.Task, bool] = {}
+        self._closing = False
+        self._stopped = asyncio.Event()
+
+    @property
+    def port(self) -> int:
+        """TCP の待ち受けポート."""
+        for server in self.servers:
+            for sock in server.sockets:
+                name = sock.getsockname()
+                if isinstance(name, tuple):
+                    return name[1]
+        raise ValueError("Not listening on TCP.")
+
+    async def start(
+        self,
+        host: Optional[str],
+        port: int,
+        unix_socket: Optional[str] = None,
+        unix_socket_mode: int = DEFAULT_UNIX_SOCKET_MODE,
+    ) -> None:
+        """待ち受けを開始する.
+
+        Args:
+            host: TCPの待ち受けアドレス（Noneの場合はTCPで待ち受けない）
+            port: TCPの待ち受けポート
+            unix_socket: Unix ドメインソケットのパス（Noneの場合は待ち受けない）
+            unix_socket_mode: Unix ドメインソケットの権限"""
+        if host is not None:
+            self.servers.append(await asyncio.start_server(
+                self._handle, host, port, limit=MAX_HEADER_BYTES, backlog=LISTEN_BACKLOG
+            ))
+        if unix_socket:
+            # ソケットファイルは作成時点から指定の権限にする（server.make_unix_server と同じ）
+            old_umask = os.umask(0o777 & ~unix_socket_mode)
+            try:
+                self.servers.append(await asyncio.start_unix_server(
+                    self._handle, unix_socket, limit=MAX_HEADER_BYTES, backlog=LISTEN_BACKLOG
+                ))
+            finally:
+                os.umask(old_umask)
+            os.chmod(unix_socket, unix_socket_mode)
+            self.unix_socket = unix_socket
+        if not self.servers:
+            raise ValueError("At least one of TCP or Unix domain socket must be enabled.")
+
+    async def serve_forever(self) -> None:
+        """shutdown が完了するまで待機する."""
+        await self._stopped.wait()
+
+    async def shutdown(self, grace: float = SHUTDOWN_GRACE) -> None:
+        """待ち受けを停止し、処理中のリクエストの完了を待ってから全ての接続を閉じる.
+
+        Args:
+            grace: 処理中のリクエストの完了を待つ最大秒数（超えた場合は接続を閉じる）"""
+        if self._closing:
+            await self._stopped.wait()
+            return
+        self._closing = True
+        for server in self.servers:
+            server.close()
+        if self.unix_socket is not None:
+            try:
+                os.unlink(self.unix_socket)
+            except FileNotFoundError:
+                pass
+
+        # 次のリクエストを待っているだけの接続はすぐに閉じる
+        for task, busy in list(self._connections.items()):
+            if not busy:
+                task.cancel()
+        if self._connections:
+            _, pending = await asyncio.wait(list(self._connections), timeout=grace)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        for server in self.servers:
+            await server.wait_closed()
+        self._stopped.set()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """一つの接続のリクエストを順に処理する."""
+        task = asyncio.current_task()
+        assert task is not None
+        self._connections[task] = False
+        try:
+            while not self._closing:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), self.keepalive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                except _HTTPError as e:
+                    await self._write_error(writer, e.status)
+                    break
+                if request is None:
+                    break
+                self._connections[task] = True
+                keep_alive = await self._respond(request, writer)
+                self._connections[task] = False
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # 停止時に閉じられた接続（接続ごとのタスクは他から待たれないため、キャンセルもここで終える）
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def _respond(self, request: _Request, writer: asyncio.StreamWriter) -> bool:
+        """リクエストを ASGI アプリケーションで処理して応答する.
+
+        Returns:
+            接続を維持する場合True"""
+        path, _, query = request.target.partition("?")
+        peer = writer.get_extra_info("peername")
+        sockname = writer.get_extra_info("sockname")
+        scope: Scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": request.version[len("HTTP/"):],
+            "method": request.method,
+            "scheme": "http",
+            "path": unquote(path),
+            "raw_path": path.encode("latin-1"),
+            "query_string": query.encode("latin-1"),
+            "root_path": "",
+            "headers": request.headers,
+            "client": tuple(peer[:2]) if isinstance(peer, tuple) else None,
+            "server": tuple(sockname[:2]) if isinstance(sockname, tuple) else (sockname, None),
+        }
+        messages = [{"type": "http.request", "body": request.body, "more_body": False}]
+
+        async def receive() -> Dict[str, Any]:
+            return messages.pop() if messages else {"type": "http.disconnect"}
+
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        async def send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.asgi_app(scope, receive, send)
+        except Exception:
+            _logger.exception(f"Unhandled error while serving {request.method} {path}.")
+            await self._write_error(writer, 500)
+            return False
+        if not start:
+            await self._write_error(writer, 500)
+            return False
+
+        connection = dict(request.headers).get(b"connection", b"").lower()
+        keep_alive = (
+            not self._closing
+            and connection != b"close"
+            and (request.version == "HTTP/1.1" or connection == b"keep-alive")
+        )
+        body = b"".join(chunks)
+        head = [_status_line(start["status"])]
+        has_length = False
+        for name, value in start.get("headers", []):
+            if name.lower() == b"connection":
+                continue
+            has_length = has_length or name.lower() == b"content-length"
+            head.append(name + b": " + value + b"\r\n")
+        if not has_length:
+            head.append(f"Content-Length: {len(body)}\r\n".encode())
+        head.append(
+            b"Connection: keep-alive\r\n\r\n" if keep_alive else b"Connection: close\r\n\r\n"
+        )
+        writer.write(b"".join(head))
+        if request.method != "HEAD":
+            writer.write(body)
+        await writer.drain()
+        return keep_alive
+
+    async def _write_error(self, writer: asyncio.StreamWriter, status: int) -> None:
+        """エラーの応答を書き込む（この後に接続を閉じる）."""
+        body = f'{{"error":"{HTTPStatus(status).phrase}"}}\n'.encode()
+        writer.write(
+            _status_line(status)
+            + b"Content-Type: application/json\r\n"
+            + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
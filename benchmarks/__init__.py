@@ -0,0 +1,5 @@
+"""
+ベンチマークパッケージ.
+
+起動処理と暗号処理の所要時間を計測し、保存済みのベースラインと比較して性能の劣化を検出します。
+"""
@@ -0,0 +1,241 @@
+"""ベンチマークケースの定義.
+
+各ケースは準備処理として定義し、計測対象の関数を返します。計測対象の関数が数値を返した場合は、
+その値（秒）を計測結果として使います（サブプロセス内で計測する import 時間など）。
+
+このモジュールは benchmarks.run が作業ディレクトリを環境変数に設定した後に読み込まれます。"""
+
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from unittest.mock import patch
+
+import yaml
+
+from config import Config, _get_secrets_from_encrypted_file
+from config.secrets import SecretManager
+
+BENCH_SECRET_KEY = "benchmark_secret_key"
+
+# 暗号化・復号の計測で使う値のサイズ（バイト）と件数
+VALUE_SIZES = (32, 1024, 16384)
+VALUE_COUNTS = (10, 1000)
+# 暗号化ファイルの読み込みの計測で使う件数
+FILE_ENTRY_COUNTS = (10, 100, 1000, 10000)
+# 暗号化コマンド（config.encrypt）の計測で使う件数と、並列に暗号化する場合のプロセス数
+ENCRYPT_FILE_ENTRIES = 20000
+ENCRYPT_FILE_WORKERS = (1, 4)
+# 秘密情報ルートの計測で使うリクエスト数
+REQUEST_COUNT = 1000
+
+Timed = Callable[[], Optional[float]]
+
+# ケース名 -> 準備処理（計測対象の関数を返す）
+CASES: Dict[str, Callable[[], Timed]] = {}
+
+
+def benchmark(name: str) -> Callable[[Callable[[], Timed]], Callable[[], Timed]]:
+    """準備処理をベンチマークケースとして登録するデコレーター."""
+
+    def register(setup: Callable[[], Timed]) -> Callable[[], Timed]:
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+def _workdir() -> Path:
+    """作業ディレクトリ（benchmarks.run が APP_ROOT に設定する）."""
+    return Path(os.environ["APP_ROOT"])
+
+
+def _size_label(size: int) -> str:
+    """サイズの表示名（例: 1024 -> 1KiB）."""
+    return f"{size // 1024}KiB" if size >= 1024 else f"{size}B"
+
+
+def _import_time(module: str) -> Timed:
+    """新しいインタープリターでのモジュールの import 時間を計測する関数を返す."""
+    code = (
+        "import time; started_at = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - started_at)"
+    )
+    root = Path(__file__).resolve().parent.parent
+
+    def run() -> float:
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=root, env=os.environ.copy(),
+            check=True, capture_output=True, text=True,
+        ).stdout
+        return float(output.strip().splitlines()[-1])
+
+    return run
+
+
+for _module in ("config", "app"):
+    benchmark(f"import[{_module}]")(lambda module=_module: _import_time(module))
+
+
+@benchmark("secret_manager_init[pbkdf2-sha256]")
+def secret_manager_init() -> Timed:
+    """鍵導出（キャッシュなし）を含む SecretManager の生成."""
+
+    def run() -> None:
+        SecretManager.clear_cipher_cache()
+        SecretManager(secret_key=BENCH_SECRET_KEY)
+
+    return run
+
+
+def _encrypt_case(size: int, count: int) -> Timed:
+    """size バイトの値を count 件暗号化する関数を返す."""
+    manager = SecretManager(secret_key=BENCH_SECRET_KEY)
+    plaintext = "x" * size
+
+    def run() -> None:
+        for _ in range(count):
+            manager.encrypt(plaintext)
+
+    return run
+
+
+def _decrypt_case(size: int, count: int) -> Timed:
+    """size バイトの値を count 件復号する関数を返す."""
+    manager = SecretManager(secret_key=BENCH_SECRET_KEY)
+    ciphertexts = [manager.encrypt("x" * size) for _ in range(count)]
+
+    def run() -> None:
+        for ciphertext in ciphertexts:
+            manager.decrypt_strict(ciphertext)
+
+    return run
+
+
+for _size in VALUE_SIZES:
+    for _count in VALUE_COUNTS:
+        _label = f"{_size_label(_size)} x {_count}"
+        benchmark(f"encrypt[{_label}]")(lambda s=_size, c=_count: _encrypt_case(s, c))
+        benchmark(f"decrypt[{_label}]")(lambda s=_size, c=_count: _decrypt_case(s, c))
+
+
+def _secrets_file_case(entries: int) -> Timed:
+    """entries 件の暗号化値を持つファイルを読み込む関数を返す（鍵導出はキャッシュ済み）."""
+    manager = SecretManager(secret_key=BENCH_SECRET_KEY)
+    # 100件ごとにサービスを分け、実際の設定に近い階層にする
+    data: Dict[str, Dict[str, str]] = {}
+    for i in range(entries):
+        data.setdefault(f"service{i // 100}", {})[f"key{i}"] = (
+            f"encrypted:{manager.encrypt(f'value-{i}')}"
+        )
+    secrets_file = _workdir() / f"secrets-{entries}.yaml.encrypted"
+    secrets_file.write_text(yaml.safe_dump(data))
+
+    def run() -> None:
+        with patch("config.SECRETS_FILE", secrets_file):
+            result = _get_secrets_from_encrypted_file(BENCH_SECRET_KEY)
+        assert sum(len(values) for values in result.values()) == entries
+
+    return run
+
+
+for _entries in FILE_ENTRY_COUNTS:
+    benchmark(f"load_secrets_file[{_entries}]")(lambda n=_entries: _secrets_file_case(n))
+
+
+def _encrypt_file_case(workers: int) -> Timed:
+    """ENCRYPT_FILE_ENTRIES 件の平文を暗号化コマンドと同じ処理で暗号化する関数を返す.
+
+    40件ずつのセクション（トップレベルのキー）に分け、セクションの多い設定を再現します。
+    並列に暗号化する場合の速さは CPU 数に依存します（1 CPU のマシンでは速くならない）。"""
+    from config.encrypt import encrypt_sections
+
+    manager = SecretManager(secret_key=BENCH_SECRET_KEY)
+
+    def run() -> None:
+        data: Dict[str, Dict[str, str]] = {}
+        for i in range(ENCRYPT_FILE_ENTRIES):
+            data.setdefault(f"service{i // 40}", {})[f"key{i}"] = f"value-{i}"
+        output = b"".join(encrypt_sections(manager, data, workers))
+        assert output.count(b"encrypted:") == ENCRYPT_FILE_ENTRIES
+
+    return run
+
+
+for _workers in ENCRYPT_FILE_WORKERS:
+    benchmark(f"encrypt_file[{ENCRYPT_FILE_ENTRIES}, workers={_workers}]")(
+        lambda w=_workers: _encrypt_file_case(w)
+    )
+
+
+def _write_app_config() -> None:
+    """create_app() が読み込む config.yaml と暗号化ファイルを作業ディレクトリに作成する."""
+    manager = SecretManager(secret_key=BENCH_SECRET_KEY)
+    config_dir = _workdir() / "secrets_config"
+    config_dir.mkdir(parents=True, exist_ok=True)
+    (config_dir / "config.yaml").write_text(f"secret_key: {BENCH_SECRET_KEY}\n")
+    (config_dir / "secrets.yaml.encrypted").write_text(
+        yaml.safe_dump({"database": {"password": f"encrypted:{manager.encrypt('bench')}"}})
+    )
+
+
+@benchmark("create_app")
+def create_app_case() -> Timed:
+    """create_app() 全体（設定の読み込み・鍵導出・復号・トークン生成）."""
+    from app import create_app
+
+    _write_app_config()
+
+    def run() -> None:
+        SecretManager.clear_cipher_cache()
+        app = create_app()
+        app.extensions["log_writer"].stop()
+        assert Config.DB_PASSWORD == "bench"
+
+    return run
+
+
+def _secrets_request_case(fast_path: bool) -> Timed:
+    """有効なトークンで /secrets/database/password を REQUEST_COUNT 回呼び出す関数を返す.
+
+    WSGI アプリケーションを直接呼び出し、高速パス（routes.fast_path）と Flask のブループリントの
+    リクエストあたりの処理を比較します。トークンは消費しない（DEV_MODE）ため、同じトークンを使い続けます。"""
+    from werkzeug.test import EnvironBuilder
+
+    from app import create_app
+    from services.token_service import TokenService, token_file_for
+
+    _write_app_config()
+    app = create_app()
+    app.extensions["log_writer"].stop()
+    # 両方の経路で同じ内容のログは計測の対象外にする
+    app.logger.setLevel(logging.WARNING)
+    with app.app_context(), patch("services.token_service.DEV_MODE", True):
+        TokenService.generate_tokens()
+    token = token_file_for("database").read_text().strip()
+    environ = EnvironBuilder(
+        path="/secrets/database/password", headers={"Authorization": f"Bearer {token}"}
+    ).get_environ()
+    wsgi_app = app.wsgi_app if fast_path else app.wsgi_app.wsgi_app
+    statuses = []
+
+    def start_response(status: str, headers: list, exc_info: object = None) -> None:
+        statuses.append(status)
+
+    def run() -> None:
+        statuses.clear()
+        with patch("services.token_service.DEV_MODE", True):
+            for _ in range(REQUEST_COUNT):
+                body = wsgi_app(dict(environ), start_response)
+                b"".join(body)
+                if hasattr(body, "close"):
+                    body.close()
+        assert statuses == ["200 OK"] * REQUEST_COUNT
+
+    return run
+
+
+benchmark("secrets_request[blueprint]")(lambda: _secrets_request_case(fast_path=False))
+benchmark("secrets_request[fast_path]")(lambda: _secrets_request_case(fast_path=True))
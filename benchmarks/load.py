@@ -0,0 +1,288 @@
+"""トークンエンドポイントの並行負荷テスト（起動直後の一斉アクセスの再現）.
+
+アプリケーションをローカルで起動し、多数の並行クライアントから有効・無効・重複したトークンで
+/secrets/database/password を一斉に呼び出します。レイテンシ（p50/p99）とスループットを報告し、
+次の不変条件を検証します。
+
+    - 有効なトークンはそれぞれちょうど一度だけ成功する（重複したリクエストは 403、
+      認証の失敗が続いた接続元では 429）
+    - 無効なトークンは常に 401・403・429 のいずれかになる
+    - 500 や接続エラーが発生しない
+
+使い方:
+    python -m benchmarks.load --tokens 200 --duplicates 5 --invalid 500 --concurrency 64
+    python -m benchmarks.load --workers 4   # マルチワーカー構成（server.PreforkServer）
+    python -m benchmarks.load --async-server   # イベントループで待ち受ける構成（asgi.AsyncHTTPServer）
+
+不変条件が満たされない場合は終了コード1で終了します。"""
+
+import argparse
+import asyncio
+import http.client
+import logging
+import math
+import queue
+import secrets as py_secrets
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from flask import Flask
+
+ENDPOINT = "/secrets/database/password"
+
+
+class Outcome(NamedTuple):
+    """一件のリクエストの結果."""
+
+    kind: str  # valid / invalid / missing
+    token: Optional[str]
+    status: int  # 接続エラーの場合は0
+    latency: float
+
+
+class LoadReport(NamedTuple):
+    """負荷テストの結果."""
+
+    outcomes: List[Outcome]
+    elapsed: float
+    violations: List[str]
+
+    @property
+    def throughput(self) -> float:
+        """スループット（リクエスト/秒）."""
+        return len(self.outcomes) / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p: float) -> float:
+        """レイテンシのパーセンタイル（秒、nearest-rank）."""
+        latencies = sorted(outcome.latency for outcome in self.outcomes)
+        if not latencies:
+            return 0.0
+        return latencies[max(0, math.ceil(p / 100 * len(latencies)) - 1)]
+
+    def summary(self) -> str:
+        """結果を一行にまとめて返す."""
+        statuses = Counter(outcome.status for outcome in self.outcomes)
+        return (
+            f"requests={len(self.outcomes)} elapsed={self.elapsed:.3f}s "
+            f"throughput={self.throughput:.1f}/s p50={self.percentile(50) * 1000:.2f}ms "
+            f"p99={self.percentile(99) * 1000:.2f}ms statuses={dict(sorted(statuses.items()))}"
+        )
+
+
+def issue_tokens(app: Flask, count: int) -> Dict[str, str]:
+    """count 個のサービスにトークンを発行し、サービス名 -> トークンを返す."""
+    from services.token_service import TokenService, token_file_for
+
+    services = {f"load{i}": ["database.password"] for i in range(count)}
+    with app.app_context():
+        TokenService.generate_tokens(services)
+    return {service: token_file_for(service).read_text().strip() for service in services}
+
+
+def start_server(
+    app: Flask, workers: int = 1, async_server: bool = False
+) -> Tuple[int, Callable[[], None]]:
+    """アプリケーションをローカルで起動する.
+
+    Args:
+        app: Flaskアプリケーション
+        workers: ワーカープロセス数（async_server の場合は無視する）
+        async_server: イベントループで待ち受ける非同期サーバーで起動する
+
+    Returns:
+        待ち受けポートと、サーバーを停止する関数"""
+    from werkzeug.serving import make_server
+
+    from server import PreforkServer, create_servers
+
+    if async_server:
+        return _start_async_server(app)
+
+    if workers > 1:
+        prefork = PreforkServer(app, create_servers(app, "127.0.0.1", 0), workers)
+        thread = threading.Thread(target=prefork.serve_forever, daemon=True)
+        thread.start()
+
+        def stop_prefork() -> None:
+            prefork.stop()
+            thread.join(timeout=5)
+
+        return prefork.servers[0].port, stop_prefork
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop() -> None:
+        server.shutdown()
+        server.server_close()
+
+    return server.port, stop
+
+
+def _start_async_server(app: Flask) -> Tuple[int, Callable[[], None]]:
+    """非同期サーバーを別スレッドのイベントループで起動する."""
+    from asgi import AsyncHTTPServer, SecretsASGI
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asgi_app = SecretsASGI(app)
+
+    async def start() -> AsyncHTTPServer:
+        server = AsyncHTTPServer(asgi_app)
+        await server.start("127.0.0.1", 0)
+        return server
+
+    server = asyncio.run_coroutine_threadsafe(start(), loop).result()
+
+    def stop() -> None:
+        asyncio.run_coroutine_threadsafe(server.shutdown(), loop).result(timeout=10)
+        asgi_app.close()
+        loop.call_soon_threadsafe(loop.stop)
+
+    return server.port, stop
+
+
+def _send(port: int, kind: str, token: Optional[str]) -> Outcome:
+    """一件のリクエストを送信する."""
+    headers = {} if token is None else {"Authorization": f"Bearer {token}"}
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    started_at = time.perf_counter()
+    try:
+        conn.request("GET", ENDPOINT, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        status = response.status
+    except OSError:
+        status = 0
+    finally:
+        conn.close()
+    return Outcome(kind, token, status, time.perf_counter() - started_at)
+
+
+def run_load(
+    port: int,
+    tokens: Dict[str, str],
+    duplicates: int = 5,
+    invalid: int = 100,
+    concurrency: int = 32,
+) -> LoadReport:
+    """並行クライアントから一斉にリクエストを送信し、結果を検証する.
+
+    Args:
+        port: 待ち受けポート
+        tokens: サービス名 -> 有効なトークン
+        duplicates: 有効なトークン一つあたりのリクエスト数
+        invalid: 無効なトークン（半数は Authorization ヘッダーなし）のリクエスト数
+        concurrency: 並行クライアント数
+
+    Returns:
+        負荷テストの結果"""
+    requests: List[Tuple[str, Optional[str]]] = [
+        ("valid", token) for token in tokens.values() for _ in range(duplicates)
+    ]
+    requests += [
+        ("missing", None) if i % 2 else ("invalid", py_secrets.token_urlsafe(32))
+        for i in range(invalid)
+    ]
+    # 同じトークンのリクエストが同時に届くよう、重複したリクエストを隣り合わせのまま送信する
+    pending: "queue.Queue[Tuple[str, Optional[str]]]" = queue.Queue()
+    for item in requests:
+        pending.put(item)
+
+    outcomes: List[Outcome] = []
+    outcomes_lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+
+    def client() -> None:
+        barrier.wait()
+        while True:
+            try:
+                kind, token = pending.get_nowait()
+            except queue.Empty:
+                return
+            outcome = _send(port, kind, token)
+            with outcomes_lock:
+                outcomes.append(outcome)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    return LoadReport(outcomes, elapsed, check_invariants(outcomes, tokens))
+
+
+def check_invariants(outcomes: List[Outcome], tokens: Dict[str, str]) -> List[str]:
+    """不変条件を検証し、違反の一覧を返す."""
+    violations = []
+    successes: Counter = Counter()
+    for outcome in outcomes:
+        if outcome.status == 0:
+            violations.append(f"connection error ({outcome.kind})")
+        elif outcome.status == 500:
+            violations.append(f"500 response ({outcome.kind})")
+        elif outcome.kind == "valid":
+            if outcome.status == 200:
+                successes[outcome.token] += 1
+            elif outcome.status not in (403, 429):
+                violations.append(f"unexpected {outcome.status} for a valid token")
+        elif outcome.status not in (401, 403, 429):
+            violations.append(f"{outcome.kind} token got {outcome.status}")
+
+    for service, token in tokens.items():
+        if successes[token] != 1:
+            violations.append(f"token for {service} succeeded {successes[token]} times")
+    return violations
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """負荷テストを実行する.
+
+    Returns:
+        終了コード（不変条件の違反がある場合は1）"""
+    parser = argparse.ArgumentParser(description="Secrets API token endpoint load test")
+    parser.add_argument("--tokens", type=int, default=200, help="有効なトークンの数")
+    parser.add_argument("--duplicates", type=int, default=5, help="トークンあたりのリクエスト数")
+    parser.add_argument("--invalid", type=int, default=500, help="無効なトークンのリクエスト数")
+    parser.add_argument("--concurrency", type=int, default=64, help="並行クライアント数")
+    parser.add_argument("--workers", type=int, default=1, help="ワーカープロセス数")
+    parser.add_argument(
+        "--async-server", action="store_true", help="イベントループで待ち受ける非同期サーバーで起動する"
+    )
+    args = parser.parse_args(argv)
+
+    from benchmarks.run import prepare_environment
+
+    workdir = prepare_environment()
+    config_dir = workdir / "secrets_config"
+    config_dir.mkdir(parents=True)
+    (config_dir / "config.yaml").write_text("database:\n  password: load-test\n")
+
+    from app import create_app
+
+    app = create_app()
+    # 拒否されたリクエストごとの警告で計測が遅くならないようにする
+    app.logger.setLevel(logging.ERROR)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    tokens = issue_tokens(app, args.tokens)
+    port, stop = start_server(app, args.workers, args.async_server)
+    try:
+        report = run_load(port, tokens, args.duplicates, args.invalid, args.concurrency)
+    finally:
+        stop()
+
+    print(report.summary())
+    for violation in report.violations:
+        print(f"VIOLATION {violation}")
+    return 1 if report.violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""ベンチマークの実行とベースラインとの比較.
+
+使い方:
+    python -m benchmarks.run                    # ベースラインと比較（劣化があれば終了コード1）
+    python -m benchmarks.run --update-baseline  # 計測結果をベースラインとして保存
+    python -m benchmarks.run -k encrypt --repeat 9 --threshold 0.5
+
+各ケースはウォームアップの後に repeat 回計測し、最小値を結果とします
+（他のプロセスの影響などのばらつきは所要時間を増やす方向にしか働かないため、最小値が最も安定します）。
+ベースラインより threshold（割合）以上、かつ MIN_REGRESSION_SECONDS 以上遅くなったケースを劣化とみなします。
+マシン全体の速度の変動で劣化と判定しないよう、固定の計算（校正用）の所要時間の比で補正してから比較し、
+劣化と判定したケースは CONFIRM_RUNS 回まで計測し直して、一時的なばらつきでないことを確認します。
+計測値はマシンに依存するため、ベースラインは比較に使うマシンで --update-baseline して作成してください。"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_REPEAT = 7
+DEFAULT_THRESHOLD = 0.5
+# 計測のばらつきで劣化と判定しないよう、これ未満の差は無視する（秒）
+MIN_REGRESSION_SECONDS = 0.002
+# 校正用の計算の結果を保存するキー
+CALIBRATION_KEY = "_calibration"
+# 劣化と判定したケースを計測し直す回数
+CONFIRM_RUNS = 2
+
+
+class Regression(NamedTuple):
+    """ベースラインより遅くなったケース."""
+
+    name: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        """ベースラインに対する比率."""
+        return self.current / self.baseline
+
+
+def measure(run: Callable[[], Optional[float]], repeat: int) -> float:
+    """ウォームアップの後に repeat 回計測し、最小値（秒）を返す."""
+    run()
+    samples = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        reported = run()
+        elapsed = time.perf_counter() - started_at
+        samples.append(elapsed if reported is None else reported)
+    return min(samples)
+
+
+def calibrate() -> float:
+    """マシンの速度の基準として、固定の計算（Python の処理と SHA-256）を計測する."""
+
+    def run() -> None:
+        data = b"x" * 1024
+        for _ in range(2000):
+            data = hashlib.sha256(data).digest() * 32
+        sum(i * i for i in range(200000))
+
+    return measure(run, DEFAULT_REPEAT)
+
+
+def compare(
+    baseline: Dict[str, float], results: Dict[str, float], threshold: float
+) -> List[Regression]:
+    """計測結果をベースラインと比較し、劣化したケースを返す.
+
+    両方に校正用の計測値（CALIBRATION_KEY）がある場合は、その比でベースラインを補正します。
+
+    Args:
+        baseline: ケース名 -> ベースラインの所要時間（秒）
+        results: ケース名 -> 今回の所要時間（秒）
+        threshold: 劣化とみなす増加の割合（0.25 の場合は 25% 以上遅くなった場合）
+
+    Returns:
+        劣化したケース（ベースラインにないケースは比較しない）"""
+    scale = 1.0
+    if baseline.get(CALIBRATION_KEY) and results.get(CALIBRATION_KEY):
+        scale = results[CALIBRATION_KEY] / baseline[CALIBRATION_KEY]
+
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or name == CALIBRATION_KEY:
+            continue
+        previous *= scale
+        if current > previous * (1 + threshold) and current - previous >= MIN_REGRESSION_SECONDS:
+            regressions.append(Regression(name, previous, current))
+    return regressions
+
+
+def load_baseline(path: Path = BASELINE_FILE) -> Dict[str, float]:
+    """保存済みのベースラインを読み込む（存在しない場合は空）."""
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())["results"]
+
+
+def save_baseline(results: Dict[str, float], path: Path = BASELINE_FILE) -> None:
+    """計測結果をベースラインとして保存する（既存のケースは今回の結果で上書きする）."""
+    merged = {**load_baseline(path), **results}
+    path.write_text(json.dumps({
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": dict(sorted(merged.items())),
+    }, indent=2) + "\n")
+
+
+def prepare_environment() -> Path:
+    """設定・トークン・ログの出力先を一時ディレクトリに向ける（config の import 前に呼ぶ）."""
+    workdir = Path(tempfile.mkdtemp(prefix="secrets-api-bench-"))
+    os.environ["APP_ROOT"] = str(workdir)
+    os.environ["TOKEN_DIR"] = str(workdir / "tokens")
+    os.environ["LOG_DIR"] = str(workdir / "logs")
+    os.environ.pop("SECRETS_CONFIG_DIR", None)
+    os.environ.pop("PROFILE", None)
+    return workdir
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """ベンチマークを実行する.
+
+    Returns:
+        終了コード（劣化がある場合は1）"""
+    parser = argparse.ArgumentParser(description="Secrets API benchmarks")
+    parser.add_argument("-k", dest="keyword", help="ケース名に含まれる文字列で絞り込む")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    prepare_environment()
+    from benchmarks.cases import CASES
+
+    baseline = load_baseline()
+    results: Dict[str, float] = {CALIBRATION_KEY: calibrate()}
+    runs: Dict[str, Callable[[], Optional[float]]] = {}
+    for name, setup in CASES.items():
+        if args.keyword and args.keyword not in name:
+            continue
+        runs[name] = setup()
+        results[name] = measure(runs[name], args.repeat)
+        previous = baseline.get(name)
+        change = f" ({results[name] / previous:.2f}x baseline)" if previous else ""
+        print(f"{name:<40} {results[name] * 1000:>10.3f} ms{change}")
+
+    if args.update_baseline:
+        if args.keyword and baseline.get(CALIBRATION_KEY):
+            # 一部のケースのみ更新する場合は、既存のケースと同じ校正値を基準に換算して保存する
+            scale = baseline[CALIBRATION_KEY] / results.pop(CALIBRATION_KEY)
+            results = {name: value * scale for name, value in results.items()}
+        save_baseline(results)
+        print(f"Baseline updated: {BASELINE_FILE}")
+        return 0
+
+    regressions = compare(baseline, results, args.threshold)
+    for _ in range(CONFIRM_RUNS):
+        if not regressions:
+            break
+        # 一時的なばらつきを除くため、劣化したケースを計測し直して最小値を採用する
+        results[CALIBRATION_KEY] = min(results[CALIBRATION_KEY], calibrate())
+        for regression in regressions:
+            results[regression.name] = min(
+                results[regression.name], measure(runs[regression.name], args.repeat)
+            )
+        regressions = compare(baseline, results, args.threshold)
+
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression.name}: {regression.baseline * 1000:.3f} ms -> "
+            f"{regression.current * 1000:.3f} ms ({regression.ratio:.2f}x)"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+"""secrets-api の利用側クライアント.
+
+各サービスが行う「トークンファイルの待機 → 読み込み → Bearer トークン付きでの取得」をまとめたモジュールです。
+利用側のコンテナにそのまま配置できるよう、標準ライブラリのみに依存します。
+
+secrets-api はトークンファイルを rename で公開し、全てのファイルの公開後に完了マーカー（tokens.ready）を置くため、
+トークンファイルは見つけた時点で完全に書き込まれています。公開（rename）はファイルシステムの変更通知
+（Linux の inotify）で検知し、利用できない環境では stat によるポーリング（バックオフ付き）で待機します。
+完了マーカーがあるのにトークンファイルがない場合は、消費済み・失効済み・未発行として待機せずに失敗します。
+secrets-api はバッチが有効な間マーカーのロック（flock）を保持するため、異常終了したプロセスが残したマーカーは
+ロックの有無で見分け、そのマーカーと残ったトークンファイルは無視して新しいバッチの公開を待ちます。
+HTTP接続は一つを使い回し、接続エラーなどの一時的な失敗はジッター付きのバックオフで再試行します。
+
+例:
+    with SecretsClient("backend") as client:
+        secrets = client.fetch_bundle()"""
+
+import ctypes
+import ctypes.util
+import fcntl
+import http.client
+import json
+import os
+import random
+import select
+import socket
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+TOKEN_DIR = Path(os.environ.get("TOKEN_DIR", "/app/tokens"))
+# 全てのトークンファイルの公開後に作成される完了マーカー（services.token_service.READY_MARKER と同じ名前）
+READY_MARKER_NAME = "tokens.ready"
+# 接続先（http://host:port または unix:///path/to/socket）
+DEFAULT_BASE_URL = os.environ.get("SECRETS_API_URL", "http://localhost:5000")
+
+# ポーリング時の待機間隔（秒）。変更通知が使える場合も、この間隔で念のため再確認する
+POLL_INITIAL_INTERVAL = 0.01
+POLL_MAX_INTERVAL = 0.5
+
+# 一時的な失敗の再試行
+DEFAULT_RETRIES = 5
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 2.0
+
+# inotify の定数（<sys/inotify.h>）
+_IN_MOVED_TO = 0x00000080
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+
+class SecretsClientError(Exception):
+    """secrets-api が機密情報を返さなかった場合の例外."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        """初期化.
+
+        Args:
+            message: エラーメッセージ
+            status: HTTPステータスコード（応答がない場合はNone）"""
+        super().__init__(message)
+        self.status = status
+
+
+class _DirectoryWatch:
+    """inotify でディレクトリへのファイルの公開（rename）を待機するクラス."""
+
+    def __init__(self, fd: int):
+        """初期化（open() で作成する）."""
+        self._fd = fd
+        self._poller = select.poll()
+        self._poller.register(fd, select.POLLIN)
+
+    @classmethod
+    def open(cls, directory: Path) -> Optional["_DirectoryWatch"]:
+        """ディレクトリの監視を開始する.
+
+        Returns:
+            監視オブジェクト。inotify が利用できない場合はNone"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        # 公開前の一時ファイルの作成・書き込みでは起こされないよう、rename のみを監視する
+        if libc.inotify_add_watch(fd, os.fsencode(directory), _IN_MOVED_TO) < 0:
+            os.close(fd)
+            return None
+        return cls(fd)
+
+    def wait(self, timeout: float) -> None:
+        """ディレクトリに変更があるか、タイムアウトするまで待機する.
+
+        Args:
+            timeout: 最大待機秒数"""
+        if self._poller.poll(timeout * 1000):
+            try:
+                # イベントの内容は使わず、呼び出し側でファイルを再確認する
+                while os.read(self._fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self) -> None:
+        """監視を終了する."""
+        os.close(self._fd)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """Unix ドメインソケットに接続する HTTPConnection."""
+
+    def __init__(self, path: str, timeout: float):
+        """初期化."""
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self) -> None:
+        """Unix ドメインソケットに接続する."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+def read_token(token_file: Path) -> Optional[str]:
+    """トークンファイルを読み込む.
+
+    Args:
+        token_file: トークンファイルのパス
+
+    Returns:
+        トークン。ファイルが存在しない（または空の）場合はNone"""
+    try:
+        token = token_file.read_text().strip()
+    except FileNotFoundError:
+        return None
+    return token or None
+
+
+def read_published_batch(marker: Path) -> Optional[str]:
+    """完了マーカーが secrets-api が公開中のバッチのものであれば、バッチの識別子を返す.
+
+    Args:
+        marker: 完了マーカーのパス
+
+    Returns:
+        バッチの識別子。マーカーがない、または公開したプロセスが終了している（ロックが保持されていない）場合はNone"""
+    try:
+        fd = os.open(marker, os.O_RDONLY | os.O_CLOEXEC)
+    except FileNotFoundError:
+        return None
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # secrets-api が排他ロックを保持している
+            first_line = os.read(fd, 4096).decode(errors="replace").partition("\n")[0]
+            return first_line.partition("batch=")[2]
+        return None
+    finally:
+        os.close(fd)
+
+
+def wait_for_token_file(token_file: Path, timeout: Optional[float] = None) -> str:
+    """トークンファイルが公開されるまで待機し、トークンを返す.
+
+    Args:
+        token_file: トークンファイルのパス
+        timeout: 最大待機秒数（Noneの場合は無期限）
+
+    Returns:
+        トークン
+
+    Raises:
+        TimeoutError: タイムアウトした場合
+        SecretsClientError: 公開中のバッチの完了マーカーがあるのにトークンファイルがない場合"""
+    marker = token_file.parent / READY_MARKER_NAME
+    deadline = None if timeout is None else time.monotonic() + timeout
+    watch: Optional[_DirectoryWatch] = None
+    interval = POLL_INITIAL_INTERVAL
+    try:
+        while True:
+            # 監視の開始後にファイルを確認し、開始前に公開されたファイルも取りこぼさない
+            if watch is None and token_file.parent.is_dir():
+                watch = _DirectoryWatch.open(token_file.parent)
+            # マーカーはバッチの全てのファイルの後に公開されるため、先に確認する
+            batch = read_published_batch(marker)
+            # 公開したプロセスが終了しているマーカーが残っている場合は、残ったトークンファイルも無効
+            stale = batch is None and marker.exists()
+            token = None if stale else read_token(token_file)
+            if token is not None:
+                return token
+            if batch is not None:
+                raise SecretsClientError(
+                    f"Token file is not in the published batch {batch} "
+                    f"(consumed, expired or not issued): {token_file}"
+                )
+
+            remaining = POLL_MAX_INTERVAL if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Token file was not created: {token_file}")
+            if watch is not None:
+                watch.wait(min(remaining, POLL_MAX_INTERVAL))
+            else:
+                time.sleep(min(remaining, interval))
+                interval = min(interval * 2, POLL_MAX_INTERVAL)
+    finally:
+        if watch is not None:
+            watch.close()
+
+
+class SecretsClient:
+    """一つのサービスとして secrets-api から機密情報を取得するクライアント."""
+
+    def __init__(
+        self,
+        service: str,
+        base_url: str = DEFAULT_BASE_URL,
+        token_dir: Path = TOKEN_DIR,
+        timeout: float = 10.0,
+        retries: int = DEFAULT_RETRIES,
+    ):
+        """初期化.
+
+        Args:
+            service: サービス名（{service}_token.txt を読み込む）
+            base_url: 接続先（http://host:port または unix:///path/to/socket）
+            token_dir: トークンファイルのディレクトリ
+            timeout: 接続・応答の待機秒数
+            retries: 一時的な失敗の最大再試行回数"""
+        self.service = service
+        self.token_file = Path(token_dir) / f"{service}_token.txt"
+        self.timeout = timeout
+        self.retries = retries
+        self._url = urlsplit(base_url)
+        if self._url.scheme not in ("http", "unix"):
+            raise ValueError(f"Unsupported URL scheme: {base_url}")
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def __enter__(self) -> "SecretsClient":
+        """コンテキストマネージャーの開始."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """接続を閉じる."""
+        self.close()
+
+    def close(self) -> None:
+        """接続を閉じる."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def wait_for_token(self, timeout: Optional[float] = None) -> str:
+        """トークンファイルが公開されるまで待機し、トークンを返す.
+
+        Args:
+            timeout: 最大待機秒数（Noneの場合は無期限）
+
+        Raises:
+            TimeoutError: タイムアウトした場合
+            SecretsClientError: トークンが消費済み・失効済み・未発行の場合"""
+        return wait_for_token_file(self.token_file, timeout)
+
+    def wait_until_ready(self, wait: float = 30.0) -> Dict[str, Any]:
+        """secrets-api の準備が整うまでサーバー側で待機する（/ready の long-poll）.
+
+        Args:
+            wait: サーバー側での最大待機秒数
+
+        Returns:
+            /ready の応答
+
+        Raises:
+            SecretsClientError: 準備が整わなかった場合"""
+        status, body = self._request("GET", f"/ready?wait={wait:g}", timeout=self.timeout + wait)
+        if status != 200:
+            raise SecretsClientError(f"secrets-api is not ready: {body.get('stages')}", status)
+        return body
+
+    def fetch_bundle(self, token: Optional[str] = None) -> Dict[str, Any]:
+        """トークンの発行先サービスに許可された機密情報をまとめて取得する.
+
+        Args:
+            token: トークン（省略時はトークンファイルを待機して読み込む）
+
+        Returns:
+            機密情報の辞書（例: {"database": {"password": "..."}}）"""
+        return self._fetch("/secrets/bundle", token)["secrets"]
+
+    def fetch_database_password(self, token: Optional[str] = None) -> str:
+        """データベースのパスワードを取得する.
+
+        Args:
+            token: トークン（省略時はトークンファイルを待機して読み込む）"""
+        return self._fetch("/secrets/database/password", token)["password"]
+
+    def _fetch(self, path: str, token: Optional[str]) -> Dict[str, Any]:
+        """Bearer トークン付きで機密情報を取得する."""
+        if token is None:
+            token = self.wait_for_token()
+        status, body = self._request("GET", path, {"Authorization": f"Bearer {token}"})
+        if status != 200:
+            raise SecretsClientError(body.get("error", f"HTTP {status}"), status)
+        return body
+
+    def _request(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Tuple[int, Dict[str, Any]]:
+        """リクエストを送信し、ステータスコードとJSONの応答を返す.
+
+        接続の拒否・切断は一時的な失敗として、ジッター付きのバックオフで再試行します
+        （持続接続がサーバー側で閉じられていた場合も含む）。secrets-api はトークンの公開後に待ち受けを始めるため、
+        Unix ドメインソケットのファイルがまだない場合（FileNotFoundError）も同様に再試行します。リクエストの送信後に切断された場合、
+        トークンは消費済みの可能性があり、再試行は 403 になることがあります。
+
+        Raises:
+            SecretsClientError: 再試行しても接続できなかった場合"""
+        attempt = 0
+        while True:
+            conn = self._connection()
+            conn.timeout = timeout or self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            try:
+                conn.request(method, path, headers=headers or {})
+                response = conn.getresponse()
+                raw = response.read()
+            except (ConnectionError, FileNotFoundError) as e:
+                self.close()
+                if attempt >= self.retries:
+                    raise SecretsClientError(f"Failed to connect to secrets-api: {e}") from e
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt)
+                time.sleep(random.uniform(0, delay))
+                attempt += 1
+                continue
+
+            if response.will_close:
+                self.close()
+            try:
+                return response.status, json.loads(raw or b"{}")
+            except ValueError:
+                return response.status, {}
+
+    def _connection(self) -> http.client.HTTPConnection:
+        """持続接続を返す（未接続の場合は作成する）."""
+        if self._conn is None:
+            if self._url.scheme == "unix":
+                self._conn = _UnixHTTPConnection(self._url.path, self.timeout)
+            else:
+                self._conn = http.client.HTTPConnection(
+                    self._url.hostname or "localhost", self._url.port or 80, timeout=self.timeout
+                )
+        return self._conn
@@ -1,10 +1,15 @@
 import os
+import re
+import threading
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Collection, Dict, Iterable, List, Optional
 
 import yaml
+from cryptography.fernet import InvalidToken
 
-from .secrets import SecretManager
+from services.metrics import metrics
+
+from .secrets import METADATA_KEY, EncryptedValue, SecretDecryptionError, SecretManager
 
 # 設定ファイルのパス
 APP_ROOT = Path(os.environ.get("APP_ROOT", "/app"))
@@ -12,79 +17,416 @@ CONFIG_DIR = Path(os.environ.get("SECRETS_CONFIG_DIR", str(APP_ROOT / "secrets_c
 CONFIG_FILE = CONFIG_DIR / "config.yaml"
 SECRETS_FILE = CONFIG_DIR / "secrets.yaml.encrypted"
 
+# config.yaml に services の定義がない場合のトークン発行先と、各サービスが取得できる機密情報
+DEFAULT_SERVICES: Dict[str, List[str]] = {
+    "database": ["database.password"],
+    "backend": ["database.password"],
+}
+
+# トークンの既定の有効期間（秒）。config.yaml の token_ttl またはサービスごとの ttl で上書きできる
+DEFAULT_TOKEN_TTL = 300  # 5分
+
+# サービス名はトークンファイル名に使うため、安全な文字のみ許可する
+_SERVICE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# libyaml が利用できる場合は C 実装のローダーを使う（大きな暗号化ファイルでは解析が読み込み時間の大半を占める）
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def load_yaml(stream: Any) -> Any:
+    """YAML を yaml.safe_load と同じ規則で読み込む（libyaml があれば C 実装を使う）."""
+    return yaml.load(stream, Loader=_YAML_LOADER)
 
-def _get_secrets_from_encrypted_file(secret_key: str) -> dict:
-    """Fernetで暗号化されたファイルから機密情報を取得."""
+
+def _decrypt_secrets_file(
+    secret_key: str, lazy: bool = False, cache: Optional[Dict[str, str]] = None
+) -> dict:
+    """暗号化ファイルを読み込んで復号する（失敗時は例外を送出）.
+
+    Raises:
+        SecretDecryptionError: 復号できなかった値がある場合
+        cryptography.fernet.InvalidToken: バンドルを復号できない場合
+        OSError, ValueError, yaml.YAMLError: ファイルを読み込めない、または形式が不正な場合"""
     if not SECRETS_FILE.exists():
         return {}
+    return decode_secrets(SECRETS_FILE.read_bytes(), secret_key, lazy, cache)
 
-    try:
-        with open(SECRETS_FILE, "r", encoding="utf-8") as f:
-            secrets_data = yaml.safe_load(f) or {}
-
-        if not secrets_data:
-            return {}
-
-        secret_manager = SecretManager(secret_key=secret_key)
-        decrypted_secrets = {}
-
-        for key, value in secrets_data.items():
-            if isinstance(value, dict):
-                decrypted_secrets[key] = {}
-                for sub_key, sub_value in value.items():
-                    if SecretManager.is_encrypted(str(sub_value)):
-                        encrypted_value = SecretManager.extract_encrypted_value(str(sub_value))
-                        decrypted_secrets[key][sub_key] = secret_manager.decrypt(encrypted_value)
-                    else:
-                        decrypted_secrets[key][sub_key] = sub_value
-            elif SecretManager.is_encrypted(str(value)):
-                encrypted_value = SecretManager.extract_encrypted_value(str(value))
-                decrypted_secrets[key] = secret_manager.decrypt(encrypted_value)
-            else:
-                decrypted_secrets[key] = value
 
-        return decrypted_secrets
-    except Exception as e:
+def decode_secrets(
+    raw: bytes, secret_key: str, lazy: bool = False, cache: Optional[Dict[str, str]] = None
+) -> dict:
+    """暗号化ファイルの内容（バンドル形式または値ごとの形式）を復号する（失敗時は例外を送出）.
+
+    起動時の読み込みと同じ処理で、暗号化ファイルの検証（config.encrypt --verify）にも使います。
+
+    Raises:
+        SecretDecryptionError: 復号できなかった値がある場合
+        cryptography.fernet.InvalidToken: バンドルを復号できない場合
+        ValueError, yaml.YAMLError: 形式が不正な場合"""
+    if SecretManager.is_bundle(raw):
+        kdf = SecretManager.bundle_metadata(raw).get("kdf")
+        return SecretManager(secret_key=secret_key, kdf=kdf).decrypt_bundle(raw, cache=cache)
+
+    with metrics.timed("yaml_parse"):
+        secrets_data = load_yaml(raw) or {}
+    if not isinstance(secrets_data, dict):
+        raise ValueError("secrets file must contain a mapping")
+
+    metadata = secrets_data.pop(METADATA_KEY, None)
+    if not isinstance(metadata, dict):
+        metadata = {}
+    if not secrets_data:
+        return {}
+
+    secret_manager = SecretManager(secret_key=secret_key, kdf=metadata.get("kdf"))
+    if lazy:
+        return secret_manager.defer_tree(secrets_data)
+    return secret_manager.decrypt_tree(secrets_data, cache=cache)
+
+
+def _get_secrets_from_encrypted_file(
+    secret_key: str, lazy: bool = False, cache: Optional[Dict[str, str]] = None
+) -> dict:
+    """Fernetで暗号化されたファイルから機密情報を取得.
+
+    バンドル形式（SecretManager.encrypt_bundle）の場合は一度の復号で全件を取得し、
+    それ以外は `encrypted:` 接頭辞が付いた値を階層の深さに関わらず一括で復号します。
+    鍵導出関数はファイルのメタデータ（バンドルのヘッダー、またはYAMLの `_meta.kdf`）に従い、
+    記録がない場合は従来の PBKDF2-SHA256 を使います。
+    復号できなかった値がある場合はパスごとに報告し、その値のみを除いた復号結果を返します
+    （除いた値は Config.missing_secrets で取得できない機密情報として報告されます）。
+    ファイルを読み込めない場合や予期しない例外の場合は、報告して空の辞書を返します（起動処理は止めない）。
+
+    lazy=True の場合、値ごとの形式では復号せず EncryptedValue として返します
+    （バンドル形式は一度の復号で済むため、常に復号します）。
+    cache を指定した場合は、前回から暗号文が変わった値のみを復号します（SecretManager.decrypt_tree）。"""
+    try:
+        return _decrypt_secrets_file(secret_key, lazy, cache)
+    except SecretDecryptionError as e:
+        for path, reason in e.errors.items():
+            print(f"Error decrypting secret '{path}': {reason}")
+        return e.decrypted if isinstance(e.decrypted, dict) else {}
+    except InvalidToken:
+        print("Error decrypting secrets bundle: invalid token (wrong secret_key or corrupted file)")
+        return {}
+    except (OSError, ValueError, yaml.YAMLError) as e:
         print(f"Error loading encrypted secrets: {e}")
         return {}
+    except Exception as e:
+        # バックグラウンドの読み込みから例外を漏らさず、取得できない機密情報として起動を続ける
+        print(f"Error loading encrypted secrets: {type(e).__name__}: {e}")
+        return {}
 
 
-def _load_config() -> dict:
-    """設定をロードする."""
+def _parse_config_file() -> dict:
+    """config.yaml を読み込む（失敗時は例外を送出）."""
+    with open(CONFIG_FILE, "r", encoding="utf-8") as f, metrics.timed("yaml_parse"):
+        config = load_yaml(f) or {}
+    if not isinstance(config, dict):
+        raise ValueError("config.yaml must contain a mapping")
+    return config
+
+
+def _read_config_file() -> dict:
+    """config.yaml を読み込む（機密情報の復号は行わない）."""
     config = {}
     if CONFIG_FILE.exists():
         try:
-            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                config = yaml.safe_load(f) or {}
+            config = _parse_config_file()
         except Exception as e:
             print(f"Error loading config.yaml: {e}")
+    return config
+
 
+def _merge_secrets(
+    config: dict, cache: Optional[Dict[str, str]] = None, strict: bool = False
+) -> dict:
+    """暗号化ファイルの機密情報を復号し、設定にマージした新しい辞書を返す.
+
+    Args:
+        config: config.yaml の内容
+        cache: 前回の復号結果（_get_secrets_from_encrypted_file の cache）
+        strict: True の場合、復号に失敗すると空の辞書をマージせずに例外を送出する"""
+    merged = dict(config)
     secret_key = config.get("secret_key")
     if secret_key:
-        secrets = _get_secrets_from_encrypted_file(secret_key)
-        # データベース設定をマージ
-        if "database" in secrets:
-            if "database" not in config:
-                config["database"] = {}
-            config["database"].update(secrets["database"])
+        load = _decrypt_secrets_file if strict else _get_secrets_from_encrypted_file
+        secrets = load(secret_key, lazy=bool(config.get("lazy_decrypt", False)), cache=cache)
+        # 機密情報を設定にマージ
+        for key, value in secrets.items():
+            if isinstance(value, dict) and isinstance(config.get(key), dict):
+                merged[key] = {**config[key], **value}
+            else:
+                merged[key] = value
+    return merged
 
-    return config
+
+def _load_config() -> dict:
+    """設定をロードする."""
+    return _merge_secrets(_read_config_file())
+
+
+def _parse_services(config: dict) -> Dict[str, List[str]]:
+    """config.yaml の services 定義を「サービス名 -> 取得可能な機密情報のパス」に変換する.
+
+    例:
+        services:
+          backend:
+            secrets:
+              - database.password"""
+    services = config.get("services")
+    if services is None:
+        return {name: list(paths) for name, paths in DEFAULT_SERVICES.items()}
+    if not isinstance(services, dict):
+        print("Error loading services: 'services' must be a mapping.")
+        return {}
+
+    parsed: Dict[str, List[str]] = {}
+    for name, definition in services.items():
+        name = str(name)
+        if not _SERVICE_NAME_PATTERN.match(name):
+            print(f"Error loading services: invalid service name '{name}'.")
+            continue
+        paths = definition.get("secrets") if isinstance(definition, dict) else None
+        parsed[name] = [str(path) for path in paths or []]
+    return parsed
+
+
+def _parse_ttl(value: Any, default: float, name: str) -> float:
+    """有効期間（秒）を検証して返す。不正な値の場合は既定値を使う."""
+    if value is None:
+        return default
+    try:
+        ttl = float(value)
+    except (TypeError, ValueError):
+        ttl = 0
+    if ttl <= 0:
+        print(f"Error loading {name}: ttl must be a positive number of seconds.")
+        return default
+    return ttl
+
+
+def _parse_token_ttls(config: dict, services: Dict[str, List[str]]) -> Dict[str, float]:
+    """サービスごとのトークン有効期間（秒）を返す.
+
+    例:
+        token_ttl: 300
+        services:
+          database:
+            ttl: 30"""
+    default = _parse_ttl(config.get("token_ttl"), DEFAULT_TOKEN_TTL, "token_ttl")
+    definitions = config.get("services")
+    if not isinstance(definitions, dict):
+        definitions = {}
+
+    ttls = {}
+    for name in services:
+        definition = definitions.get(name)
+        value = definition.get("ttl") if isinstance(definition, dict) else None
+        ttls[name] = _parse_ttl(value, default, f"services.{name}.ttl")
+    return ttls
+
+
+def _lookup(config: dict, path: str) -> Any:
+    """ドット区切りのパス（例: database.password）で設定値を取得する."""
+    value: Any = config
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
 
 
 class Config:
-    """アプリケーション設定クラス."""
+    """アプリケーション設定クラス.
 
-    _config = _load_config()
+    import 時には設定を読み込まず、`load_app_config` を呼び出した時点で読み込みます。
+    鍵導出（PBKDF2）は重い処理のため、起動時に一度だけ明示的に呼び出してください。"""
+
+    _config: dict = {}
+
+    # 遅延復号モードで復号済みの値（パス -> 平文）。トークンの消費後に破棄される
+    _plaintext: Dict[str, Any] = {}
+    _plaintext_lock = threading.Lock()
+
+    # 再読み込み時に変更された値のみを復号するための前回の復号結果（enable_reload で有効化）
+    _decryption_cache: Optional[Dict[str, str]] = None
+    _reload_lock = threading.Lock()
 
     # サーバー設定
     PORT = int(os.environ.get("PORT", 5000))
     DEBUG = os.environ.get("FLASK_ENV") == "development"
 
-    # データベースパスワード (復号化済み)
-    DB_PASSWORD = _config.get("database", {}).get("password")
+    # データベースパスワード (復号化済み、load_app_config 呼び出しまでは None)
+    # 遅延復号モードでは保持しないため常に None（get_secret を使用する）
+    DB_PASSWORD: Optional[str] = None
+
+    # 遅延復号モード（config.yaml の lazy_decrypt）
+    # 起動時は鍵導出のみ行い、各値は最初に要求された時点で復号する
+    LAZY_DECRYPT = False
+
+    # トークン発行先サービスと、各サービスが取得できる機密情報のパス
+    SERVICES: Dict[str, List[str]] = {}
+
+    # サービスごとのトークン有効期間（秒）
+    TOKEN_TTLS: Dict[str, float] = {}
+
+    # config.yaml を読み込めたかどうか（存在しない、または不正な場合は False）
+    CONFIG_LOADED = False
 
     @classmethod
     def load_app_config(cls) -> None:
-        """設定を再読み込みする."""
-        cls._config = _load_config()
-        cls.DB_PASSWORD = cls._config.get("database", {}).get("password")
+        """設定を読み込む."""
+        cls.load_base_config()
+        cls.load_secrets()
+
+    @classmethod
+    def load_base_config(cls) -> None:
+        """config.yaml のみを読み込む（サービス定義など、機密情報に依存しない設定）.
+
+        鍵導出と復号を行う load_secrets と分けることで、起動時に並行して実行できます。"""
+        config = _read_config_file()
+        with cls._plaintext_lock:
+            cls._config = config
+            cls._plaintext = {}
+        cls.CONFIG_LOADED = bool(config)
+        cls.LAZY_DECRYPT = bool(config.get("lazy_decrypt", False))
+        cls.DB_PASSWORD = None
+        cls.SERVICES = _parse_services(config)
+        cls.TOKEN_TTLS = _parse_token_ttls(config, cls.SERVICES)
+
+    @classmethod
+    def load_secrets(cls) -> None:
+        """鍵を導出して機密情報を復号し、読み込み済みの設定にマージする."""
+        with cls._reload_lock:
+            cls._install(_merge_secrets(cls._config, cache=cls._decryption_cache))
+
+    @classmethod
+    def enable_reload(cls) -> None:
+        """再読み込みに備えて復号結果を保持する（load_secrets より前に呼ぶと、初回の再読み込みから差分のみ復号する）."""
+        if cls._decryption_cache is None:
+            cls._decryption_cache = {}
+
+    @classmethod
+    def reload(cls) -> bool:
+        """config.yaml と暗号化ファイルを読み直し、設定を置き換える.
+
+        鍵導出は secret_key と KDF パラメータが変わらない限りキャッシュを再利用し、
+        復号は前回から暗号文が変わった値のみ行います。新しい設定は全ての復号が終わってから一度に置き換えるため、
+        処理中のリクエストは古い設定か新しい設定のどちらか一方を参照します。
+        読み込みや復号に失敗した場合は現在の設定を維持します。
+        トークンの発行先サービス（services）と有効期間は発行済みのトークンに関わるため、再起動時にのみ反映されます。
+
+        Returns:
+            設定を置き換えた場合True"""
+        cls.enable_reload()
+        with cls._reload_lock, metrics.timed("config_reload"):
+            try:
+                config = _parse_config_file()
+                if not config:
+                    raise ValueError("config.yaml is empty")
+                merged = _merge_secrets(config, cache=cls._decryption_cache, strict=True)
+            except SecretDecryptionError as e:
+                for path, reason in e.errors.items():
+                    print(f"Error reloading secret '{path}': {reason}")
+                return False
+            except InvalidToken:
+                print(
+                    "Error reloading secrets bundle: "
+                    "invalid token (wrong secret_key or corrupted file)"
+                )
+                return False
+            except (OSError, ValueError, yaml.YAMLError) as e:
+                print(f"Error reloading configuration: {e}")
+                return False
+            cls._install(merged)
+            cls.LAZY_DECRYPT = bool(merged.get("lazy_decrypt", False))
+        return True
+
+    @classmethod
+    def _install(cls, config: dict) -> None:
+        """復号済みの設定に置き換える."""
+        with cls._plaintext_lock:
+            cls._config = config
+            cls._plaintext = {}
+        db_password = config.get("database", {}).get("password")
+        cls.DB_PASSWORD = None if isinstance(db_password, EncryptedValue) else db_password
+
+    @classmethod
+    def current_config(cls) -> dict:
+        """現在の設定を返す（読み込み・再読み込みのたびに別の辞書に置き換わるため、変更の検知に使える）.
+
+        内容は変更しないでください。"""
+        return cls._config
+
+    @classmethod
+    def missing_secrets(cls) -> List[str]:
+        """トークン発行先サービスに許可されているが、取得できない機密情報のパスを返す.
+
+        復号に失敗した場合は機密情報が設定にマージされないため、ここに含まれます
+        （遅延復号モードでは値ごとの復号は行わないため、値の有無のみを確認します）。"""
+        paths = {path for secret_paths in cls.SERVICES.values() for path in secret_paths}
+        return sorted(path for path in paths if _lookup(cls._config, path) is None)
+
+    @classmethod
+    def sensitive_values(cls) -> List[str]:
+        """ログやプロファイルに出力してはならない値（secret_key と復号済みの機密情報）を返す."""
+        values = [cls._config.get("secret_key")]
+        for paths in cls.SERVICES.values():
+            values.extend(_lookup(cls._config, path) for path in paths)
+        with cls._plaintext_lock:
+            values.extend(cls._plaintext.values())
+        return [value for value in values if isinstance(value, str) and value]
+
+    @classmethod
+    def get_secret(cls, path: str) -> Any:
+        """ドット区切りのパスで機密情報を取得する.
+
+        Args:
+            path: 機密情報のパス（例: database.password）
+
+        Returns:
+            機密情報の値。存在しない場合、または復号できない場合はNone"""
+        value = _lookup(cls._config, path)
+        if not isinstance(value, EncryptedValue):
+            return value
+
+        with cls._plaintext_lock:
+            if path in cls._plaintext:
+                return cls._plaintext[path]
+            try:
+                plaintext = value.decrypt()
+            except (InvalidToken, ValueError, UnicodeDecodeError) as e:
+                print(f"Error decrypting secret '{path}': {e or 'invalid token'}")
+                return None
+            cls._plaintext[path] = plaintext
+            return plaintext
+
+    @classmethod
+    def release_secrets(cls, keep: Collection[str] = ()) -> None:
+        """遅延復号モードで復号済みの値を破棄する.
+
+        Args:
+            keep: 破棄せずに保持する値のパス（未消費のトークンが取得できる値）"""
+        with cls._plaintext_lock:
+            for path in list(cls._plaintext):
+                if path not in keep:
+                    del cls._plaintext[path]
+
+    @classmethod
+    def get_bundle(cls, secret_paths: Iterable[str]) -> Dict[str, Any]:
+        """指定された機密情報をまとめて、元の階層構造のまま返す.
+
+        Args:
+            secret_paths: 機密情報のパスの一覧（例: ["database.password"]）
+
+        Returns:
+            機密情報の辞書（例: {"database": {"password": "..."}}）"""
+        bundle: Dict[str, Any] = {}
+        for path in secret_paths:
+            *parents, leaf = path.split(".")
+            node = bundle
+            for part in parents:
+                node = node.setdefault(part, {})
+            node[leaf] = cls.get_secret(path)
+        return bundle
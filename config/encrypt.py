@@ -0,0 +1,303 @@
+"""暗号化ファイル（secrets.yaml.encrypted）の生成コマンド.
+
+平文の YAML（ファイルまたは標準入力）を読み込み、全ての値を階層の深さに関わらず暗号化した
+secrets.yaml.encrypted を出力します。鍵の導出は一度だけ行い、値が多い場合は全てのトップレベルのキーの値を
+まとめて一定件数ずつに分け、プロセスプールで並列に暗号化します（暗号化は GIL を保持するため、スレッドでは速くならない）。
+出力はトップレベルのキーごとに、そのキーの値の暗号化が終わった時点で順に書き出します（libyaml があれば C 実装で書き出す）。
+
+使い方:
+    python -m config.encrypt secrets.yaml -o secrets.yaml.encrypted --config config.yaml --verify
+    SECRET_KEY=... python -m config.encrypt - --kdf scrypt < secrets.yaml > secrets.yaml.encrypted
+    python -m config.encrypt secrets.yaml --bundle -o secrets.yaml.encrypted --config config.yaml
+
+secret_key は --config で指定した config.yaml の secret_key、または環境変数（--key-env、既定 SECRET_KEY）から
+読み込みます（コマンドライン引数で渡すとプロセス一覧から見えてしまうため、引数では受け付けません）。
+数値・真偽値は文字列として暗号化します（復号後は文字列になるため警告を表示します）。
+既に `encrypted:` 形式の値は、入力の `_meta` と同じ鍵で出力する場合（--kdf を省略した場合）はそのまま出力し、
+鍵が変わる場合は入力の鍵で復号してから暗号化し直します。
+
+ファイルへの出力は同じディレクトリの一時ファイル（権限 0600）に書き込んでから置き換えるため、
+途中で失敗しても既存のファイルは壊れません。--verify を指定すると、出力を起動時と同じ処理（config.decode_secrets）で
+復号して入力と一致することを確認し、一致しない場合は置き換えずに終了コード1で終了します。"""
+
+import argparse
+import copy
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+import yaml
+from cryptography.fernet import InvalidToken
+
+from . import decode_secrets, load_yaml
+from .kdf import KDF_FUNCTIONS, generate_kdf_params
+from .secrets import (
+    METADATA_KEY, SecretDecryptionError, SecretManager, _collect_plaintext_leaves, _EncryptedLeaf,
+)
+
+DEFAULT_KEY_ENV = "SECRET_KEY"
+# プロセスプールの一つのタスクで暗号化する値の件数
+# 値ごとの暗号化（約13µs）に対してタスクの受け渡し（プロセス間の転送）が十分小さくなる件数にする
+ENCRYPT_CHUNK_SIZE = 512
+# 値の件数がこれ未満の場合は、プロセスの起動の方が高くつくため一つのプロセスで順に暗号化する
+PARALLEL_ENCRYPT_THRESHOLD = 2 * ENCRYPT_CHUNK_SIZE
+
+# libyaml が利用できる場合は C 実装で書き出す（長い暗号文の書き出しは Python 実装では暗号化より遅い）
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# ワーカープロセスで使う SecretManager（_init_worker で設定する）
+_worker_manager: Optional[SecretManager] = None
+
+
+class VerificationError(Exception):
+    """出力を復号した結果が入力と一致しない場合の例外."""
+
+
+def read_secret_key(config_path: Optional[Path], key_env: str) -> str:
+    """secret_key を config.yaml または環境変数から読み込む.
+
+    Raises:
+        ValueError: secret_key が見つからない、または文字列でない場合（起動時の読み込みと同じく受け付けない）"""
+    if config_path is not None:
+        config = load_yaml(config_path.read_text(encoding="utf-8")) or {}
+        secret_key = config.get("secret_key") if isinstance(config, dict) else None
+        if not secret_key:
+            raise ValueError(f"secret_key is not set in {config_path}")
+        if not isinstance(secret_key, str):
+            raise ValueError(f"secret_key in {config_path} must be a string (quote it in YAML)")
+        return secret_key
+    secret_key = os.environ.get(key_env)
+    if not secret_key:
+        raise ValueError(f"secret_key not found: set ${key_env} or pass --config")
+    return secret_key
+
+
+def stringify_scalars(data: Any, path: str = "") -> List[str]:
+    """数値・真偽値を文字列に置き換え、置き換えた値のパスを返す（暗号化できるのは文字列のみのため）."""
+    if isinstance(data, dict):
+        items = [(key, f"{path}.{key}" if path else str(key)) for key in data]
+    elif isinstance(data, list):
+        items = [(index, f"{path}[{index}]") for index in range(len(data))]
+    else:
+        return []
+
+    converted = []
+    for key, child_path in items:
+        value = data[key]
+        if isinstance(value, (dict, list)):
+            converted.extend(stringify_scalars(value, child_path))
+        elif isinstance(value, (bool, int, float)):
+            data[key] = str(value).lower() if isinstance(value, bool) else str(value)
+            converted.append(child_path)
+    return converted
+
+
+def _dump_yaml(data: Dict[str, Any]) -> bytes:
+    """YAML を yaml.safe_dump と同じ規則で書き出す（キーは入力の順）."""
+    return yaml.dump(data, Dumper=_YAML_DUMPER, sort_keys=False, allow_unicode=True).encode()
+
+
+def _init_worker(manager: SecretManager) -> None:
+    """ワーカープロセスの初期化（導出済みの鍵を持つ SecretManager を受け取り、鍵を導出し直さない）."""
+    global _worker_manager
+    _worker_manager = manager
+
+
+def _encrypt_chunk(plaintexts: List[str]) -> List[str]:
+    """ワーカープロセスで値をまとめて暗号化する."""
+    assert _worker_manager is not None
+    return [_worker_manager.encrypt(plaintext) for plaintext in plaintexts]
+
+
+def encrypt_sections(
+    manager: SecretManager, data: Dict[str, Any], workers: int = 1
+) -> Iterator[bytes]:
+    """値ごとに暗号化した YAML を、メタデータの後にトップレベルのキーごとに返す.
+
+    全てのトップレベルのキーの値をまとめて ENCRYPT_CHUNK_SIZE 件ずつに分け、最初に全てのタスクを
+    プロセスプールに投入します。各キーはその値を含むタスクが終わった時点で返すため、
+    後続のタスクの暗号化と出力の書き込みが重なります。
+
+    Args:
+        manager: 暗号化に使う SecretManager
+        data: 平文の機密情報（暗号化結果で直接書き換えられる）
+        workers: 暗号化のプロセス数（1以下、または値が PARALLEL_ENCRYPT_THRESHOLD 件未満の場合は順に暗号化する）
+
+    Returns:
+        YAML の断片（順に連結すると secrets.yaml.encrypted になる）"""
+    yield _dump_yaml({METADATA_KEY: manager.yaml_metadata()})
+    sections = [{key: value} for key, value in data.items()]
+    leaves = [_collect_plaintext_leaves(section) for section in sections]
+    plaintexts = [leaf[3] for section_leaves in leaves for leaf in section_leaves]
+
+    if workers <= 1 or len(plaintexts) < PARALLEL_ENCRYPT_THRESHOLD:
+        yield from _write_sections(sections, leaves, map(manager.encrypt, plaintexts))
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(manager,)) as executor:
+        futures = [
+            executor.submit(_encrypt_chunk, plaintexts[start:start + ENCRYPT_CHUNK_SIZE])
+            for start in range(0, len(plaintexts), ENCRYPT_CHUNK_SIZE)
+        ]
+        ciphertexts = (ciphertext for future in futures for ciphertext in future.result())
+        yield from _write_sections(sections, leaves, ciphertexts)
+
+
+def _write_sections(
+    sections: List[Dict[str, Any]], leaves: List[List[_EncryptedLeaf]], ciphertexts: Iterator[str]
+) -> Iterator[bytes]:
+    """暗号文を値の順に書き戻し、トップレベルのキーごとに YAML を返す."""
+    for section, section_leaves in zip(sections, leaves):
+        for (container, key, _, _), ciphertext in zip(
+            section_leaves, islice(ciphertexts, len(section_leaves))
+        ):
+            container[key] = f"encrypted:{ciphertext}"  # type: ignore[index]
+        yield _dump_yaml(section)
+
+
+def diff_paths(expected: Any, actual: Any, path: str = "") -> List[str]:
+    """二つの値の異なる箇所のパスを返す."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        paths = []
+        for key in list(expected) + [key for key in actual if key not in expected]:
+            child_path = f"{path}.{key}" if path else str(key)
+            if key not in expected or key not in actual:
+                paths.append(child_path)
+            else:
+                paths.extend(diff_paths(expected[key], actual[key], child_path))
+        return paths
+    if isinstance(expected, list) and isinstance(actual, list) and len(expected) == len(actual):
+        paths = []
+        for index, (left, right) in enumerate(zip(expected, actual)):
+            paths.extend(diff_paths(left, right, f"{path}[{index}]"))
+        return paths
+    return [] if expected == actual else [path or "(root)"]
+
+
+def verify(raw: bytes, secret_key: str, expected: Dict[str, Any]) -> None:
+    """出力を起動時と同じ処理で復号し、入力と一致することを確認する.
+
+    Raises:
+        VerificationError: 復号できない、または入力と一致しない場合"""
+    try:
+        loaded = decode_secrets(raw, secret_key)
+    except SecretDecryptionError as e:
+        raise VerificationError(f"cannot decrypt: {', '.join(e.errors)}") from e
+    except (InvalidToken, ValueError, yaml.YAMLError) as e:
+        raise VerificationError(f"cannot load the output: {e or 'invalid token'}") from e
+    mismatched = diff_paths(expected, loaded)
+    if mismatched:
+        raise VerificationError(f"decrypted values differ at: {', '.join(mismatched)}")
+
+
+@contextmanager
+def open_output(path: str) -> Iterator[BinaryIO]:
+    """出力先を開く（ファイルの場合はブロックを正常に抜けた時点で一時ファイルから置き換える）."""
+    if path == "-":
+        yield sys.stdout.buffer
+        sys.stdout.buffer.flush()
+        return
+
+    target = Path(path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{target.name}.", dir=target.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, target)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """暗号化ファイルを生成する.
+
+    Returns:
+        終了コード（失敗した場合は1）"""
+    parser = argparse.ArgumentParser(description="Encrypt a plaintext secrets YAML")
+    parser.add_argument("input", help="平文の YAML ファイル（- の場合は標準入力）")
+    parser.add_argument("-o", "--output", default="-", help="出力先（既定は標準出力）")
+    parser.add_argument("--config", type=Path, help="secret_key を読み込む config.yaml")
+    parser.add_argument("--key-env", default=DEFAULT_KEY_ENV, help="secret_key を読み込む環境変数")
+    parser.add_argument(
+        "--kdf",
+        choices=sorted(KDF_FUNCTIONS),
+        help="鍵導出関数（既定は入力のメタデータの KDF、メタデータがなければ pbkdf2-sha256）",
+    )
+    parser.add_argument("--bundle", action="store_true", help="バンドル形式で出力する")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="暗号化のプロセス数")
+    parser.add_argument("--verify", action="store_true", help="出力を復号して入力と一致するか確認する")
+    args = parser.parse_args(argv)
+
+    try:
+        secret_key = read_secret_key(args.config, args.key_env)
+        source = sys.stdin.read() if args.input == "-" else Path(args.input).read_text("utf-8")
+        data = load_yaml(source) or {}
+        if not isinstance(data, dict):
+            raise ValueError("input must contain a mapping")
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    metadata = data.pop(METADATA_KEY, None)
+    input_kdf = metadata.get("kdf") if isinstance(metadata, dict) else None
+    for path in stringify_scalars(data):
+        print(
+            f"Warning: '{path}' is not a string; it will be decrypted as a string.",
+            file=sys.stderr,
+        )
+
+    # 既に暗号化済みの値は入力のメタデータの KDF で復号する（検証用の期待値およびバンドルの内容）
+    try:
+        source = SecretManager(secret_key=secret_key, kdf=input_kdf)
+    except ValueError as e:
+        print(f"Error: invalid {METADATA_KEY}.kdf in the input: {e}", file=sys.stderr)
+        return 1
+    if input_kdf and not args.kdf:
+        kdf = source.kdf
+    else:
+        kdf = generate_kdf_params(args.kdf or "pbkdf2-sha256")
+    manager = SecretManager(secret_key=secret_key, kdf=kdf)
+    try:
+        expected = source.decrypt_tree(copy.deepcopy(data))
+    except SecretDecryptionError as e:
+        for path, reason in e.errors.items():
+            print(f"Error decrypting existing value '{path}': {reason}", file=sys.stderr)
+        return 1
+    if manager.kdf != source.kdf:
+        # 鍵が変わる場合は、暗号化済みの値もそのままでは復号できないため暗号化し直す
+        data = copy.deepcopy(expected)
+
+    written: List[bytes] = []
+    try:
+        with open_output(args.output) as output:
+            chunks = (
+                iter([manager.encrypt_bundle(expected)]) if args.bundle
+                else encrypt_sections(manager, data, args.workers)
+            )
+            for chunk in chunks:
+                output.write(chunk)
+                written.append(chunk)
+            if args.verify:
+                verify(b"".join(written), secret_key, expected)
+    except VerificationError as e:
+        print(f"Verification failed: {e}", file=sys.stderr)
+        return 1
+    except OSError as e:
+        print(f"Error writing {args.output}: {e}", file=sys.stderr)
+        return 1
+
+    if args.verify:
+        print(f"Verified {len(expected)} top-level section(s).", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""鍵導出関数（KDF）モジュール.
+
+暗号化ファイルのメタデータで指定された KDF で、secret_key から Fernet 鍵を導出します。
+メタデータを持たないファイルは従来の PBKDF2-SHA256（100,000回）で導出します。
+
+対応する KDF:
+    pbkdf2-sha256: {"name": "pbkdf2-sha256", "iterations": 100000, "salt": "<base64>"}
+    scrypt:        {"name": "scrypt", "n": 16384, "r": 8, "p": 1, "salt": "<base64>"}
+    raw:           {"name": "raw"}  secret_key に Fernet 鍵（32バイトのURL-safe Base64）を直接指定"""
+
+import base64
+import binascii
+import json
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+# 従来の鍵導出パラメータ（メタデータを持たないファイルに適用）
+DEFAULT_SALT = b"art_gallery_salt"
+DEFAULT_ITERATIONS = 100000
+DEFAULT_KDF: Dict[str, Any] = {
+    "name": "pbkdf2-sha256",
+    "iterations": DEFAULT_ITERATIONS,
+    "salt": base64.urlsafe_b64encode(DEFAULT_SALT).decode(),
+}
+
+# scrypt の既定パラメータ
+SCRYPT_DEFAULTS: Dict[str, Any] = {"n": 2**14, "r": 8, "p": 1}
+
+KEY_LENGTH = 32
+
+# KDF名 -> 正の整数でなければならないパラメータ
+INTEGER_PARAMS: Dict[str, Tuple[str, ...]] = {
+    "pbkdf2-sha256": ("iterations",),
+    "scrypt": ("n", "r", "p"),
+}
+
+
+def _decode_salt(params: Dict[str, Any]) -> bytes:
+    """Base64で記録されたソルトを復元する."""
+    salt = params.get("salt")
+    if not isinstance(salt, str):
+        raise ValueError(f"Invalid KDF salt: expected a Base64 string, got {type(salt).__name__}")
+    try:
+        return base64.urlsafe_b64decode(salt.encode())
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid KDF salt: {e}") from e
+
+
+def _derive_pbkdf2(secret_key: bytes, params: Dict[str, Any]) -> bytes:
+    """PBKDF2-SHA256 で鍵を導出する."""
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=KEY_LENGTH,
+        salt=_decode_salt(params),
+        iterations=params["iterations"],
+    )
+    return kdf.derive(secret_key)
+
+
+def _derive_scrypt(secret_key: bytes, params: Dict[str, Any]) -> bytes:
+    """scrypt で鍵を導出する."""
+    kdf = Scrypt(
+        salt=_decode_salt(params),
+        length=KEY_LENGTH,
+        n=params["n"],
+        r=params["r"],
+        p=params["p"],
+    )
+    return kdf.derive(secret_key)
+
+
+def _derive_raw(secret_key: bytes, params: Dict[str, Any]) -> bytes:
+    """secret_key を導出済みの Fernet 鍵としてそのまま使う."""
+    try:
+        key = base64.urlsafe_b64decode(secret_key)
+    except binascii.Error as e:
+        raise ValueError(f"Invalid raw Fernet key: {e}") from e
+    if len(key) != KEY_LENGTH:
+        raise ValueError("Raw Fernet key must be 32 bytes of URL-safe Base64.")
+    return key
+
+
+# KDF名 -> 導出関数
+KDF_FUNCTIONS: Dict[str, Callable[[bytes, Dict[str, Any]], bytes]] = {
+    "pbkdf2-sha256": _derive_pbkdf2,
+    "scrypt": _derive_scrypt,
+    "raw": _derive_raw,
+}
+
+
+def normalize_kdf_params(params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """KDFパラメータを検証し、省略された値を既定値で補う.
+
+    Args:
+        params: KDFパラメータ（Noneの場合は従来の PBKDF2-SHA256）
+
+    Returns:
+        正規化されたKDFパラメータ
+
+    Raises:
+        ValueError: 辞書でない場合、未対応のKDFが指定された場合、またはパラメータの型・値が不正な場合"""
+    if params is None:
+        return dict(DEFAULT_KDF)
+    if not isinstance(params, dict):
+        # `kdf: scrypt` のような省略形はソルトを記録できないため受け付けない
+        raise ValueError(
+            f"KDF parameters must be a mapping with a 'name' key, got {type(params).__name__}"
+        )
+    if not params:
+        return dict(DEFAULT_KDF)
+
+    name = params.get("name", DEFAULT_KDF["name"])
+    if not isinstance(name, str) or name not in KDF_FUNCTIONS:
+        raise ValueError(f"Unsupported KDF: {name!r}")
+
+    if name == "raw":
+        return {"name": "raw"}
+    defaults = dict(DEFAULT_KDF) if name == "pbkdf2-sha256" else dict(SCRYPT_DEFAULTS)
+    defaults.setdefault("salt", DEFAULT_KDF["salt"])
+    defaults.update(params)
+    defaults["name"] = name
+    for field in INTEGER_PARAMS[name]:
+        value = defaults[field]
+        # bool は int のサブクラスのため明示的に除く
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f"Invalid KDF parameter '{field}': expected a positive integer")
+    _decode_salt(defaults)
+    return defaults
+
+
+def kdf_params_fingerprint(params: Dict[str, Any]) -> str:
+    """KDFパラメータを一意に表す文字列を返す（キャッシュキー用）."""
+    return json.dumps(normalize_kdf_params(params), sort_keys=True, separators=(",", ":"))
+
+
+def derive_fernet_key(secret_key: str, params: Optional[Dict[str, Any]] = None) -> bytes:
+    """secret_key から Fernet 鍵（URL-safe Base64）を導出する.
+
+    Args:
+        secret_key: 暗号化キー（config.yamlのsecret_key）
+        params: KDFパラメータ（Noneの場合は従来の PBKDF2-SHA256）
+
+    Returns:
+        Fernet に渡せる鍵"""
+    params = normalize_kdf_params(params)
+    key = KDF_FUNCTIONS[params["name"]](secret_key.encode(), params)
+    return base64.urlsafe_b64encode(key)
+
+
+def generate_kdf_params(name: str = "pbkdf2-sha256") -> Dict[str, Any]:
+    """ランダムなソルトを持つKDFパラメータを生成する（新しい暗号化ファイルの作成用）.
+
+    Args:
+        name: KDF名
+
+    Returns:
+        正規化されたKDFパラメータ"""
+    if name == "raw":
+        return normalize_kdf_params({"name": "raw"})
+    salt = base64.urlsafe_b64encode(os.urandom(16)).decode()
+    return normalize_kdf_params({"name": name, "salt": salt})
@@ -3,11 +3,100 @@
 設定ファイル内の機密情報を暗号化して保存し、実行時に復号化します。"""
 
 import base64
-from typing import Optional
+import hashlib
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.fernet import Fernet, InvalidToken
+
+from services.metrics import metrics
+
+from .kdf import derive_fernet_key, kdf_params_fingerprint, normalize_kdf_params
+
+# バンドル形式（全ての機密情報を一つの Fernet トークンで包む形式）のヘッダー
+# ヘッダー行は「マジック/バージョン」の後に、空白区切りでメタデータ（JSON）を続けられる
+BUNDLE_MAGIC = b"ART-GALLERY-SECRETS-BUNDLE"
+BUNDLE_VERSION = 1
+
+# 値ごとに暗号化するYAML形式で、メタデータを記録するトップレベルのキー
+METADATA_KEY = "_meta"
+
+# 導出済み Fernet のプロセス内キャッシュ
+# キーは secret_key と KDF パラメータのハッシュ（secret_key そのものは保持しない）
+_cipher_cache: Dict[str, Fernet] = {}
+_cipher_cache_lock = threading.Lock()
+
+
+class SecretDecryptionError(Exception):
+    """暗号化値の復号に失敗した場合の例外.
+
+    Attributes:
+        errors: 復号に失敗した値のパス（例: database.password）-> 失敗理由
+        decrypted: 復号できた値のみを残したデータ（失敗した値は辞書からは削除し、リストでは None にする）"""
+
+    def __init__(self, errors: Dict[str, str], decrypted: Any = None):
+        self.errors = errors
+        self.decrypted = decrypted
+        super().__init__(f"Failed to decrypt {len(errors)} secret(s): {', '.join(errors)}")
+
+
+class EncryptedValue:
+    """復号を遅延させた暗号化値（遅延復号モードで設定に保持される）."""
+
+    __slots__ = ("ciphertext", "_manager")
+
+    def __init__(self, ciphertext: str, manager: "SecretManager"):
+        self.ciphertext = ciphertext
+        self._manager = manager
+
+    def decrypt(self) -> str:
+        """復号した値を返す（結果は保持しない）.
+
+        Raises:
+            ValueError: Base64として不正な場合
+            cryptography.fernet.InvalidToken: 改ざんされている、または鍵が異なる場合"""
+        return self._manager.decrypt_strict(self.ciphertext)
+
+    def __repr__(self) -> str:
+        return "EncryptedValue(...)"
+
+
+# 復号・暗号化結果の書き戻し先（親のコンテナ、キーまたはインデックス、値のパス、暗号文または平文）
+_EncryptedLeaf = Tuple[Union[dict, list], Union[str, int], str, str]
+
+
+def _collect_encrypted_leaves(data: Any) -> List[_EncryptedLeaf]:
+    """ネストされた辞書・リストから `encrypted:` 形式の値を深さに関わらず全て収集する."""
+    return _collect_leaves(data, encrypted=True)
+
+
+def _collect_plaintext_leaves(data: Any) -> List[_EncryptedLeaf]:
+    """ネストされた辞書・リストから `encrypted:` 形式でない文字列を深さに関わらず全て収集する."""
+    return _collect_leaves(data, encrypted=False)
+
+
+def _collect_leaves(data: Any, encrypted: bool) -> List[_EncryptedLeaf]:
+    """ネストされた辞書・リストから、暗号化済み（または未暗号化）の文字列の値を収集する."""
+    leaves: List[_EncryptedLeaf] = []
+    stack: List[Tuple[Any, str]] = [(data, "")]
+    while stack:
+        node, path = stack.pop()
+        if isinstance(node, dict):
+            items = [(key, f"{path}.{key}" if path else str(key)) for key in node]
+        elif isinstance(node, list):
+            items = [(index, f"{path}[{index}]") for index in range(len(node))]
+        else:
+            continue
+        for key, child_path in items:
+            value = node[key]
+            if isinstance(value, (dict, list)):
+                stack.append((value, child_path))
+            elif isinstance(value, str) and SecretManager.is_encrypted(value) == encrypted:
+                if encrypted:
+                    value = SecretManager.extract_encrypted_value(value)
+                leaves.append((node, key, child_path, value))
+    return leaves
 
 
 class SecretManager:
@@ -15,30 +104,66 @@ class SecretManager:
 
     secret_key（config.yaml）を使用して、設定ファイル内の機密情報を暗号化・復号化します。"""
 
-    def __init__(self, secret_key: Optional[str] = None):
+    def __init__(self, secret_key: Optional[str] = None, kdf: Optional[Dict[str, Any]] = None):
         """初期化.
 
         Args:
             secret_key: 暗号化キー（config.yamlのsecret_key）
                           - 指定された場合はそれを使用
-                          - 指定されない場合はデフォルト値を使用（本番環境では非推奨）"""
+                          - 指定されない場合はデフォルト値を使用（本番環境では非推奨）
+            kdf: 鍵導出関数のパラメータ（暗号化ファイルのメタデータ）
+                   - 指定されない場合は従来の PBKDF2-SHA256 を使用
+
+        Raises:
+            ValueError: secret_key が文字列でない場合、または KDF パラメータが不正な場合"""
         if not secret_key:
             # Development fallback only - production should use a proper secret key
             secret_key = "default-secret-key-change-in-production"  # nosec B105
+        if not isinstance(secret_key, str):
+            # YAML で数値などとして書かれた secret_key（例: secret_key: 12345）は文字列として引用させる
+            raise ValueError(
+                f"secret_key must be a string, got {type(secret_key).__name__} (quote it in YAML)"
+            )
         self.secret_key = secret_key
+        self.kdf = normalize_kdf_params(kdf)
+        self._cache_key = self._cipher_cache_key()
         self._cipher = self._create_cipher()
 
     def _create_cipher(self) -> Fernet:
-        """secret_keyから暗号化キーを生成."""
-        # secret_keyから32バイトのキーを生成
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=b"art_gallery_salt",
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(self.secret_key.encode()))
-        return Fernet(key)
+        """secret_keyから暗号化キーを生成.
+
+        同じ secret_key・KDF パラメータで導出済みの場合はキャッシュを再利用します。"""
+        # 同一キーの並行導出を避けるため、導出中もロックを保持する
+        with _cipher_cache_lock:
+            cipher = _cipher_cache.get(self._cache_key)
+            if cipher is None:
+                with metrics.timed("kdf"):
+                    cipher = Fernet(derive_fernet_key(self.secret_key, self.kdf))
+                _cipher_cache[self._cache_key] = cipher
+            return cipher
+
+    def _cipher_cache_key(self) -> str:
+        """キャッシュキー（secret_key と KDF パラメータのハッシュ）を生成."""
+        digest = hashlib.sha256()
+        digest.update(kdf_params_fingerprint(self.kdf).encode())
+        digest.update(b"\0")
+        digest.update(self.secret_key.encode())
+        return digest.hexdigest()
+
+    def _value_cache_key(self, ciphertext: Union[str, bytes]) -> str:
+        """復号結果のキャッシュキー（鍵と暗号文のハッシュ）を生成.
+
+        鍵を含めることで、secret_key が変わった場合に古い鍵での復号結果を使わないようにします。"""
+        digest = hashlib.sha256(self._cache_key.encode())
+        digest.update(b"\0")
+        digest.update(ciphertext.encode() if isinstance(ciphertext, str) else ciphertext)
+        return digest.hexdigest()
+
+    @staticmethod
+    def clear_cipher_cache() -> None:
+        """導出済み Fernet のキャッシュを破棄する."""
+        with _cipher_cache_lock:
+            _cipher_cache.clear()
 
     def encrypt(self, plaintext: str) -> str:
         """平文を暗号化.
@@ -71,6 +196,195 @@ class SecretManager:
             # 復号化に失敗した場合は、平文として扱う（後方互換性）
             return ciphertext
 
+    def decrypt_strict(self, ciphertext: str) -> str:
+        """暗号化された文字列を復号化（失敗時は例外を送出）.
+
+        Args:
+            ciphertext: 暗号化された文字列（Base64エンコード）
+
+        Returns:
+            復号化された文字列
+
+        Raises:
+            ValueError: Base64として不正な場合
+            cryptography.fernet.InvalidToken: 改ざんされている、または鍵が異なる場合"""
+        if not ciphertext:
+            return ""
+        decoded = base64.urlsafe_b64decode(ciphertext.encode())
+        return self._cipher.decrypt(decoded).decode()
+
+    def decrypt_tree(self, data: Any, cache: Optional[Dict[str, str]] = None) -> Any:
+        """ネストされた辞書・リスト内の `encrypted:` 形式の値をまとめて復号し、その場で置き換える.
+
+        深さに関わらず全ての暗号化値を収集してから一括で復号します。
+        値ごとの復号（約13µs）は GIL を保持したまま行われるため、スレッドプールでは速くならず
+        （タスクの受け渡しの方が高くつく）、一つのスレッドで順に復号します。
+
+        Args:
+            data: 復号対象（辞書またはリスト）。復号結果で直接書き換えられる
+            cache: 前回の復号結果（鍵と暗号文のハッシュ -> 平文）。指定した場合は暗号文が変わった値のみを復号し、
+                   復号に成功した場合は今回の値のみを保持するよう更新する
+
+        Returns:
+            復号済みの data
+
+        Raises:
+            SecretDecryptionError: 復号に失敗した値がある場合（失敗した値のパスと、それ以外の復号済みの data を保持）"""
+        leaves = _collect_encrypted_leaves(data)
+        keys = [self._value_cache_key(leaf[3]) for leaf in leaves] if cache is not None else []
+        results: List[Tuple[Optional[str], Optional[str]]] = [(None, None)] * len(leaves)
+        pending = []
+        for index in range(len(leaves)):
+            if cache is not None and keys[index] in cache:
+                results[index] = (cache[keys[index]], None)
+            else:
+                pending.append(index)
+        for index in pending:
+            results[index] = self._try_decrypt(leaves[index][3])
+
+        errors: Dict[str, str] = {}
+        for (container, key, path, _), (plaintext, error) in zip(leaves, results):
+            if error is None:
+                container[key] = plaintext  # type: ignore[index]
+                continue
+            errors[path] = error
+            # 暗号文を平文の値として扱わせないよう取り除く（リストは他の値の位置を変えないよう None にする）
+            if isinstance(container, dict):
+                del container[key]
+            else:
+                container[key] = None  # type: ignore[index]
+        if errors:
+            raise SecretDecryptionError(errors, data)
+        if cache is not None:
+            # 削除・変更された値の平文を残さないよう、今回の値のみを保持する
+            cache.clear()
+            cache.update((key, plaintext) for key, (plaintext, _) in zip(keys, results))
+        return data
+
+    def defer_tree(self, data: Any) -> Any:
+        """ネストされた辞書・リスト内の `encrypted:` 形式の値を EncryptedValue に置き換える.
+
+        復号は行わず、値が必要になった時点で EncryptedValue.decrypt() を呼び出して復号します。
+
+        Args:
+            data: 対象（辞書またはリスト）。直接書き換えられる
+
+        Returns:
+            置き換え済みの data"""
+        for container, key, _, ciphertext in _collect_encrypted_leaves(data):
+            container[key] = EncryptedValue(ciphertext, self)  # type: ignore[index]
+        return data
+
+    def encrypt_tree(self, data: Any) -> Any:
+        """ネストされた辞書・リスト内の文字列を深さに関わらず `encrypted:` 形式に暗号化し、その場で置き換える.
+
+        既に `encrypted:` 形式の値はそのまま残します。鍵は生成時に一度だけ導出したものを使います。
+        多数の値を並列に暗号化する場合は config.encrypt.encrypt_sections を使います。
+
+        Args:
+            data: 暗号化対象（辞書またはリスト）。暗号化結果で直接書き換えられる
+
+        Returns:
+            暗号化済みの data"""
+        for container, key, _, plaintext in _collect_plaintext_leaves(data):
+            container[key] = f"encrypted:{self.encrypt(plaintext)}"  # type: ignore[index]
+        return data
+
+    def _try_decrypt(self, ciphertext: str) -> Tuple[Optional[str], Optional[str]]:
+        """復号結果と失敗理由の組を返す."""
+        try:
+            return self.decrypt_strict(ciphertext), None
+        except InvalidToken:
+            return None, "invalid token (wrong secret_key or corrupted value)"
+        except (ValueError, UnicodeDecodeError) as e:
+            return None, f"malformed value ({e})"
+
+    def encrypt_bundle(self, secrets: Dict[str, Any]) -> bytes:
+        """機密情報全体をバンドル形式に暗号化.
+
+        形式はバージョン付きのヘッダー行と、JSONを包んだ一つの Fernet トークンです。
+
+        Args:
+            secrets: 機密情報の辞書
+
+        Returns:
+            バンドル形式のバイト列"""
+        document = json.dumps(secrets, separators=(",", ":"), ensure_ascii=False)
+        token = self._cipher.encrypt(document.encode())
+        metadata = json.dumps({"kdf": self.kdf}, sort_keys=True, separators=(",", ":"))
+        return b"%s/%d %s\n%s\n" % (BUNDLE_MAGIC, BUNDLE_VERSION, metadata.encode(), token)
+
+    def decrypt_bundle(self, data: bytes, cache: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """バンドル形式の機密情報を復号化.
+
+        Args:
+            data: バンドル形式のバイト列
+            cache: 前回の復号結果（decrypt_tree と同じ形式）。トークンが変わっていない場合は復号しない
+
+        Returns:
+            機密情報の辞書
+
+        Raises:
+            ValueError: ヘッダーが不正、またはバージョンが未対応の場合
+            cryptography.fernet.InvalidToken: 改ざんされている、または鍵が異なる場合"""
+        _, token = self._parse_bundle(data)
+        if cache is None:
+            document = self._cipher.decrypt(token).decode()
+        else:
+            key = self._value_cache_key(token)
+            document = cache.get(key) or self._cipher.decrypt(token).decode()
+            cache.clear()
+            cache[key] = document
+        secrets = json.loads(document)
+        if not isinstance(secrets, dict):
+            raise ValueError("Secrets bundle must contain a mapping.")
+        return secrets
+
+    @staticmethod
+    def _parse_bundle(data: bytes) -> Tuple[Dict[str, Any], bytes]:
+        """バンドル形式をヘッダーのメタデータと Fernet トークンに分割する."""
+        header, _, token = data.partition(b"\n")
+        identifier, _, metadata = header.strip().partition(b" ")
+        magic, _, version = identifier.partition(b"/")
+        if magic != BUNDLE_MAGIC:
+            raise ValueError("Not a secrets bundle.")
+        if version != str(BUNDLE_VERSION).encode():
+            version_text = version.decode(errors="replace")
+            raise ValueError(f"Unsupported secrets bundle version: {version_text}")
+        parsed = json.loads(metadata) if metadata.strip() else {}
+        if not isinstance(parsed, dict):
+            raise ValueError("Secrets bundle metadata must be a mapping.")
+        return parsed, token.strip()
+
+    @staticmethod
+    def bundle_metadata(data: bytes) -> Dict[str, Any]:
+        """バンドル形式のヘッダーに記録されたメタデータ（KDFなど）を返す.
+
+        Args:
+            data: バンドル形式のバイト列
+
+        Returns:
+            メタデータの辞書（記録されていない場合は空）"""
+        return SecretManager._parse_bundle(data)[0]
+
+    def yaml_metadata(self) -> Dict[str, Any]:
+        """値ごとに暗号化するYAML形式に記録するメタデータを返す.
+
+        Returns:
+            `_meta` キーに設定する辞書"""
+        return {"kdf": dict(self.kdf)}
+
+    @staticmethod
+    def is_bundle(data: bytes) -> bool:
+        """データがバンドル形式かどうかを判定.
+
+        Args:
+            data: チェックするバイト列
+
+        Returns:
+            バンドル形式の場合True"""
+        return data.startswith(BUNDLE_MAGIC + b"/")
+
     @staticmethod
     def is_encrypted(value: str) -> bool:
         """値が暗号化されているかどうかを判定.
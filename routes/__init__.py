@@ -2,7 +2,9 @@
 
 各機能ごとのブループリントをまとめ、外部から利用しやすくします。"""
 
+from .fast_path import install_fast_path
 from .health import health_bp
+from .metrics import metrics_bp
 from .secrets_routes import secrets_bp
 
-__all__ = ["health_bp", "secrets_bp"]
+__all__ = ["health_bp", "install_fast_path", "metrics_bp", "secrets_bp"]
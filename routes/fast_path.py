@@ -0,0 +1,166 @@
+"""秘密情報ルートの高速パス.
+
+/secrets/database/password と /secrets/bundle への GET リクエストを、Flask のディスパッチ（ルーティング、
+リクエストコンテキスト、before_request/after_request フック、jsonify）を経由せずに WSGI レベルで処理します。
+Authorization ヘッダーの解析とトークンの検証は一度だけ行い（routes.secrets_routes.authorize を共用するため、
+401/403/429 の判定・レート制限・メトリクスはブループリントと同じです）、応答の本文は設定の読み込み後に一度だけ
+シリアライズしたものを返します。
+
+設定が再読み込みで置き換わった場合は本文を作り直します。遅延復号モードでは平文を保持しないよう、
+本文を保持せずにリクエストごとに作成します。それ以外のリクエストは Flask にそのまま渡します。"""
+
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask
+
+from config import Config
+from services.metrics import metrics
+from services.token_service import TokenService
+
+from .secrets_routes import ENDPOINT_SECRETS, ERROR_MESSAGES, authorize
+
+PASSWORD_PATH = "/secrets/database/password"
+BUNDLE_PATH = "/secrets/bundle"
+
+# パス -> ブループリントのエンドポイント名
+FAST_ROUTES = {
+    PASSWORD_PATH: "secrets.get_database_password",
+    BUNDLE_PATH: "secrets.get_bundle",
+}
+
+_STATUS_LINES = {
+    200: "200 OK",
+    401: "401 UNAUTHORIZED",
+    403: "403 FORBIDDEN",
+    429: "429 TOO MANY REQUESTS",
+}
+
+WSGIApp = Callable[[dict, Callable], Iterable[bytes]]
+
+
+class SecretsFastPath:
+    """秘密情報ルートを Flask のディスパッチを経由せずに処理する WSGI ミドルウェア."""
+
+    def __init__(self, app: Flask, wsgi_app: WSGIApp):
+        """初期化.
+
+        Args:
+            app: Flaskアプリケーション
+            wsgi_app: 高速パスの対象外のリクエストを処理する WSGI アプリケーション（app.wsgi_app）"""
+        self.app = app
+        self.wsgi_app = wsgi_app
+        # 認証に失敗した場合の応答の本文（内容が固定のため一度だけシリアライズする）
+        self._error_bodies = {
+            status: self._serialize({"error": message})
+            for status, message in ERROR_MESSAGES.items()
+        }
+        # 本文を作成した時点の設定と、キャッシュキー -> 本文
+        self._bodies: Tuple[Optional[dict], Dict[tuple, bytes]] = (None, {})
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        """WSGI アプリケーションとしてリクエストを処理する."""
+        path = environ.get("PATH_INFO", "")
+        if path not in FAST_ROUTES or environ.get("REQUEST_METHOD") != "GET":
+            return self.wsgi_app(environ, start_response)
+
+        status, headers, body = self.respond(
+            path, environ.get("HTTP_AUTHORIZATION"), environ.get("REMOTE_ADDR") or "local"
+        )
+        start_response(_STATUS_LINES[status], headers)
+        return [body]
+
+    def respond(
+        self, path: str, auth_header: Optional[str], client: str
+    ) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """FAST_ROUTES のパスへの GET リクエストを処理する（ASGI 版の asgi.SecretsASGI からも呼ばれる）.
+
+        Args:
+            path: FAST_ROUTES のいずれかのパス
+            auth_header: Authorization ヘッダーの値
+            client: クライアントの識別子（接続元アドレス）
+
+        Returns:
+            ステータスコード・応答ヘッダー・本文の組"""
+        started_at = time.perf_counter()
+        result = authorize(
+            auth_header,
+            client,
+            ENDPOINT_SECRETS.get(FAST_ROUTES[path]),
+            self.app.extensions.get("auth_limiter"),
+            self.app.logger,
+        )
+        headers: List[Tuple[str, str]] = []
+        if result.status != 200:
+            body = self._error_bodies[result.status]
+            if result.retry_after:
+                headers.append(("Retry-After", str(result.retry_after)))
+        else:
+            entry = result.entry
+            if path == BUNDLE_PATH:
+                self.app.logger.info(
+                    f"Secrets bundle provided to '{entry.service}' and token consumed."
+                )
+                body = self._body(path, entry.service, entry.secrets)
+            else:
+                self.app.logger.info("Database password provided and token consumed.")
+                body = self._body(path)
+            if Config.LAZY_DECRYPT:
+                Config.release_secrets(keep=TokenService.outstanding_secrets())
+
+        headers[:0] = [("Content-Type", "application/json"), ("Content-Length", str(len(body)))]
+        metrics.observe_request(path, time.perf_counter() - started_at)
+        return result.status, headers, body
+
+    def _body(self, path: str, service: str = "", secret_paths: Tuple[str, ...] = ()) -> bytes:
+        """認証に成功した場合の応答の本文を返す（設定が置き換わるまで同じ本文を使い回す）."""
+        key = (path, service, secret_paths)
+        bodies: Optional[Dict[tuple, bytes]] = None
+        if not Config.LAZY_DECRYPT:
+            config = Config.current_config()
+            cached_for, bodies = self._bodies
+            if cached_for is not config:
+                # 設定が置き換わった場合は、以前の設定の値を含む本文を破棄する
+                bodies = {}
+                self._bodies = (config, bodies)
+            cached = bodies.get(key)
+            if cached is not None:
+                return cached
+
+        if path == BUNDLE_PATH:
+            body = {"service": service, "secrets": Config.get_bundle(secret_paths)}
+        else:
+            body = {"password": Config.get_secret("database.password")}
+        serialized = self._serialize(body)
+        if bodies is not None:
+            bodies[key] = serialized
+        return serialized
+
+    def precompute(self, services: Dict[str, List[str]]) -> None:
+        """応答の本文を事前にシリアライズする（遅延復号モードでは平文を保持しないため何もしない）.
+
+        Args:
+            services: サービス名 -> 取得可能な機密情報のパス（Config.SERVICES）"""
+        if Config.LAZY_DECRYPT:
+            return
+        self._body(PASSWORD_PATH)
+        for service, secret_paths in services.items():
+            self._body(BUNDLE_PATH, service, tuple(secret_paths))
+
+    def _serialize(self, obj: dict) -> bytes:
+        """jsonify と同じ形式でシリアライズする."""
+        return self.app.json.response(obj).get_data()
+
+
+def install_fast_path(app: Flask) -> SecretsFastPath:
+    """アプリケーションに高速パスを組み込み、応答の本文を事前にシリアライズする.
+
+    Args:
+        app: 起動処理（設定の読み込みとトークンの発行）を終えたFlaskアプリケーション
+
+    Returns:
+        組み込んだ高速パス"""
+    fast_path = SecretsFastPath(app, app.wsgi_app)
+    fast_path.precompute(Config.SERVICES)
+    app.wsgi_app = fast_path  # type: ignore[method-assign]
+    return fast_path
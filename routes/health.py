@@ -2,10 +2,13 @@
 
 アプリケーションの動作確認用エンドポイントを提供します。"""
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, current_app, jsonify, request
 
 health_bp = Blueprint("health", __name__)
 
+# /ready の wait パラメータの上限（秒）。待機中はリクエスト処理スレッドを占有するため制限する
+MAX_READY_WAIT = 30.0
+
 
 @health_bp.route("/health", methods=["GET"])
 @health_bp.route("/api/health", methods=["GET"])
@@ -15,3 +18,24 @@ def health():
     Returns:
         JSON形式のステータス情報"""
     return jsonify({"status": "OK", "message": "Secrets API is running"})
+
+
+@health_bp.route("/ready", methods=["GET"])
+def ready():
+    """レディネスエンドポイント.
+
+    起動処理の各段階（config: 設定の読み込み、secrets: 機密情報の復号、tokens: トークンの発行）の
+    状態を返します。`wait` パラメータ（秒、上限 MAX_READY_WAIT）を指定すると、
+    準備が整うかいずれかの段階が失敗するまでサーバー側で待機してから応答します。
+
+    Returns:
+        JSON形式の状態。準備が整っている場合は200、それ以外は503"""
+    readiness = current_app.extensions["readiness"]
+    try:
+        wait = min(max(float(request.args.get("wait", 0)), 0.0), MAX_READY_WAIT)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
+    is_ready = readiness.wait(wait) if wait > 0 else readiness.is_ready()
+    body = {"ready": is_ready, "stages": readiness.snapshot()}
+    return jsonify(body), 200 if is_ready else 503
@@ -0,0 +1,36 @@
+"""メトリクスルート.
+
+全てのリクエストの処理時間を記録し、収集したメトリクスを Prometheus のテキスト形式で提供します。"""
+
+import time
+
+from flask import Blueprint, Response, g, request
+
+from services.metrics import metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.before_app_request
+def start_timer():
+    """リクエストの処理開始時刻を記録する."""
+    g.request_started_at = time.perf_counter()
+
+
+@metrics_bp.after_app_request
+def record_latency(response):
+    """ルートごとのリクエスト処理時間を記録する（認証で拒否されたリクエストも含む）."""
+    started_at = g.get("request_started_at")
+    if started_at is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.observe_request(route, time.perf_counter() - started_at)
+    return response
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """メトリクスエンドポイント（認証不要、機密情報の値は含まない）.
+
+    Returns:
+        Prometheus のテキスト形式のメトリクス"""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
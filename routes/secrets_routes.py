@@ -2,37 +2,142 @@
 
 パスワード復号化APIのエンドポイントを定義します。"""
 
-from flask import Blueprint, request, jsonify, current_app
+import logging
+import math
+from typing import NamedTuple, Optional
+
+from flask import Blueprint, request, jsonify, current_app, g
 from config import Config
-from services.token_service import TokenService
+from services.metrics import metrics
+from services.rate_limit import FailureLimiter
+from services.token_service import TokenEntry, TokenService
 
 secrets_bp = Blueprint("secrets", __name__, url_prefix="/secrets")
 
+# エンドポイント -> 返却する機密情報のパス（トークンの発行先サービスに許可されている必要がある）
+ENDPOINT_SECRETS = {
+    "secrets.get_database_password": "database.password",
+}
+
+# 認証に失敗した場合の応答（ステータスコード -> エラーメッセージ）
+ERROR_MESSAGES = {
+    401: "Missing or invalid Authorization header",
+    403: "Token not available or expired",
+    429: "Too many failed authorization attempts",
+}
+
+class AuthResult(NamedTuple):
+    """認証の結果."""
+
+    entry: Optional[TokenEntry]  # 認証に成功した場合のトークンのエントリ
+    status: int  # 成功した場合は200、失敗した場合は ERROR_MESSAGES のステータスコード
+    retry_after: int = 0  # 429 の場合に Retry-After ヘッダーで返す秒数
+
+def authorize(
+    auth_header: Optional[str],
+    client: str,
+    required_secret: Optional[str],
+    limiter: Optional[FailureLimiter],
+    logger: logging.Logger,
+) -> AuthResult:
+    """Authorization ヘッダーを検証し、トークンを消費する.
+
+    ブループリント（verify_authorization）と高速パス（routes.fast_path）の両方から呼ばれ、
+    認証の失敗はレート制限とメトリクスに記録します。トークンの検証を先に行うため、
+    有効なトークンは接続元が制限中であっても受け付けます。
+
+    Args:
+        auth_header: Authorization ヘッダーの値
+        client: クライアントの識別子（接続元アドレス）
+        required_secret: 取得しようとしている機密情報のパス
+        limiter: 認証失敗のレート制限（Noneの場合は制限しない）
+        logger: ログの出力先
+
+    Returns:
+        認証の結果"""
+    token = None
+    if auth_header and auth_header.startswith("Bearer "):
+        token = auth_header[len("Bearer "):]
+        # 検証と消費を一度に行い、同一トークンによる並行リクエストの二重取得を防ぐ
+        # （検証はメモリ上のレジストリの参照のみで、ファイルは読まない）。
+        # 有効なトークンはレート制限の対象外とし、制限中のクライアントからでも受け付ける
+        entry = TokenService.consume_token(token, required_secret)
+        if entry is not None:
+            return AuthResult(entry, 200)
+
+    # 認証の失敗を繰り返しているクライアントは、失敗として記録せずに 429 で拒否する
+    if limiter is not None:
+        retry_after = limiter.retry_after(client)
+        if retry_after > 0:
+            metrics.count_auth_failure(429)
+            return AuthResult(None, 429, math.ceil(retry_after))
+
+    if token is None:
+        logger.warning("Missing or invalid Authorization header.")
+        _record_failure(limiter, client, logger)
+        metrics.count_auth_failure(401)
+        return AuthResult(None, 401)
+
+    logger.warning("Token not available or expired during pre-request check.")
+    _record_failure(limiter, client, logger)
+    metrics.count_auth_failure(403)
+    return AuthResult(None, 403)
+
+def _record_failure(
+    limiter: Optional[FailureLimiter], client: str, logger: logging.Logger
+) -> None:
+    """認証の失敗をレート制限に記録する."""
+    if limiter is not None and limiter.record_failure(client):
+        logger.warning(
+            f"Too many failed authorization attempts from '{client}'; rejecting with 429."
+        )
+
 @secrets_bp.before_request
 def verify_authorization():
     """全ての秘密情報APIリクエストのBearerトークンを検証する."""
     if request.path == "/health" or request.path == "/api/health":
         return # ヘルスチェックは認証不要
 
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        current_app.logger.warning("Missing or invalid Authorization header.")
-        return jsonify({"error": "Missing or invalid Authorization header"}), 401
+    result = authorize(
+        request.headers.get("Authorization"),
+        request.remote_addr or "local", # Unix ドメインソケット経由の場合は接続元アドレスがない
+        ENDPOINT_SECRETS.get(request.endpoint),
+        current_app.extensions.get("auth_limiter"),
+        current_app.logger,
+    )
+    if result.status != 200:
+        response = jsonify({"error": ERROR_MESSAGES[result.status]})
+        if result.retry_after:
+            response.headers["Retry-After"] = str(result.retry_after)
+        return response, result.status
+    g.token_entry = result.entry
 
-    token = auth_header[len("Bearer "):]
-
-    if not TokenService.get_token_status(token):
-        current_app.logger.warning("Token not available or expired during pre-request check.")
-        return jsonify({"error": "Token not available or expired"}), 403
+@secrets_bp.after_request
+def release_plaintext(response):
+    """遅延復号モードでは、未消費のトークンが取得しない値の平文を破棄する."""
+    if Config.LAZY_DECRYPT:
+        Config.release_secrets(keep=TokenService.outstanding_secrets())
+    return response
 
 @secrets_bp.route("/database/password", methods=["GET"])
 def get_database_password():
     """データベースパスワードを復号して返す."""
-    token = request.headers.get("Authorization")[len("Bearer "):]
-
-    if TokenService.verify_and_consume_token(token):
+    if g.get("token_entry") is not None:
         current_app.logger.info("Database password provided and token consumed.")
-        return jsonify({"password": Config.DB_PASSWORD})
+        return jsonify({"password": Config.get_secret("database.password")})
 
     current_app.logger.error("Failed to provide database password due to token issue (after pre-check).")
+    metrics.count_auth_failure(500)
     return jsonify({"error": "Failed to retrieve database password"}), 500
+
+@secrets_bp.route("/bundle", methods=["GET"])
+def get_bundle():
+    """トークンの発行先サービスが取得できる機密情報をまとめて返す."""
+    entry = g.get("token_entry")
+    if entry is not None:
+        current_app.logger.info(f"Secrets bundle provided to '{entry.service}' and token consumed.")
+        return jsonify({"service": entry.service, "secrets": Config.get_bundle(entry.secrets)})
+
+    current_app.logger.error("Failed to provide secrets bundle due to token issue.")
+    metrics.count_auth_failure(500)
+    return jsonify({"error": "Failed to retrieve secrets bundle"}), 500
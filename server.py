@@ -0,0 +1,292 @@
+"""本番用のマルチワーカーサーバー.
+
+起動処理（設定の読み込み・トークン生成）を親プロセスで一度だけ行い、
+同じリスニングソケットを共有するワーカープロセスを fork してリクエストを処理します。
+TCP に加えて（または TCP の代わりに）Unix ドメインソケットで待ち受けることもできます。
+
+トークンの消費はトークンファイルの削除（unlink）で確定するため、複数のワーカーが
+同じトークンを同時に受け取っても成功するのは一つだけです。消費はパイプで親プロセスに通知され、
+親プロセスの自動終了（monitor_shutdown）に反映されます。停止時（SIGTERM）のワーカーは待ち受けを止め、
+処理中のリクエストの応答を書き終えてから終了し、親プロセスはその終了を待ちます。
+
+ログのローテーションはプロセス間で安全でないため、各ワーカーは番号ごとのファイル
+（secrets.log に対して secrets.worker1.log など）に書き込みます。"""
+
+import os
+import signal
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from flask import Flask
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler, make_server
+
+from services.log_writer import BatchFlushingFileHandler
+from services.token_service import TokenEntry, TokenService
+
+
+# Unix ドメインソケットの既定の権限（所有者とグループのみ接続可能）
+DEFAULT_UNIX_SOCKET_MODE = 0o660
+# 終了時に処理中のリクエストの完了を待つ最大秒数（超えた場合はそのまま終了する）
+SHUTDOWN_GRACE = 5.0
+
+
+class _ActiveRequests:
+    """このプロセスで処理中のリクエスト数."""
+
+    def __init__(self) -> None:
+        self._count = 0
+        self._idle = threading.Condition()
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """ブロックの間（リクエストの処理から応答の書き込みまで）を処理中として数える."""
+        with self._idle:
+            self._count += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._count -= 1
+                if not self._count:
+                    self._idle.notify_all()
+
+    def wait_idle(self, timeout: Optional[float]) -> bool:
+        """処理中のリクエストがなくなるまで待機する（タイムアウトした場合は False）."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._count, timeout)
+
+
+_active_requests = _ActiveRequests()
+
+
+class TrackingRequestHandler(WSGIRequestHandler):
+    """処理中のリクエストを数えるリクエストハンドラー.
+
+    トークンの消費は応答を書き込む前に確定し、最後のトークンの消費で自動終了が始まるため、
+    終了処理は wait_for_active_requests でそのリクエストの応答を書き終えるまで待ちます。"""
+
+    def run_wsgi(self) -> None:
+        with _active_requests.track():
+            super().run_wsgi()
+
+
+def wait_for_active_requests(timeout: Optional[float] = SHUTDOWN_GRACE) -> bool:
+    """このプロセスの処理中のリクエスト（TrackingRequestHandler で受け付けたもの）の応答の書き込みを待つ.
+
+    Args:
+        timeout: 最大待機秒数（Noneの場合は無期限）
+
+    Returns:
+        処理中のリクエストがなくなった場合True、タイムアウトした場合False"""
+    return _active_requests.wait_idle(timeout)
+
+
+def make_unix_server(app: Flask, path: str, mode: int = DEFAULT_UNIX_SOCKET_MODE) -> BaseWSGIServer:
+    """Unix ドメインソケットで待ち受けるサーバーを作成する.
+
+    ソケットファイルは作成時点から指定の権限になるため、ファイルシステムの権限で接続元を制限できます。
+
+    Args:
+        app: Flaskアプリケーション
+        path: ソケットファイルのパス
+        mode: ソケットファイルの権限
+
+    Returns:
+        待ち受けを開始したサーバー"""
+    old_umask = os.umask(0o777 & ~mode)
+    try:
+        server = make_server(
+            f"unix://{path}", 0, app, threaded=True, request_handler=TrackingRequestHandler
+        )
+    finally:
+        os.umask(old_umask)
+    os.chmod(path, mode)
+    return server
+
+
+def create_servers(
+    app: Flask,
+    host: Optional[str],
+    port: int,
+    unix_socket: Optional[str] = None,
+    unix_socket_mode: int = DEFAULT_UNIX_SOCKET_MODE,
+) -> List[BaseWSGIServer]:
+    """待ち受けるサーバーを作成する.
+
+    Args:
+        app: Flaskアプリケーション
+        host: TCPの待ち受けアドレス（Noneの場合はTCPで待ち受けない）
+        port: TCPの待ち受けポート
+        unix_socket: Unix ドメインソケットのパス（Noneの場合は待ち受けない）
+        unix_socket_mode: Unix ドメインソケットの権限
+
+    Returns:
+        待ち受けを開始したサーバーの一覧"""
+    servers = []
+    if host is not None:
+        servers.append(
+            make_server(host, port, app, threaded=True, request_handler=TrackingRequestHandler)
+        )
+    if unix_socket:
+        servers.append(make_unix_server(app, unix_socket, unix_socket_mode))
+    if not servers:
+        raise ValueError("At least one of TCP or Unix domain socket must be enabled.")
+    return servers
+
+
+class PreforkServer:
+    """fork したワーカープロセスでリクエストを処理するサーバー."""
+
+    def __init__(self, app: Flask, servers: List[BaseWSGIServer], workers: int):
+        """初期化.
+
+        Args:
+            app: Flaskアプリケーション（トークン生成済みであること）
+            servers: 待ち受けを開始したサーバー（create_servers で作成）
+            workers: ワーカープロセス数"""
+        self.app = app
+        self.workers = workers
+        self.servers = servers
+        self._pids: Dict[int, int] = {}  # ワーカーのプロセスID -> 番号
+        self._stopping = False
+        self._notify_read, self._notify_write = os.pipe()
+
+    def serve_forever(self) -> None:
+        """ワーカープロセスを起動し、停止されるまで監視する（異常終了したワーカーは再起動する）."""
+        for index in range(1, self.workers + 1):
+            self._spawn(index)
+        threading.Thread(
+            target=self._relay_consumptions, name="consumption-relay", daemon=True
+        ).start()
+        self._supervise()
+
+    def stop(self, timeout: float = SHUTDOWN_GRACE + 1) -> None:
+        """全てのワーカープロセスを停止し、Unix ドメインソケットのファイルを削除する.
+
+        ワーカーは待ち受けを止めて処理中のリクエストの応答を書き終えてから終了するため、その終了を待ちます。
+
+        Args:
+            timeout: ワーカーの終了を待つ最大秒数"""
+        self._stopping = True
+        for pid in list(self._pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for server in self.servers:
+            if server.address_family == socket.AF_UNIX:
+                try:
+                    os.unlink(server.server_address)
+                except FileNotFoundError:
+                    pass
+        self._wait_for_workers(timeout)
+
+    def _wait_for_workers(self, timeout: float) -> None:
+        """ワーカープロセスの終了を待つ（_supervise と並行して回収するため、回収済みのものも終了として扱う）."""
+        deadline = time.monotonic() + timeout
+        while self._pids and time.monotonic() < deadline:
+            for pid in list(self._pids):
+                try:
+                    exited, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    exited = pid
+                if exited:
+                    self._pids.pop(pid, None)
+            time.sleep(0.05)
+        if self._pids:
+            self.app.logger.warning(
+                f"Worker processes still running after {timeout}s: {sorted(self._pids)}"
+            )
+
+    def _spawn(self, index: int) -> None:
+        """ワーカープロセスを fork する.
+
+        Args:
+            index: ワーカーの番号（ログファイル名に使う）"""
+        # fork 時にログの書き込みスレッドが書き込み途中にならないよう、書き出してから停止する
+        log_writer = self.app.extensions.get("log_writer")
+        if log_writer is not None:
+            log_writer.stop()
+        # 再読み込み中の設定のロックが保持されたまま複製されないよう、設定ファイルの監視も止めてから fork する
+        config_watcher = self.app.extensions.get("config_watcher")
+        if config_watcher is not None:
+            config_watcher.stop()
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(index)
+        if log_writer is not None:
+            log_writer.start()
+        if config_watcher is not None:
+            config_watcher.start()
+        self._pids[pid] = index
+        self.app.logger.info(f"Started worker process {pid}.")
+
+    def _run_worker(self, index: int) -> None:
+        """ワーカープロセスとしてリクエストを処理する（戻らない）."""
+        os.close(self._notify_read)
+        log_writer = self.app.extensions.get("log_writer")
+        if log_writer is not None:
+            if isinstance(log_writer.handler, BatchFlushingFileHandler):
+                log_writer.replace_handler(log_writer.handler.for_worker(index))
+            log_writer.start()
+        config_watcher = self.app.extensions.get("config_watcher")
+        if config_watcher is not None:
+            config_watcher.start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: self._stop_worker())
+        TokenService.add_consumption_listener(self._notify_consumed)
+        code = 1
+        try:
+            for server in self.servers[1:]:
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers[0].serve_forever()
+            # SIGTERM で待ち受けを停止した場合は、処理中のリクエストの応答を書き終えてから終了する
+            code = 0 if wait_for_active_requests() else 1
+        finally:
+            self._exit_worker(code)
+
+    def _stop_worker(self) -> None:
+        """ワーカープロセスの待ち受けを停止する（SIGTERM のハンドラー）.
+
+        serve_forever を実行しているスレッドでは停止を待てないため、別のスレッドで停止します。
+        メインスレッドの serve_forever は最後に停止し、他の待ち受けが止まってから処理中のリクエストを待ちます。"""
+
+        def stop_servers() -> None:
+            for server in self.servers[1:] + self.servers[:1]:
+                server.shutdown()
+
+        threading.Thread(target=stop_servers, name="worker-stop", daemon=True).start()
+
+    def _exit_worker(self, code: int) -> None:
+        """ワーカープロセスのログを書き出して終了する."""
+        log_writer = self.app.extensions.get("log_writer")
+        if log_writer is not None:
+            log_writer.stop()
+        os._exit(code)
+
+    def _notify_consumed(self, entry: TokenEntry) -> None:
+        """ワーカーで消費されたトークンを親プロセスに通知する."""
+        # PIPE_BUF 以下の書き込みはアトミックなため、ワーカー間で行が混ざらない
+        os.write(self._notify_write, f"{entry.service}\n".encode())
+
+    def _relay_consumptions(self) -> None:
+        """ワーカーからの消費通知を親プロセスのトークン状態に反映する."""
+        with os.fdopen(self._notify_read, "rb") as pipe:
+            for line in pipe:
+                TokenService.mark_consumed(line.decode().strip())
+
+    def _supervise(self) -> None:
+        """ワーカープロセスの終了を監視する."""
+        while self._pids:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self._pids.pop(pid, None)
+            if not self._stopping and index is not None:
+                self.app.logger.warning(
+                    f"Worker process {pid} exited unexpectedly (status {status}). Restarting."
+                )
+                self._spawn(index)
@@ -0,0 +1,83 @@
+"""設定ファイルの変更監視モジュール（環境変数 RELOAD_CONFIG=true で有効化）.
+
+config.yaml と暗号化ファイルの更新時刻・サイズ・inode を RELOAD_INTERVAL 秒ごとに確認し、
+変更があればコールバック（Config.reload）を呼び出します。エディタや配布ツールによる
+一時ファイルからの置き換え（rename）も inode の変化として検知します。"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+RELOAD_ENABLED = os.environ.get("RELOAD_CONFIG", "false").lower() == "true"
+# 変更を確認する間隔（秒）
+RELOAD_INTERVAL = float(os.environ.get("RELOAD_INTERVAL", "1.0"))
+
+# ファイルの状態（更新時刻・サイズ・inode）。存在しない場合はNone
+_FileState = Optional[Tuple[int, int, int]]
+
+
+class ConfigWatcher:
+    """ファイルの変更を定期的に確認し、変更時にコールバックを呼び出すクラス."""
+
+    def __init__(
+        self,
+        paths: Iterable[Path],
+        on_change: Callable[[], object],
+        interval: float = RELOAD_INTERVAL,
+    ):
+        """初期化.
+
+        Args:
+            paths: 監視するファイル
+            on_change: いずれかのファイルが変更された時に呼び出す関数
+            interval: 変更を確認する間隔（秒）"""
+        self.paths = list(paths)
+        self.on_change = on_change
+        self.interval = interval
+        self._states = self._snapshot()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _snapshot(self) -> List[_FileState]:
+        """監視対象のファイルの現在の状態を返す."""
+        states: List[_FileState] = []
+        for path in self.paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                states.append(None)
+                continue
+            states.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        return states
+
+    def check(self) -> bool:
+        """ファイルの変更を確認し、変更があればコールバックを呼び出す.
+
+        Returns:
+            変更があった場合True"""
+        states = self._snapshot()
+        if states == self._states:
+            return False
+        self._states = states
+        self.on_change()
+        return True
+
+    def start(self) -> None:
+        """監視スレッドを開始する（fork 後の子プロセスで呼ぶと、子プロセスでも監視を再開する）."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """監視スレッドを停止する."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        """interval 秒ごとに変更を確認する."""
+        while not self._stop.wait(self.interval):
+            self.check()
@@ -0,0 +1,114 @@
+"""非同期ログ書き込みモジュール.
+
+リクエスト処理スレッドではログレコードをキューに入れるだけにし、
+バックグラウンドの書き込みスレッドがまとめてファイルに書き込みます。"""
+
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+from typing import List, Optional
+
+# 一度の書き込みでまとめるレコードの最大件数
+DEFAULT_BATCH_SIZE = 256
+
+
+class BatchFlushingFileHandler(RotatingFileHandler):
+    """レコードごとのフラッシュを行わず、flush_batch() でまとめてフラッシュするファイルハンドラ."""
+
+    def flush(self) -> None:
+        """レコードごとのフラッシュは行わない（flush_batch でまとめて行う）."""
+
+    def flush_batch(self) -> None:
+        """書き込み済みのレコードをまとめてフラッシュする."""
+        super().flush()
+
+    def for_worker(self, index: int) -> "BatchFlushingFileHandler":
+        """同じ設定でワーカープロセス用のファイル（例: secrets.log -> secrets.worker1.log）に書き込むハンドラを返す.
+
+        ローテーションはプロセス間で安全でない（一つのプロセスがファイルを切り替えても、他のプロセスは
+        切り替え前のファイルに書き込み続ける）ため、fork したワーカーはそれぞれ自分のファイルに書き込みます。
+
+        Args:
+            index: ワーカーの番号（再起動したワーカーは同じ番号のファイルを引き継ぐ）"""
+        base, ext = os.path.splitext(self.baseFilename)
+        handler = BatchFlushingFileHandler(
+            f"{base}.worker{index}{ext}",
+            maxBytes=self.maxBytes,
+            backupCount=self.backupCount,
+            encoding=self.encoding,
+        )
+        handler.setFormatter(self.formatter)
+        handler.setLevel(self.level)
+        return handler
+
+
+class QueueLogWriter:
+    """キューからログレコードを取り出し、バックグラウンドで書き込むクラス."""
+
+    _STOP = object()
+
+    def __init__(self, handler: logging.Handler, batch_size: int = DEFAULT_BATCH_SIZE):
+        """初期化.
+
+        Args:
+            handler: 実際に書き込みを行うハンドラ
+            batch_size: 一度の書き込みでまとめるレコードの最大件数"""
+        self.handler = handler
+        self.batch_size = batch_size
+        self.queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    def queue_handler(self) -> QueueHandler:
+        """ロガーに追加するキューハンドラを返す."""
+        return QueueHandler(self.queue)
+
+    def start(self) -> None:
+        """書き込みスレッドを開始する."""
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def replace_handler(self, handler: logging.Handler) -> None:
+        """書き込み先のハンドラを置き換え、以前のハンドラを閉じる（書き込みスレッドの停止中に呼ぶ）.
+
+        Args:
+            handler: 新しい書き込み先のハンドラ"""
+        self.handler.close()
+        self.handler = handler
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """キューに残っているレコードを全て書き込んでから書き込みスレッドを停止する.
+
+        Args:
+            timeout: 書き込み完了を待つ最大秒数"""
+        if self._thread is None:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        """レコードをまとめて書き込み、まとめてフラッシュする."""
+        while True:
+            batch: List[object] = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [record for record in batch if record is not self._STOP]
+            for record in records:
+                self.handler.handle(record)  # type: ignore[arg-type]
+            if records:
+                self._flush()
+            if len(records) != len(batch):
+                return
+
+    def _flush(self) -> None:
+        """ハンドラの書き込み内容をフラッシュする."""
+        if isinstance(self.handler, BatchFlushingFileHandler):
+            self.handler.flush_batch()
+        else:
+            self.handler.flush()
@@ -0,0 +1,171 @@
+"""メトリクス収集モジュール.
+
+起動処理の各フェーズの所要時間、ルートごとのリクエスト処理時間（ヒストグラム）、
+認証の失敗・エラー応答の件数、トークンの生成から消費までの時間を収集し、
+Prometheus のテキスト形式（/metrics）と終了時のサマリー行として出力します。
+
+メトリクスはプロセスごとに保持します（マルチワーカー構成では、リクエストを処理したワーカーの値になります）。"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# リクエスト処理時間のヒストグラムの区切り（秒）
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+# メトリクス名の接頭辞
+PREFIX = "secrets_api"
+
+
+class Histogram:
+    """累積ヒストグラム（Prometheus の histogram と同じ形式で出力する）."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        """初期化.
+
+        Args:
+            buckets: 区切りの上限値（昇順）"""
+        self.buckets = tuple(buckets)
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """値を記録する."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """区切りごとの累積件数を返す（例: [("0.001", 3), ..., ("+Inf", 10)]）."""
+        result = []
+        total = 0
+        for bound, count in zip([*map(repr, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """プロセス内のメトリクスを保持するクラス."""
+
+    def __init__(self):
+        """初期化."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """全てのメトリクスを初期化する."""
+        with self._lock:
+            self.phases: Dict[str, float] = {}
+            self.requests: Dict[str, Histogram] = {}
+            self.auth_failures: Dict[int, int] = {}
+            self.token_consumption: Dict[str, float] = {}
+
+    def record_phase(self, name: str, seconds: float) -> None:
+        """処理の所要時間を加算する（鍵導出など、複数回行われる処理は合計になる）.
+
+        Args:
+            name: フェーズ名
+            seconds: 所要時間（秒）"""
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def set_phases(self, timings: Dict[str, float]) -> None:
+        """起動フェーズの所要時間をまとめて設定する（StartupPipeline.timings）."""
+        with self._lock:
+            self.phases.update(timings)
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        """ブロック内の処理の所要時間を record_phase で記録する."""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(name, time.perf_counter() - started_at)
+
+    def observe_request(self, route: str, seconds: float) -> None:
+        """リクエストの処理時間を記録する.
+
+        Args:
+            route: ルート（例: /secrets/bundle）
+            seconds: 処理時間（秒）"""
+        with self._lock:
+            histogram = self.requests.get(route)
+            if histogram is None:
+                histogram = self.requests[route] = Histogram()
+            histogram.observe(seconds)
+
+    def count_auth_failure(self, status: int) -> None:
+        """機密情報APIの失敗応答（401/403/500）を数える.
+
+        Args:
+            status: HTTPステータスコード"""
+        with self._lock:
+            self.auth_failures[status] = self.auth_failures.get(status, 0) + 1
+
+    def observe_token_consumption(self, service: str, seconds: float) -> None:
+        """トークンの生成から消費までの時間を記録する.
+
+        Args:
+            service: トークンの発行先サービス
+            seconds: 生成から消費までの時間（秒）"""
+        with self._lock:
+            self.token_consumption[service] = seconds
+
+    def render_prometheus(self) -> str:
+        """Prometheus のテキスト形式で出力する."""
+        lines = []
+        with self._lock:
+            lines.append(f"# TYPE {PREFIX}_phase_seconds gauge")
+            for name, seconds in self.phases.items():
+                lines.append(f'{PREFIX}_phase_seconds{{phase="{name}"}} {seconds:.6f}')
+
+            lines.append(f"# TYPE {PREFIX}_request_duration_seconds histogram")
+            for route, histogram in self.requests.items():
+                metric = f"{PREFIX}_request_duration_seconds"
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{metric}_bucket{{route="{route}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_sum{{route="{route}"}} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{{route="{route}"}} {histogram.count}')
+
+            lines.append(f"# TYPE {PREFIX}_auth_failures_total counter")
+            for status, count in sorted(self.auth_failures.items()):
+                lines.append(f'{PREFIX}_auth_failures_total{{status="{status}"}} {count}')
+
+            lines.append(f"# TYPE {PREFIX}_token_consumption_seconds gauge")
+            for service, seconds in self.token_consumption.items():
+                lines.append(
+                    f'{PREFIX}_token_consumption_seconds{{service="{service}"}} {seconds:.6f}'
+                )
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """終了時のログ出力用に、メトリクスを一行にまとめて返す."""
+        with self._lock:
+            phases = " ".join(
+                f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.phases.items()
+            )
+            requests = " ".join(
+                f"{route}={histogram.count}/{histogram.sum * 1000:.1f}ms"
+                for route, histogram in self.requests.items()
+            )
+            failures = " ".join(
+                f"{status}={count}" for status, count in sorted(self.auth_failures.items())
+            )
+            tokens = " ".join(
+                f"{service}={seconds:.3f}s" for service, seconds in self.token_consumption.items()
+            )
+        return (
+            f"phases[{phases}] requests[{requests}] failures[{failures}] "
+            f"token_consumption[{tokens}]"
+        )
+
+
+# プロセス全体で共有するメトリクス
+metrics = Metrics()
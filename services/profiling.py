@@ -0,0 +1,202 @@
+"""プロファイリングモジュール（環境変数 PROFILE=true で有効化）.
+
+起動処理（create_app）と最初の PROFILE_REQUESTS 件のリクエストについて、
+CPUプロファイル（cProfile）とメモリ割り当てのスナップショット（tracemalloc）を LOG_DIR に書き出します。
+
+出力ファイル:
+    {name}.prof        pstats 形式（`python -m pstats` や snakeviz で閲覧できる）
+    {name}.tracemalloc tracemalloc.Snapshot.dump 形式（tracemalloc.Snapshot.load で読み込める）
+    {name}.txt         上位の関数・割り当て箇所のテキストレポート
+
+.prof と .tracemalloc はコードの位置（ファイル名・行番号・関数名）のみを記録し、値は含みません。
+テキストレポートは書き出し前に Bearer トークンと読み込み済みの機密情報の値を伏せ字にします。"""
+
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+
+from flask import Flask, g
+
+PROFILE_ENABLED = os.environ.get("PROFILE", "false").lower() == "true"
+# プロファイルを取得するリクエスト数（起動後の最初の N 件）
+PROFILE_REQUESTS = int(os.environ.get("PROFILE_REQUESTS", "20"))
+
+# tracemalloc で記録するスタックの深さ
+TRACEMALLOC_FRAMES = 25
+# テキストレポートに出力する件数
+REPORT_LIMIT = 30
+
+REDACTED = "[REDACTED]"
+_BEARER_PATTERN = re.compile(r"Bearer\s+\S+")
+
+T = TypeVar("T")
+
+
+def redact(text: str, secret_values: Iterable[str] = ()) -> str:
+    """テキストから Bearer トークンと機密情報の値を伏せ字にする.
+
+    Args:
+        text: 対象のテキスト
+        secret_values: 伏せ字にする値
+
+    Returns:
+        伏せ字にしたテキスト"""
+    text = _BEARER_PATTERN.sub(f"Bearer {REDACTED}", text)
+    # 長い値から置換し、他の値を含む値が部分的に残らないようにする
+    for value in sorted(set(secret_values), key=len, reverse=True):
+        if value:
+            text = text.replace(value, REDACTED)
+    return text
+
+
+class Profiler:
+    """cProfile と tracemalloc で処理を計測し、結果を書き出すクラス.
+
+    enabled=False の場合は何もしないため、呼び出し側で有効・無効を分岐する必要はありません。"""
+
+    def __init__(self, name: str, enabled: bool = True):
+        """初期化.
+
+        Args:
+            name: 出力ファイル名（拡張子なし）
+            enabled: 計測を行うかどうか"""
+        self.name = name
+        self.enabled = enabled
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    def start_tracemalloc(self) -> None:
+        """メモリ割り当ての記録を開始する（既に記録中の場合は何もしない）."""
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+
+    def begin(self) -> Optional[cProfile.Profile]:
+        """呼び出したスレッドのCPUプロファイルの取得を開始する.
+
+        Returns:
+            end() に渡すプロファイル。無効な場合はNone"""
+        if not self.enabled:
+            return None
+        self.start_tracemalloc()
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def end(self, profile: Optional[cProfile.Profile]) -> None:
+        """begin() で開始したCPUプロファイルの取得を終了する."""
+        if profile is None:
+            return
+        profile.disable()
+        with self._lock:
+            self._profiles.append(profile)
+
+    @contextmanager
+    def profile(self) -> Iterator[None]:
+        """ブロック内の処理（呼び出したスレッドのみ）のCPUプロファイルを取得する."""
+        profile = self.begin()
+        try:
+            yield
+        finally:
+            self.end(profile)
+
+    def wrap(self, func: Callable[[], T]) -> Callable[[], T]:
+        """別スレッドで実行する処理もプロファイルの対象にする.
+
+        Args:
+            func: 対象の処理
+
+        Returns:
+            プロファイルを取得しながら func を実行する関数"""
+        if not self.enabled:
+            return func
+
+        def profiled() -> T:
+            with self.profile():
+                return func()
+
+        return profiled
+
+    def dump(self, output_dir: Path, secret_values: Iterable[str] = ()) -> Optional[Path]:
+        """計測結果を書き出す（複数スレッドのプロファイルは一つにまとめる）.
+
+        Args:
+            output_dir: 出力先ディレクトリ
+            secret_values: テキストレポートで伏せ字にする値
+
+        Returns:
+            テキストレポートのパス。計測していない場合はNone"""
+        with self._lock:
+            profiles, self._profiles = self._profiles, []
+        if not self.enabled or not profiles:
+            return None
+
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        report = io.StringIO()
+        stats = pstats.Stats(profiles[0], stream=report)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(str(output_dir / f"{self.name}.prof"))
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_LIMIT)
+
+        if snapshot is not None:
+            snapshot.dump(str(output_dir / f"{self.name}.tracemalloc"))
+            report.write(f"Top {REPORT_LIMIT} allocation sites:\n")
+            for stat in snapshot.statistics("lineno")[:REPORT_LIMIT]:
+                report.write(f"{stat}\n")
+
+        report_file = output_dir / f"{self.name}.txt"
+        report_file.write_text(redact(report.getvalue(), secret_values))
+        return report_file
+
+
+def init_request_profiling(
+    app: Flask, output_dir: Path, limit: int, secret_values: Callable[[], Iterable[str]]
+) -> None:
+    """最初の limit 件のリクエストのプロファイルを取得する.
+
+    cProfile は同時に一つしか有効にできないため、他のリクエストを計測中に届いたリクエストは対象外にします。
+    マルチワーカー構成ではワーカーごとに requests-{pid} として書き出します。
+
+    Args:
+        app: Flaskアプリケーション
+        output_dir: 出力先ディレクトリ
+        limit: プロファイルを取得するリクエスト数
+        secret_values: テキストレポートで伏せ字にする値を返す関数"""
+    profiler = Profiler("requests")
+    profiler.start_tracemalloc()
+    remaining = [limit]
+    busy = threading.Lock()
+
+    @app.before_request
+    def start_request_profile():
+        if remaining[0] <= 0 or not busy.acquire(blocking=False):
+            return
+        g.request_profile = profiler.begin()
+
+    @app.teardown_request
+    def finish_request_profile(exc):
+        if "request_profile" not in g:
+            return
+        try:
+            profiler.end(g.pop("request_profile"))
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                profiler.name = f"requests-{os.getpid()}"
+                report_file = profiler.dump(output_dir, secret_values())
+                app.logger.info(f"Request profile written: {report_file}")
+        finally:
+            busy.release()
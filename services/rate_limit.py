@@ -0,0 +1,109 @@
+"""認証失敗のレート制限モジュール.
+
+クライアント（接続元アドレス）ごとにトークンバケットを持ち、無効なトークンや Authorization ヘッダーのない
+リクエストのたびにトークンを一つ消費します。バケットが空になったクライアントの認証に失敗したリクエストは、
+401/403 の代わりに 429 で拒否します。制限は認証に失敗したリクエストにのみ適用するため、
+有効なトークンを提示する利用者は、同じ接続元（Unix ドメインソケット経由の "local" など）から
+無効なトークンが大量に送信されていても影響を受けません。
+
+状態はプロセスごとに保持します（マルチワーカー構成では、ワーカーごとに制限されます）。"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+# バケットの容量（連続して許容する認証失敗の回数）。0 の場合はレート制限を行わない
+AUTH_FAILURE_BURST = int(os.environ.get("AUTH_FAILURE_BURST", "20"))
+# バケットに補充されるトークンの数（1秒あたり）。0 の場合は補充せず、制限はプロセスの終了まで続く
+AUTH_FAILURE_RATE = float(os.environ.get("AUTH_FAILURE_RATE", "1.0"))
+# retry_after が返す秒数の上限（Retry-After ヘッダーの値。補充しない場合もこの値を返す）
+MAX_RETRY_AFTER = 3600.0
+# 状態を保持するクライアント数の上限（超えた場合は最も長く失敗していないクライアントから破棄する）
+MAX_TRACKED_CLIENTS = 10000
+
+
+class FailureLimiter:
+    """クライアントごとの認証失敗をトークンバケットで制限するクラス."""
+
+    def __init__(
+        self,
+        burst: int = AUTH_FAILURE_BURST,
+        rate: float = AUTH_FAILURE_RATE,
+        max_clients: int = MAX_TRACKED_CLIENTS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """初期化.
+
+        Args:
+            burst: バケットの容量（0 の場合はレート制限を行わない）
+            rate: 1秒あたりに補充されるトークンの数（0 の場合は補充しない）
+            max_clients: 状態を保持するクライアント数の上限
+            clock: 現在時刻を返す関数（テスト用）
+
+        Raises:
+            ValueError: rate が負の場合"""
+        if rate < 0:
+            raise ValueError(f"rate must not be negative: {rate}")
+        self.burst = burst
+        self.rate = rate
+        self.max_clients = max_clients
+        self._clock = clock
+        # クライアント -> (残りのトークン数, 最終更新時刻)。認証に失敗したクライアントのみ保持する
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """レート制限を行うかどうか."""
+        return self.burst > 0
+
+    def _refill(self, client: str, now: float) -> float:
+        """補充後のトークン数を返す（_lock 保持中に呼ぶ）."""
+        tokens, updated_at = self._buckets.get(client, (float(self.burst), now))
+        return min(float(self.burst), tokens + (now - updated_at) * self.rate)
+
+    def retry_after(self, client: str) -> float:
+        """クライアントが制限中であれば、次のリクエストが許可されるまでの秒数を返す.
+
+        Args:
+            client: クライアントの識別子（接続元アドレス）
+
+        Returns:
+            制限中でなければ0（MAX_RETRY_AFTER を上限とする）"""
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            if client not in self._buckets:
+                return 0.0
+            tokens = self._refill(client, self._clock())
+        if tokens >= 1:
+            return 0.0
+        if self.rate == 0:
+            return MAX_RETRY_AFTER
+        return min(MAX_RETRY_AFTER, (1 - tokens) / self.rate)
+
+    def record_failure(self, client: str) -> bool:
+        """認証の失敗を記録し、トークンを一つ消費する.
+
+        Args:
+            client: クライアントの識別子（接続元アドレス）
+
+        Returns:
+            この失敗でクライアントが制限中になった場合True"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            now = self._clock()
+            tokens = max(0.0, self._refill(client, now) - 1)
+            self._buckets[client] = (tokens, now)
+            self._buckets.move_to_end(client)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return tokens < 1
+
+    def reset(self) -> None:
+        """全てのクライアントの状態を破棄する."""
+        with self._lock:
+            self._buckets.clear()
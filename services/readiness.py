@@ -0,0 +1,129 @@
+"""起動状態（レディネス）の管理モジュール.
+
+起動処理の各段階（設定の読み込み・機密情報の復号・トークンの発行）の状態を保持し、
+全ての段階が完了するまで待機できるようにします（イベントループ上ではスレッドを占有せずに待機できます）。"""
+
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+# 起動処理の段階
+STAGES = ("config", "secrets", "tokens")
+
+# 各段階の状態
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    """起動処理の各段階の状態を保持し、完了を待機できるクラス."""
+
+    def __init__(self, stages: Iterable[str] = STAGES):
+        """初期化.
+
+        Args:
+            stages: 段階名の一覧（全て pending で開始する）"""
+        self._states: Dict[str, str] = {stage: PENDING for stage in stages}
+        self._reasons: Dict[str, str] = {}
+        self._condition = threading.Condition()
+        # 状態の変化時に呼び出す関数（wait_async で待機中のイベントループへの通知）
+        self._listeners: List[Callable[[], None]] = []
+
+    def mark_ready(self, stage: str) -> None:
+        """段階を完了にする.
+
+        Args:
+            stage: 段階名"""
+        self._set(stage, READY, None)
+
+    def mark_failed(self, stage: str, reason: str) -> None:
+        """段階を失敗にする.
+
+        Args:
+            stage: 段階名
+            reason: 失敗の理由（機密情報の値を含めないこと）"""
+        self._set(stage, FAILED, reason)
+
+    def is_ready(self) -> bool:
+        """全ての段階が完了しているかどうかを返す."""
+        with self._condition:
+            return self._is_ready()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """全ての段階が完了するか、いずれかが失敗するまで待機する.
+
+        Args:
+            timeout: 最大待機秒数（Noneの場合は無期限）
+
+        Returns:
+            全ての段階が完了した場合True"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._is_ready() and FAILED not in self._states.values():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self._is_ready()
+
+    async def wait_async(self, timeout: Optional[float] = None) -> bool:
+        """wait のコルーチン版（待機中もイベントループやスレッドを占有しない）.
+
+        Args:
+            timeout: 最大待機秒数（Noneの場合は無期限）
+
+        Returns:
+            全ての段階が完了した場合True"""
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def notify() -> None:
+            loop.call_soon_threadsafe(changed.set)
+
+        deadline = None if timeout is None else loop.time() + timeout
+        with self._condition:
+            self._listeners.append(notify)
+        try:
+            while True:
+                with self._condition:
+                    if self._is_ready() or FAILED in self._states.values():
+                        return self._is_ready()
+                    changed.clear()
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._condition:
+                self._listeners.remove(notify)
+
+    def snapshot(self) -> Dict[str, Dict[str, str]]:
+        """各段階の状態を返す（例: {"secrets": {"state": "failed", "reason": "..."}}）."""
+        with self._condition:
+            result = {}
+            for stage, state in self._states.items():
+                result[stage] = {"state": state}
+                if stage in self._reasons:
+                    result[stage]["reason"] = self._reasons[stage]
+            return result
+
+    def _is_ready(self) -> bool:
+        """全ての段階が完了しているかどうかを返す（_condition 保持中に呼ぶ）."""
+        return all(state == READY for state in self._states.values())
+
+    def _set(self, stage: str, state: str, reason: Optional[str]) -> None:
+        """段階の状態を更新し、待機中のスレッドに通知する."""
+        with self._condition:
+            self._states[stage] = state
+            if reason is None:
+                self._reasons.pop(stage, None)
+            else:
+                self._reasons[stage] = reason
+            self._condition.notify_all()
+            for listener in self._listeners:
+                listener()
@@ -0,0 +1,77 @@
+"""起動処理パイプライン.
+
+起動処理の各フェーズの所要時間を計測し、互いに依存しない重い処理（鍵導出・復号）を
+バックグラウンドで並行して実行します。"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List
+
+
+class StartupPipeline:
+    """起動フェーズの計測と、バックグラウンド実行の合流を行うクラス."""
+
+    def __init__(self):
+        """初期化."""
+        self.timings: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._executor = ThreadPoolExecutor(thread_name_prefix="startup")
+        self._pending: List[Future] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """ブロック内の処理をフェーズとして計測する.
+
+        Args:
+            name: フェーズ名"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - started_at)
+
+    def run_in_background(self, name: str, func: Callable[[], Any]) -> Future:
+        """処理をバックグラウンドのフェーズとして開始する.
+
+        Args:
+            name: フェーズ名
+            func: 実行する処理
+
+        Returns:
+            処理結果の Future"""
+
+        def timed() -> Any:
+            with self.phase(name):
+                return func()
+
+        future = self._executor.submit(timed)
+        self._pending.append(future)
+        return future
+
+    def join(self) -> None:
+        """バックグラウンドの処理が全て完了するまで待機する.
+
+        Raises:
+            Exception: バックグラウンドの処理で発生した例外"""
+        with self.phase("join"):
+            try:
+                for future in self._pending:
+                    future.result()
+            finally:
+                self._pending.clear()
+                self._executor.shutdown(wait=True)
+        self._record("total", time.perf_counter() - self._started_at)
+
+    def summary(self) -> str:
+        """各フェーズの所要時間をログ出力用の文字列で返す."""
+        with self._lock:
+            timings = list(self.timings.items())
+        return ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in timings)
+
+    def _record(self, name: str, seconds: float) -> None:
+        """フェーズの所要時間を記録する."""
+        with self._lock:
+            self.timings[name] = seconds
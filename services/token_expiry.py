@@ -0,0 +1,62 @@
+"""トークン有効期限スケジューラ.
+
+発行済みトークンの有効期限を最小ヒープで管理し、次の期限まで待機して失効処理を呼び出します。"""
+
+import heapq
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+
+class ExpiryScheduler:
+    """有効期限の最小ヒープを持ち、期限到来時にコールバックを呼び出すスケジューラ.
+
+    定期的に起床して全件を走査することはなく、最も早い期限まで待機します。
+    期限の前に消費されたトークンはコールバック側で無視してください。"""
+
+    def __init__(self, on_expire: Callable[[str], None]):
+        """初期化.
+
+        Args:
+            on_expire: 期限到来時に呼び出されるコールバック（引数はスケジュール時のキー）"""
+        self._on_expire = on_expire
+        self._heap: List[Tuple[float, str]] = []
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, deadline: float, key: str) -> None:
+        """期限を登録する.
+
+        Args:
+            deadline: 期限（time.monotonic() 基準の時刻）
+            key: 期限到来時にコールバックへ渡すキー"""
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, key))
+            # 最も早い期限が変わった場合のみ待機中のスレッドを起こす
+            if self._heap[0][1] == key:
+                self._condition.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="token-expiry", daemon=True
+                )
+                self._thread.start()
+
+    def clear(self) -> None:
+        """登録済みの期限を全て破棄する."""
+        with self._condition:
+            self._heap.clear()
+            self._condition.notify()
+
+    def _run(self) -> None:
+        """期限到来を待ち、コールバックを呼び出し続ける."""
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                deadline, key = self._heap[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                heapq.heappop(self._heap)
+            self._on_expire(key)
@@ -1,63 +1,426 @@
+import asyncio
+import ctypes
+import fcntl
+import hashlib
+import logging
+import math
 import secrets as py_secrets
+import tempfile
+import threading
+import time
 from pathlib import Path
 import os
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
 from flask import current_app
+from config import Config, DEFAULT_TOKEN_TTL
+from .metrics import metrics
+from .token_expiry import ExpiryScheduler
 
 TOKEN_DIR = Path(os.environ.get("TOKEN_DIR", "/app/tokens"))
 DEV_MODE = os.environ.get("DEV_MODE", "false").lower() == "true"
 DATABASE_TOKEN_FILE = TOKEN_DIR / "database_token.txt"
 BACKEND_TOKEN_FILE = TOKEN_DIR / "backend_token.txt"
+# 発行したバッチの全てのトークンファイルが公開された時点で作成するマーカー
+# （1行目がバッチの識別子 "batch=<id>"、以降が発行先サービスの一覧）。
+# バッチが有効な間はこのプロセスが排他ロック（flock）を保持し、利用側はロックの有無で古いマーカーを見分ける
+READY_MARKER = TOKEN_DIR / "tokens.ready"
+
+
+def token_file_for(service: str) -> Path:
+    """サービスのトークンファイルのパスを返す（例: backend -> backend_token.txt）."""
+    return TOKEN_DIR / f"{service}_token.txt"
+
+
+class TokenEntry(NamedTuple):
+    """発行済みトークンの情報."""
+
+    service: str
+    token_file: Path
+    secrets: Tuple[str, ...]
+    expires_at: float = math.inf  # time.monotonic() 基準の有効期限
+    issued_at: float = 0.0  # time.monotonic() 基準の生成時刻
+
+    def is_expired(self, now: float) -> bool:
+        """有効期限切れかどうかを返す."""
+        return self.expires_at <= now
+
+
+# トークンのダイジェスト -> 発行済みトークン（リクエスト処理中はファイルを読まない）
+_registry: Dict[str, TokenEntry] = {}
+_registry_lock = threading.Lock()
+
+# 全てのトークンが消費または失効した時点でセットされる（自動終了の通知用）
+_all_consumed = threading.Event()
+
+# 全てのトークンが消費または失効した時点で呼び出される関数（wait_for_all_consumed_async の通知用）
+_all_consumed_waiters: List[Callable[[], None]] = []
+
+# 有効期限切れで失効したトークンの発行先サービス
+_expired_services: List[str] = []
+
+# トークンの消費時に呼び出されるコールバック（マルチワーカー時の親プロセスへの通知など）
+_consumption_listeners: List[Callable[["TokenEntry"], None]] = []
+
+# 公開中の完了マーカーのファイル記述子（排他ロックを保持する）
+_marker_fd: Optional[int] = None
+
+# 失効処理や高速パス（routes.fast_path）はアプリケーションコンテキスト外で行われるため、生成時のロガーを保持する
+_logger: logging.Logger = logging.getLogger(__name__)
+
+
+def _stage_file(target: Path, content: str) -> Path:
+    """公開前の内容を、target と同じディレクトリの一時ファイルに書き込む.
+
+    一時ファイルは作成時点から権限 0600 で、公開は os.replace（rename）で行うため、
+    利用側が書き込み途中のファイルや権限が異なるファイルを読むことはありません。
+
+    Returns:
+        一時ファイルのパス"""
+    fd, temp_path = tempfile.mkstemp(prefix=f".{target.name}.", suffix=".tmp", dir=target.parent)
+    with os.fdopen(fd, "w") as f:
+        f.write(content)
+    return Path(temp_path)
+
+
+def _lock_file(path: Path) -> int:
+    """ファイルを開いて排他ロックを取得し、ファイル記述子を返す（ロックはプロセスの終了時にも解放される）."""
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def _remove_ready_marker() -> None:
+    """完了マーカーを削除し、ロックを解放する."""
+    global _marker_fd
+    READY_MARKER.unlink(missing_ok=True)
+    if _marker_fd is not None:
+        os.close(_marker_fd)
+        _marker_fd = None
+
+
+# syncfs(2)（Linux）。ファイルシステム単位で書き出せない環境では os.sync で全体を書き出す
+try:
+    _syncfs: Optional[Callable[[int], int]] = ctypes.CDLL(None, use_errno=True).syncfs
+    _syncfs.argtypes = [ctypes.c_int]  # type: ignore[attr-defined]
+except (AttributeError, OSError):
+    _syncfs = None
+
+
+def _sync_filesystem(directory: Path) -> None:
+    """directory を含むファイルシステムへの書き込みを一度に書き出す（ファイルごとの fsync の代わり）."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        if _syncfs is None or _syncfs(fd) != 0:
+            os.sync()
+    finally:
+        os.close(fd)
+
+
+def _fsync_directory(directory: Path) -> None:
+    """ディレクトリのエントリ（rename の結果）を書き出す."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _digest(token: str) -> str:
+    """トークンのSHA-256ダイジェストを返す（平文のトークンはメモリ上に保持しない）."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _update_all_consumed() -> None:
+    """レジストリの状態に合わせて全消費イベントを更新する（_registry_lock 保持中に呼ぶ）.
+
+    全てのトークンが消費または失効した場合は、完了マーカーも削除します。"""
+    if _registry:
+        _all_consumed.clear()
+    else:
+        _remove_ready_marker()
+        _all_consumed.set()
+        for waiter in _all_consumed_waiters:
+            waiter()
+
+
+def _expire_token(digest: str) -> None:
+    """有効期限に達したトークンを失効させる（ExpiryScheduler から呼ばれる）."""
+    with _registry_lock:
+        entry = _registry.get(digest)
+        # 消費済み、または再発行で置き換えられたトークンは無視する
+        if entry is None or not entry.is_expired(time.monotonic()):
+            return
+        del _registry[digest]
+        _expired_services.append(entry.service)
+        _update_all_consumed()
+    entry.token_file.unlink(missing_ok=True)
+    _logger.info(f"Token expired and deleted: {entry.token_file.name}")
+
+
+_expiry_scheduler = ExpiryScheduler(on_expire=_expire_token)
+
+# fork 時にレジストリのロックが他のスレッドに保持されたまま子プロセスへ複製されないようにする
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(
+        before=_registry_lock.acquire,
+        after_in_parent=_registry_lock.release,
+        after_in_child=_registry_lock.release,
+    )
+
 
 class TokenService:
     @staticmethod
-    def generate_tokens():
-        """起動時にワンタイムトークンを生成しファイルに保存する."""
+    def generate_tokens(
+        services: Optional[Dict[str, List[str]]] = None,
+        ttls: Optional[Dict[str, float]] = None,
+    ):
+        """起動時にワンタイムトークンを生成しファイルに保存する.
+
+        ファイルは各サービスへの配布用で、検証はメモリ上のレジストリに対して行います。
+        各トークンは有効期限を持ち、期限に達すると失効します（DEV_MODE=true では失効しない）。
+
+        全てのトークンを権限 0600 の一時ファイルに書き込み、一度の同期（syncfs）で書き出してからレジストリに登録し、
+        rename で一括して公開します（公開されたファイルの内容は書き出し済みで、rename の結果も最後に書き出す）。
+        最後に排他ロックを取得した完了マーカー（READY_MARKER）を公開するため、利用側はトークンファイルを見つけた時点で
+        そのまま読み込めます（マーカーがあるのにファイルがなければ、そのトークンは消費済み・失効済み・未発行）。
+        マーカーは全てのトークンが消費・失効した時点で削除し、プロセスが異常終了した場合もロックは解放されます。
+
+        Args:
+            services: サービス名 -> 取得可能な機密情報のパス。省略時は Config.SERVICES
+            ttls: サービス名 -> トークンの有効期間（秒）。省略時は Config.TOKEN_TTLS"""
+        global _logger, _marker_fd
+        if services is None:
+            services = Config.SERVICES
+        if ttls is None:
+            ttls = Config.TOKEN_TTLS
+        _logger = current_app.logger
         TOKEN_DIR.mkdir(parents=True, exist_ok=True)
-        
-        for token_file in [DATABASE_TOKEN_FILE, BACKEND_TOKEN_FILE]:
-            token = py_secrets.token_urlsafe(32)
-            token_file.write_text(token)
-            token_file.chmod(0o600)
+        # 前回のバッチの完了マーカーを消し、公開が終わるまで新しいバッチを未完了として扱わせる
+        with _registry_lock:
+            _remove_ready_marker()
+
+        batch_id = py_secrets.token_hex(8)
+        registry = {}
+        staged: List[Tuple[Path, Path]] = []  # (一時ファイル, 公開先)
+        marker: Optional[Path] = None
+        issued_at = time.monotonic()
+        try:
+            for service, secret_paths in services.items():
+                token_file = token_file_for(service)
+                token = py_secrets.token_urlsafe(32)
+                staged.append((_stage_file(token_file, token), token_file))
+                ttl = ttls.get(service, DEFAULT_TOKEN_TTL)
+                expires_at = math.inf if DEV_MODE else issued_at + ttl
+                registry[_digest(token)] = TokenEntry(
+                    service=service,
+                    token_file=token_file,
+                    secrets=tuple(secret_paths),
+                    expires_at=expires_at,
+                    issued_at=issued_at,
+                )
+            services_list = "".join(f"{service}\n" for service in services)
+            marker = _stage_file(READY_MARKER, f"batch={batch_id}\n{services_list}")
+            # ファイルごとに fsync せず、公開前に全ての一時ファイルの内容を一度に書き出す
+            _sync_filesystem(TOKEN_DIR)
+            # rename の前にロックを取得し、公開された時点から有効なバッチのマーカーとして扱わせる
+            marker_fd = _lock_file(marker)
+        except BaseException:
+            for temp_path, _ in staged:
+                temp_path.unlink(missing_ok=True)
+            if marker is not None:
+                marker.unlink(missing_ok=True)
+            raise
+
+        # 公開した時点でトークンが使えるよう、レジストリを先に置き換える
+        with _registry_lock:
+            _registry.clear()
+            _registry.update(registry)
+            _expired_services.clear()
+            _update_all_consumed()
+
+        for temp_path, token_file in staged:
+            os.replace(temp_path, token_file)
             current_app.logger.info(f"Generated token file: {token_file.name}")
+        # rename によるディレクトリのエントリの変更を書き出す
+        _fsync_directory(TOKEN_DIR)
+        with _registry_lock:
+            if _registry:
+                os.replace(marker, READY_MARKER)
+                _marker_fd = marker_fd
+            else:
+                # 公開中に全てのトークンが消費された場合は、マーカーを残さない
+                marker.unlink()
+                os.close(marker_fd)
+        current_app.logger.info(f"Published token batch {batch_id}: {', '.join(services)}")
+
+        _expiry_scheduler.clear()
+        for digest, entry in registry.items():
+            if entry.expires_at != math.inf:
+                _expiry_scheduler.schedule(entry.expires_at, digest)
+
+    @staticmethod
+    def consume_token(
+        provided_token: str, required_secret: Optional[str] = None
+    ) -> Optional[TokenEntry]:
+        """トークンの検証と消費を一つの操作として行い、該当するエントリを返す.
+
+        DEV_MODE=false（デフォルト）: トークンを破棄しファイルを削除して再利用不可にする（本番動作）
+        DEV_MODE=true: トークンを破棄せず再利用可能にする（ローカル開発用）
+
+        消費はトークンファイルの削除が成功した時点で確定します。削除はプロセス間でアトミックなため、
+        マルチワーカー構成で複数のプロセスが同じトークンを受け取っても成功するのは一つだけです。
+
+        Args:
+            provided_token: リクエストで提示されたトークン
+            required_secret: 取得しようとしている機密情報のパス。
+                             トークンの発行先サービスに許可されていない場合は消費せずに拒否する
+
+        Returns:
+            有効なトークンの場合はそのエントリ、無効な場合はNone"""
+        digest = _digest(provided_token)
+        with _registry_lock:
+            entry = _registry.get(digest)
+            if entry is None or entry.is_expired(time.monotonic()):
+                return None
+            if required_secret is not None and required_secret not in entry.secrets:
+                _logger.warning(
+                    f"Service '{entry.service}' is not allowed to access '{required_secret}'."
+                )
+                return None
+            if not DEV_MODE:
+                del _registry[digest]
+                _update_all_consumed()
+
+        if not DEV_MODE:
+            try:
+                entry.token_file.unlink()
+            except FileNotFoundError:
+                _logger.warning(
+                    f"Token already consumed by another worker: {entry.token_file.name}"
+                )
+                return None
+            _logger.info(f"Consumed and deleted token file: {entry.token_file.name}")
+            metrics.observe_token_consumption(entry.service, time.monotonic() - entry.issued_at)
+            for listener in list(_consumption_listeners):
+                listener(entry)
+        else:
+            _logger.info(
+                f"Verified token (dev mode, not consumed): {entry.token_file.name}"
+            )
+        return entry
+
+    @staticmethod
+    def mark_consumed(service: str) -> None:
+        """他のプロセスで消費されたトークンを、このプロセスでも消費済みにする.
+
+        Args:
+            service: 消費されたトークンの発行先サービス"""
+        consumed = []
+        with _registry_lock:
+            for digest, entry in list(_registry.items()):
+                if entry.service == service:
+                    consumed.append(_registry.pop(digest))
+            _update_all_consumed()
+        now = time.monotonic()
+        for entry in consumed:
+            metrics.observe_token_consumption(entry.service, now - entry.issued_at)
+
+    @staticmethod
+    def add_consumption_listener(listener: Callable[[TokenEntry], None]) -> None:
+        """トークンの消費時に呼び出されるコールバックを登録する.
+
+        Args:
+            listener: 消費されたトークンのエントリを受け取るコールバック"""
+        _consumption_listeners.append(listener)
 
     @staticmethod
     def verify_and_consume_token(provided_token: str) -> bool:
-        """トークンを検証し、正しければTrueを返す.
-
-        DEV_MODE=false（デフォルト）: トークンファイルを削除して再利用不可にする（本番動作）
-        DEV_MODE=true: トークンファイルを削除せず再利用可能にする（ローカル開発用）
-        """
-        for token_file in [DATABASE_TOKEN_FILE, BACKEND_TOKEN_FILE]:
-            if token_file.exists():
-                stored_token = token_file.read_text().strip()
-                if py_secrets.compare_digest(stored_token, provided_token):
-                    if not DEV_MODE:
-                        token_file.unlink()
-                        current_app.logger.info(f"Consumed and deleted token file: {token_file.name}")
-                    else:
-                        current_app.logger.info(f"Verified token (dev mode, not consumed): {token_file.name}")
-                    return True
-        return False
+        """トークンを検証し、正しければ消費してTrueを返す."""
+        return TokenService.consume_token(provided_token) is not None
 
     @staticmethod
     def get_token_status(token_value: str) -> bool:
         """トークンが有効かどうかを確認（消費はしない）."""
-        for token_file in [DATABASE_TOKEN_FILE, BACKEND_TOKEN_FILE]:
-            if token_file.exists():
-                stored_token = token_file.read_text().strip()
-                if py_secrets.compare_digest(stored_token, token_value):
-                    return True
-        return False
+        with _registry_lock:
+            entry = _registry.get(_digest(token_value))
+        return entry is not None and not entry.is_expired(time.monotonic())
+
+    @staticmethod
+    def outstanding_secrets() -> Set[str]:
+        """未消費のトークンが取得できる機密情報のパスを返す."""
+        now = time.monotonic()
+        with _registry_lock:
+            entries = list(_registry.values())
+        return {path for entry in entries if not entry.is_expired(now) for path in entry.secrets}
 
     @staticmethod
     def check_all_tokens_consumed() -> bool:
-        """全てのトークンファイルが削除されたか確認する."""
-        return not DATABASE_TOKEN_FILE.exists() and not BACKEND_TOKEN_FILE.exists()
+        """全てのトークンが消費されたか確認する."""
+        with _registry_lock:
+            return not _registry
+
+    @staticmethod
+    def wait_for_all_consumed(timeout: Optional[float] = None) -> bool:
+        """全てのトークンが消費または失効するまで待機する.
+
+        Args:
+            timeout: 最大待機秒数（Noneの場合は無期限）
+
+        Returns:
+            全て消費または失効した場合True、タイムアウトした場合False"""
+        return _all_consumed.wait(timeout)
+
+    @staticmethod
+    async def wait_for_all_consumed_async() -> None:
+        """全てのトークンが消費または失効するまで待機する（イベントループ上でスレッドを占有せずに待機する）."""
+        loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+
+        def notify() -> None:
+            loop.call_soon_threadsafe(done.set)
+
+        with _registry_lock:
+            if not _registry:
+                return
+            _all_consumed_waiters.append(notify)
+        try:
+            await done.wait()
+        finally:
+            with _registry_lock:
+                _all_consumed_waiters.remove(notify)
+
+    @staticmethod
+    def expired_services() -> List[str]:
+        """有効期限切れで失効したトークンの発行先サービスを返す."""
+        with _registry_lock:
+            return list(_expired_services)
 
     @staticmethod
     def delete_remaining_tokens() -> None:
-        """残っているトークンファイルを削除する（タイムアウトによる自滅前に呼ぶ）."""
-        for token_file in [DATABASE_TOKEN_FILE, BACKEND_TOKEN_FILE]:
-            if token_file.exists():
-                token_file.unlink(missing_ok=True)
+        """残っているトークンを破棄し、ファイルと完了マーカーを削除する（プロセスの終了前に呼ぶ）."""
+        with _registry_lock:
+            remaining = list(_registry.values())
+            _registry.clear()
+            _remove_ready_marker()
+            _update_all_consumed()
+        for entry in remaining:
+            entry.token_file.unlink(missing_ok=True)
+
+    @staticmethod
+    def remove_stale_batch() -> None:
+        """前回の起動で公開されたまま残っている完了マーカーと、そこに記載されたトークンファイルを削除する.
 
+        異常終了したプロセスのトークンはレジストリとともに無効になっているため、
+        新しいバッチの公開前に利用側が古いトークンを読み込まないよう、起動処理の最初に呼びます。"""
+        try:
+            lines = READY_MARKER.read_text().splitlines()
+        except FileNotFoundError:
+            return
+        for service in lines[1:]:
+            token_file_for(service).unlink(missing_ok=True)
+        with _registry_lock:
+            _remove_ready_marker()
@@ -3,7 +3,14 @@ APIエンドポイントの統合テスト
 """
 
 import pytest
+import threading
 from pathlib import Path
+from unittest.mock import patch
+from config import Config
+from config.secrets import EncryptedValue, SecretManager
+from services.metrics import metrics
+from services.rate_limit import FailureLimiter
+from services.readiness import Readiness
 from services.token_service import TokenService, DATABASE_TOKEN_FILE, BACKEND_TOKEN_FILE
 
 def test_health_endpoint(client):
@@ -13,6 +20,30 @@ def test_health_endpoint(client):
     data = response.get_json()
     assert data["status"] == "OK"
 
+def test_ready_reports_failed_stage(client):
+    """設定を読み込めなかった段階が失敗として報告されることを確認."""
+    response = client.get("/ready")
+    assert response.status_code == 503
+    data = response.get_json()
+    assert data["ready"] is False
+    assert data["stages"]["config"]["state"] == "failed"
+    assert data["stages"]["tokens"] == {"state": "ready"}
+
+def test_ready_long_poll(client, app):
+    """wait パラメータ指定時、準備が整うまでサーバー側で待機することを確認."""
+    readiness = Readiness(["secrets"])
+    app.extensions["readiness"] = readiness
+    assert client.get("/ready").status_code == 503
+
+    threading.Timer(0.05, readiness.mark_ready, args=("secrets",)).start()
+    response = client.get("/ready?wait=5")
+    assert response.status_code == 200
+    assert response.get_json() == {"ready": True, "stages": {"secrets": {"state": "ready"}}}
+
+def test_ready_rejects_invalid_wait(client):
+    """数値でない wait パラメータが拒否されることを確認."""
+    assert client.get("/ready?wait=soon").status_code == 400
+
 def test_get_password_without_auth(client):
     """認証なしでのパスワード取得が拒否されることを確認."""
     response = client.get("/secrets/database/password")
@@ -41,3 +72,125 @@ def test_get_password_success(client, app):
         
         # トークンが削除されたことを確認
         assert not DATABASE_TOKEN_FILE.exists()
+
+def test_get_password_token_reuse_rejected(client, app):
+    """消費済みトークンの再利用が拒否されることを確認."""
+    with app.app_context():
+        TokenService.generate_tokens()
+        token = DATABASE_TOKEN_FILE.read_text().strip()
+
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/secrets/database/password", headers=headers).status_code == 200
+    assert client.get("/secrets/database/password", headers=headers).status_code == 403
+
+def test_get_bundle_success(client, app):
+    """トークンの発行先サービスの機密情報がまとめて取得できることを確認."""
+    with app.app_context():
+        TokenService.generate_tokens({"worker": ["database.password"]})
+        token = (DATABASE_TOKEN_FILE.parent / "worker_token.txt").read_text().strip()
+
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/secrets/bundle", headers=headers)
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "service": "worker",
+        "secrets": {"database": {"password": Config.DB_PASSWORD}},
+    }
+    assert client.get("/secrets/bundle", headers=headers).status_code == 403
+
+def test_get_password_out_of_scope_rejected(client, app):
+    """許可されていない機密情報の取得が拒否され、トークンが消費されないことを確認."""
+    with app.app_context():
+        TokenService.generate_tokens({"search": []})
+        token = (DATABASE_TOKEN_FILE.parent / "search_token.txt").read_text().strip()
+
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/secrets/database/password", headers=headers).status_code == 403
+    assert client.get("/secrets/bundle", headers=headers).status_code == 200
+
+def test_lazy_decrypt_drops_plaintext_after_consumption(client, app):
+    """遅延復号モードで、全ての取得元トークンが消費された値の平文が破棄されることを確認."""
+    manager = SecretManager("lazy_key")
+    Config._config = {"database": {"password": EncryptedValue(manager.encrypt("lazy_pw"), manager)}}
+    Config._plaintext = {}
+    with app.app_context():
+        TokenService.generate_tokens()
+        db_token = DATABASE_TOKEN_FILE.read_text().strip()
+        backend_token = BACKEND_TOKEN_FILE.read_text().strip()
+
+    with patch.object(Config, "LAZY_DECRYPT", True):
+        response = client.get(
+            "/secrets/database/password", headers={"Authorization": f"Bearer {db_token}"}
+        )
+        assert response.get_json() == {"password": "lazy_pw"}
+        # backend のトークンが未消費のため保持される
+        assert Config._plaintext == {"database.password": "lazy_pw"}
+
+        response = client.get(
+            "/secrets/database/password", headers={"Authorization": f"Bearer {backend_token}"}
+        )
+        assert response.get_json() == {"password": "lazy_pw"}
+        assert Config._plaintext == {}
+
+def test_metrics_endpoint(client, app):
+    """リクエスト処理時間・認証の失敗件数・トークンの消費時間が /metrics に出力されることを確認."""
+    metrics.reset()
+    with app.app_context():
+        TokenService.generate_tokens()
+        token = DATABASE_TOKEN_FILE.read_text().strip()
+
+    client.get("/secrets/database/password")
+    client.get("/secrets/database/password", headers={"Authorization": f"Bearer {token}"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    route = 'route="/secrets/database/password"'
+    assert f"secrets_api_request_duration_seconds_count{{{route}}} 2" in text
+    assert 'secrets_api_auth_failures_total{status="401"} 1' in text
+    assert 'secrets_api_token_consumption_seconds{service="database"}' in text
+
+def test_invalid_token_flood_is_rate_limited(client, app):
+    """無効なトークンを繰り返すクライアントは 429 になり、有効なトークンの取得は影響を受けないことを確認."""
+    app.extensions["auth_limiter"] = FailureLimiter(burst=3, rate=0.1)
+    with app.app_context():
+        TokenService.generate_tokens()
+        token = DATABASE_TOKEN_FILE.read_text().strip()
+
+    flooder = {"REMOTE_ADDR": "10.0.0.99"}
+    headers = {"Authorization": "Bearer invalid_token"}
+    statuses = [
+        client.get("/secrets/database/password", headers=headers, environ_base=flooder).status_code
+        for _ in range(5)
+    ]
+    assert statuses == [403, 403, 403, 429, 429]
+
+    response = client.get("/secrets/database/password", environ_base=flooder)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # 制限中の接続元からでも有効なトークンは受け付ける
+    response = client.get(
+        "/secrets/database/password",
+        headers={"Authorization": f"Bearer {token}"},
+        environ_base=flooder,
+    )
+    assert response.status_code == 200
+
+    # 消費済みのトークンは認証の失敗として制限される
+    response = client.get(
+        "/secrets/database/password",
+        headers={"Authorization": f"Bearer {token}"},
+        environ_base=flooder,
+    )
+    assert response.status_code == 429
+
+def test_rate_limit_without_refill_returns_429(client, app):
+    """補充しない設定（AUTH_FAILURE_RATE=0）で制限中のクライアントにも 500 ではなく 429 を返すことを確認."""
+    app.extensions["auth_limiter"] = FailureLimiter(burst=1, rate=0.0)
+    flooder = {"REMOTE_ADDR": "10.0.0.98"}
+
+    assert client.get("/secrets/database/password", environ_base=flooder).status_code == 401
+    response = client.get("/secrets/database/password", environ_base=flooder)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3600"
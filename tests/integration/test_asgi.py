@@ -0,0 +1,221 @@
+"""
+非同期サーバー（asgi.SecretsASGI / asgi.AsyncHTTPServer）の統合テスト
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from asgi import AsyncHTTPServer, SecretsASGI
+from services.rate_limit import FailureLimiter
+from services.readiness import Readiness
+from services.token_service import TokenService, DATABASE_TOKEN_FILE, token_file_for
+
+async def asgi_request(asgi_app, method, path, headers=None, query_string=b""):
+    """ASGI アプリケーションを直接呼び出し、(ステータス, ヘッダー, 本文) を返す."""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "query_string": query_string, "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 5000),
+    }
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    response_headers = {k.decode(): v.decode() for k, v in sent[0]["headers"]}
+    return sent[0]["status"], response_headers, sent[1]["body"]
+
+async def http_get(port, path, headers=None):
+    """一件の GET リクエストを送信し、(ステータス, 本文) を返す."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = [f"GET {path} HTTP/1.1", "Host: localhost", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ")[1]), body
+
+def issue_tokens(app):
+    with app.app_context():
+        TokenService.generate_tokens({"database": ["database.password"], "search": []})
+    return {
+        "db": DATABASE_TOKEN_FILE.read_text().strip(),
+        "search": token_file_for("search").read_text().strip(),
+    }
+
+@pytest.mark.parametrize("method, path, headers, query_string", [
+    ("GET", "/health", {}, b""),
+    ("GET", "/api/health", {}, b""),
+    ("GET", "/ready", {}, b""),
+    ("GET", "/ready", {}, b"wait=abc"),
+    ("GET", "/secrets/database/password", {}, b""),
+    ("GET", "/secrets/database/password", {"Authorization": "Bearer invalid_token"}, b""),
+    ("GET", "/secrets/database/password", {"Authorization": "Bearer {db}"}, b""),
+    ("GET", "/secrets/database/password", {"Authorization": "Bearer {search}"}, b""),
+    ("GET", "/secrets/bundle", {"Authorization": "Bearer {db}"}, b""),
+    ("POST", "/secrets/database/password", {"Authorization": "Bearer {db}"}, b""),
+    ("GET", "/not-found", {}, b""),
+])
+def test_asgi_matches_flask(app, method, path, headers, query_string):
+    """ASGI 版の応答（ステータス・本文・Content-Type）が Flask と一致することを確認."""
+    asgi_app = SecretsASGI(app)
+    responses = []
+    for call in ("asgi", "flask"):
+        tokens = issue_tokens(app)
+        request_headers = {name: value.format(**tokens) for name, value in headers.items()}
+        if call == "asgi":
+            responses.append(asyncio.run(
+                asgi_request(asgi_app, method, path, request_headers, query_string)
+            ))
+        else:
+            response = app.test_client().open(
+                path, method=method, headers=request_headers,
+                query_string=query_string.decode(),
+            )
+            responses.append((response.status_code, response.headers, response.get_data()))
+    asgi_app.close()
+
+    (asgi_status, asgi_headers, asgi_body), (flask_status, flask_headers, flask_body) = responses
+    assert asgi_status == flask_status
+    assert asgi_body == flask_body
+    assert asgi_headers["content-type"] == flask_headers["Content-Type"]
+
+def test_ready_waiters_do_not_hold_threads(app):
+    """多数の /ready?wait の待機がスレッドを占有せず、準備完了時に全て応答することを確認."""
+    readiness = Readiness()
+    app.extensions["readiness"] = readiness
+    asgi_app = SecretsASGI(app)
+
+    async def scenario():
+        waiters = [
+            asyncio.create_task(asgi_request(asgi_app, "GET", "/ready", query_string=b"wait=10"))
+            for _ in range(200)
+        ]
+        await asyncio.sleep(0.1)
+        threads_while_waiting = threading.active_count()
+        for stage in ("config", "secrets", "tokens"):
+            readiness.mark_ready(stage)
+        return threads_while_waiting, await asyncio.wait_for(asyncio.gather(*waiters), 5)
+
+    threads_before = threading.active_count()
+    threads_while_waiting, responses = asyncio.run(scenario())
+    asgi_app.close()
+
+    assert threads_while_waiting == threads_before
+    assert [status for status, _, _ in responses] == [200] * 200
+
+def test_ready_wait_returns_503_on_failure_and_timeout(app):
+    """段階が失敗した場合、および待機がタイムアウトした場合に 503 になることを確認."""
+    readiness = Readiness()
+    app.extensions["readiness"] = readiness
+    asgi_app = SecretsASGI(app)
+
+    async def scenario():
+        timed_out = await asgi_request(asgi_app, "GET", "/ready", query_string=b"wait=0.05")
+        waiter = asyncio.create_task(
+            asgi_request(asgi_app, "GET", "/ready", query_string=b"wait=10")
+        )
+        await asyncio.sleep(0.05)
+        readiness.mark_failed("secrets", "unavailable: database.password")
+        return timed_out, await asyncio.wait_for(waiter, 5)
+
+    timed_out, failed = asyncio.run(scenario())
+    asgi_app.close()
+
+    assert timed_out[0] == 503
+    assert failed[0] == 503
+    assert b"unavailable: database.password" in failed[2]
+
+def test_server_consumes_token_once_under_concurrency(app):
+    """同じトークンによる並行リクエストのうち、成功するのが一つだけであることを確認."""
+    app.extensions["auth_limiter"] = FailureLimiter(burst=0)  # 拒否されたリクエストを 429 にしない
+    tokens = issue_tokens(app)
+
+    async def scenario():
+        server = AsyncHTTPServer(SecretsASGI(app))
+        await server.start("127.0.0.1", 0)
+        try:
+            headers = {"Authorization": f"Bearer {tokens['db']}"}
+            return await asyncio.gather(*[
+                http_get(server.port, "/secrets/database/password", headers) for _ in range(50)
+            ])
+        finally:
+            await server.shutdown()
+
+    responses = asyncio.run(scenario())
+
+    statuses = sorted(status for status, _ in responses)
+    assert statuses == [200] + [403] * 49
+    assert not DATABASE_TOKEN_FILE.exists()
+
+def test_server_keep_alive_and_bad_request(app):
+    """keep-alive 接続で複数のリクエストを処理し、不正なリクエストには 400 で応答することを確認."""
+    async def scenario():
+        server = AsyncHTTPServer(SecretsASGI(app))
+        await server.start("127.0.0.1", 0)
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            statuses = []
+            for _ in range(3):
+                writer.write(b"GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n")
+                head = (await reader.readuntil(b"\r\n\r\n")).lower()
+                length = int(head.split(b"content-length: ")[1].split(b"\r\n")[0])
+                await reader.readexactly(length)
+                statuses.append(int(head.split(b" ")[1]))
+            writer.write(b"NONSENSE\r\n\r\n")
+            bad = await reader.read()
+            writer.close()
+            return statuses, bad
+        finally:
+            await server.shutdown()
+
+    statuses, bad = asyncio.run(scenario())
+
+    assert statuses == [200, 200, 200]
+    assert bad.startswith(b"HTTP/1.1 400 ")
+
+def test_shutdown_is_awaitable_after_all_tokens_consumed(app):
+    """全てのトークンの消費を待機してから停止でき、停止後は接続を受け付けないことを確認."""
+    with app.app_context():
+        TokenService.generate_tokens({"database": ["database.password"]})
+    token = DATABASE_TOKEN_FILE.read_text().strip()
+
+    async def scenario():
+        server = AsyncHTTPServer(SecretsASGI(app))
+        await server.start("127.0.0.1", 0)
+        port = server.port
+
+        async def shutdown_when_consumed():
+            await TokenService.wait_for_all_consumed_async()
+            await server.shutdown()
+
+        monitor = asyncio.create_task(shutdown_when_consumed())
+        # 次のリクエストを待っているだけの接続は停止を妨げない
+        idle_reader, idle_writer = await asyncio.open_connection("127.0.0.1", port)
+        await asyncio.sleep(0.05)
+        assert not monitor.done()
+
+        status, _ = await http_get(
+            port, "/secrets/database/password", {"Authorization": f"Bearer {token}"}
+        )
+        await asyncio.wait_for(server.serve_forever(), 5)
+        await monitor
+        closed = await asyncio.wait_for(idle_reader.read(), 5)
+        idle_writer.close()
+        with pytest.raises(OSError):
+            await asyncio.open_connection("127.0.0.1", port)
+        return status, closed
+
+    status, closed = asyncio.run(scenario())
+
+    assert status == 200
+    assert closed == b""
@@ -0,0 +1,75 @@
+"""
+クライアントの統合テスト
+"""
+
+import socket
+import threading
+from unittest.mock import patch
+
+import pytest
+from werkzeug.serving import make_server
+
+from client import SecretsClient, SecretsClientError
+from config import Config
+from services.token_service import TokenService, TOKEN_DIR
+
+@pytest.fixture
+def live_server(app):
+    """テスト用のサーバーをスレッドで起動する."""
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def secrets_config():
+    """取得対象の機密情報を設定する."""
+    with patch.object(Config, "_config", {"database": {"password": "client_pw"}}):
+        yield
+
+def test_client_waits_and_fetches(app, live_server, secrets_config):
+    """トークンの待機から取得までを行い、サーバーが閉じた接続は張り直すことを確認."""
+    with app.app_context():
+        TokenService.generate_tokens()
+
+    with SecretsClient(
+        "backend", base_url=f"http://127.0.0.1:{live_server.port}", token_dir=TOKEN_DIR
+    ) as secrets_client:
+        with pytest.raises(SecretsClientError) as excinfo:
+            secrets_client.wait_until_ready(wait=0.01)
+        assert excinfo.value.status == 503
+
+        token = secrets_client.wait_for_token(timeout=1)
+        assert secrets_client.fetch_bundle() == {"database": {"password": "client_pw"}}
+
+        with pytest.raises(SecretsClientError) as excinfo:
+            secrets_client.fetch_database_password(token)
+        assert excinfo.value.status == 403
+
+def test_client_retries_until_server_starts(app, secrets_config):
+    """サーバーの起動前に接続した場合も、再試行により取得できることを確認."""
+    with app.app_context():
+        TokenService.generate_tokens()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    servers = []
+
+    def start_server():
+        server = make_server("127.0.0.1", port, app, threaded=True)
+        servers.append(server)
+        server.serve_forever()
+
+    threading.Timer(0.1, start_server).start()
+    try:
+        with SecretsClient(
+            "database", base_url=f"http://127.0.0.1:{port}", token_dir=TOKEN_DIR, retries=10
+        ) as secrets_client:
+            assert secrets_client.fetch_database_password() == "client_pw"
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
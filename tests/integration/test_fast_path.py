@@ -0,0 +1,71 @@
+"""
+秘密情報ルートの高速パス（routes.fast_path）の統合テスト
+"""
+
+import pytest
+from werkzeug.test import Client
+
+from config import Config
+from routes.fast_path import SecretsFastPath
+from services.metrics import metrics
+from services.token_service import TokenService, DATABASE_TOKEN_FILE, token_file_for
+
+def call_both(app, path, headers):
+    """同じトークンを発行し直して、高速パスとブループリントに同じリクエストを送る."""
+    fast_path = app.wsgi_app
+    assert isinstance(fast_path, SecretsFastPath)
+    responses = []
+    for wsgi_app in (fast_path, fast_path.wsgi_app):
+        with app.app_context():
+            TokenService.generate_tokens({"database": ["database.password"], "search": []})
+        tokens = {
+            "db": DATABASE_TOKEN_FILE.read_text().strip(),
+            "search": token_file_for("search").read_text().strip(),
+        }
+        request_headers = {name: value.format(**tokens) for name, value in headers.items()}
+        responses.append(Client(wsgi_app).get(path, headers=request_headers))
+    return responses
+
+@pytest.mark.parametrize("path, headers", [
+    ("/secrets/database/password", {}),
+    ("/secrets/database/password", {"Authorization": "Token {db}"}),
+    ("/secrets/database/password", {"Authorization": "Bearer invalid_token"}),
+    ("/secrets/database/password", {"Authorization": "Bearer {db}"}),
+    ("/secrets/database/password", {"Authorization": "Bearer {search}"}),
+    ("/secrets/bundle", {"Authorization": "Bearer {db}"}),
+    ("/secrets/bundle", {"Authorization": "Bearer {search}"}),
+])
+def test_fast_path_matches_blueprint(app, path, headers):
+    """高速パスの応答（ステータス・本文・Content-Type）がブループリントと一致することを確認."""
+    fast, blueprint = call_both(app, path, headers)
+    assert fast.status == blueprint.status
+    assert fast.get_data() == blueprint.get_data()
+    assert fast.headers["Content-Type"] == blueprint.headers["Content-Type"]
+    assert fast.headers["Content-Length"] == blueprint.headers["Content-Length"]
+
+def test_fast_path_consumes_token_once_and_records_metrics(client, app):
+    """高速パスでもトークンが一度だけ消費され、メトリクスが記録されることを確認."""
+    metrics.reset()
+    with app.app_context():
+        TokenService.generate_tokens()
+    headers = {"Authorization": f"Bearer {DATABASE_TOKEN_FILE.read_text().strip()}"}
+
+    assert client.get("/secrets/database/password", headers=headers).status_code == 200
+    assert client.get("/secrets/database/password", headers=headers).status_code == 403
+    assert metrics.requests["/secrets/database/password"].count == 2
+    assert metrics.auth_failures == {403: 1}
+
+def test_fast_path_rebuilds_body_after_config_change(client, app):
+    """設定が置き換わった場合、事前にシリアライズした本文が作り直されることを確認."""
+    with app.app_context():
+        TokenService.generate_tokens({"database": ["database.password"]})
+    token = DATABASE_TOKEN_FILE.read_text().strip()
+    Config._config = {"database": {"password": "rotated_password"}}
+
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/secrets/database/password", headers=headers)
+    assert response.get_json() == {"password": "rotated_password"}
+
+def test_other_methods_fall_through_to_flask(client):
+    """GET 以外のリクエストは Flask で処理されることを確認."""
+    assert client.post("/secrets/database/password").status_code == 405
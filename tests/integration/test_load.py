@@ -0,0 +1,21 @@
+"""
+トークンエンドポイントの並行負荷テスト（benchmarks.load）の統合テスト
+"""
+
+import pytest
+
+from benchmarks.load import issue_tokens, run_load, start_server
+
+@pytest.mark.parametrize("workers, async_server", [(1, False), (2, False), (1, True)])
+def test_concurrent_load_keeps_invariants(app, workers, async_server):
+    """有効・無効・重複したトークンの一斉アクセスで、不変条件が保たれることを確認."""
+    tokens = issue_tokens(app, 10)
+    port, stop = start_server(app, workers, async_server)
+    try:
+        report = run_load(port, tokens, duplicates=4, invalid=20, concurrency=16)
+    finally:
+        stop()
+
+    assert report.violations == []
+    assert len(report.outcomes) == 10 * 4 + 20
+    assert [outcome.status for outcome in report.outcomes].count(200) == 10
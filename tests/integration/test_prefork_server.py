@@ -0,0 +1,241 @@
+"""
+マルチワーカーサーバーの統合テスト
+"""
+
+import http.client
+import json
+import os
+import socket
+import stat
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+import app as app_module
+from routes.fast_path import SecretsFastPath
+from server import PreforkServer, create_servers, make_unix_server
+from services.token_service import TokenService, DATABASE_TOKEN_FILE, BACKEND_TOKEN_FILE
+
+@pytest.fixture
+def prefork_server(app):
+    """ワーカープロセスを3つ持つサーバーを起動する."""
+    with app.app_context():
+        TokenService.generate_tokens()
+    server = PreforkServer(app, create_servers(app, "127.0.0.1", 0), workers=3)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.stop()
+    thread.join(timeout=5)
+
+def fetch_password(server, token):
+    """パスワード取得APIを呼び出し、ステータスコードを返す."""
+    conn = http.client.HTTPConnection("127.0.0.1", server.servers[0].port, timeout=5)
+    try:
+        conn.request(
+            "GET", "/secrets/database/password", headers={"Authorization": f"Bearer {token}"}
+        )
+        return conn.getresponse().status
+    finally:
+        conn.close()
+
+def fetch_password_body(port, token):
+    """パスワード取得APIを呼び出し、ステータスコードと本文を返す（接続が切れた場合は例外）."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request(
+            "GET", "/secrets/database/password", headers={"Authorization": f"Bearer {token}"}
+        )
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+def slow_respond(on_responded):
+    """トークンの消費後、応答を返す前に待機する高速パス（最後の消費で終了処理が始まる状況の再現）."""
+    real_respond = SecretsFastPath.respond
+
+    def respond(self, *args):
+        result = real_respond(self, *args)
+        time.sleep(0.3)
+        on_responded()
+        return result
+
+    return patch.object(SecretsFastPath, "respond", respond)
+
+def test_shutdown_waits_for_last_consumer_response(app):
+    """自動終了が、最後のトークンを消費したリクエストの応答を書き終えるまで待つことを確認."""
+    with app.app_context():
+        TokenService.generate_tokens()
+    server = create_servers(app, "127.0.0.1", 0)[0]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    exited = threading.Event()
+    exited_before_response = []
+    try:
+        with slow_respond(lambda: exited_before_response.append(exited.is_set())), \
+             patch("app.app", app), patch("os._exit", side_effect=lambda code: exited.set()):
+            monitor = threading.Thread(target=app_module.monitor_shutdown)
+            monitor.start()
+            for token_file in (DATABASE_TOKEN_FILE, BACKEND_TOKEN_FILE):
+                status, body = fetch_password_body(server.port, token_file.read_text().strip())
+                assert status == 200 and "password" in body
+            monitor.join(timeout=10)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
+
+    assert exited.is_set()
+    assert exited_before_response == [False, False]
+
+def test_prefork_stop_lets_workers_finish_responses(app):
+    """停止時（SIGTERM）のワーカーが、処理中のリクエストの応答を書き終えてから終了することを確認."""
+    with app.app_context():
+        TokenService.generate_tokens()
+    server = PreforkServer(app, create_servers(app, "127.0.0.1", 0), workers=2)
+
+    def stop_when_consumed():
+        TokenService.wait_for_all_consumed(timeout=10)
+        server.stop()
+
+    with slow_respond(lambda: None):
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        stopper = threading.Thread(target=stop_when_consumed)
+        stopper.start()
+        try:
+            for token_file in (DATABASE_TOKEN_FILE, BACKEND_TOKEN_FILE):
+                status, body = fetch_password_body(
+                    server.servers[0].port, token_file.read_text().strip()
+                )
+                assert status == 200 and "password" in body
+        finally:
+            stopper.join(timeout=10)
+            thread.join(timeout=5)
+    assert not thread.is_alive()
+
+def test_prefork_workers_consume_token_exactly_once(prefork_server):
+    """複数のワーカーに同じトークンが同時に届いても、成功するのは一度だけであることを確認."""
+    token = DATABASE_TOKEN_FILE.read_text().strip()
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        statuses = list(executor.map(lambda _: fetch_password(prefork_server, token), range(32)))
+
+    assert statuses.count(200) == 1
+    assert statuses.count(403) == 31
+
+def test_prefork_consumption_reaches_parent(prefork_server):
+    """ワーカーでの消費が親プロセスに通知され、全消費を検知できることを確認."""
+    db_token = DATABASE_TOKEN_FILE.read_text().strip()
+    backend_token = BACKEND_TOKEN_FILE.read_text().strip()
+
+    assert fetch_password(prefork_server, db_token) == 200
+    assert TokenService.wait_for_all_consumed(timeout=0.2) is False
+    assert fetch_password(prefork_server, backend_token) == 200
+    assert TokenService.wait_for_all_consumed(timeout=5) is True
+
+def read_appended(path, offsets):
+    """offsets に記録した位置以降に追記された内容を返す."""
+    with open(path) as f:
+        f.seek(offsets.get(path, 0))
+        return f.read()
+
+def test_prefork_workers_log_to_their_own_files(app, prefork_server):
+    """ワーカーのログは番号ごとのファイルに書き込まれ、親プロセスのログファイルとローテーションを共有しないことを確認."""
+    log_dir = app.extensions["log_dir"]
+    # 同じディレクトリに書き込む他のテストのログは対象外にする
+    offsets = {path: path.stat().st_size for path in log_dir.glob("secrets*.log")}
+    assert fetch_password(prefork_server, DATABASE_TOKEN_FILE.read_text().strip()) == 200
+
+    message = "Consumed and deleted token file: database_token.txt"
+    deadline = time.monotonic() + 5
+    consumed = []
+    while not consumed and time.monotonic() < deadline:
+        consumed = [
+            path.name for path in log_dir.glob("secrets.worker*.log")
+            if message in read_appended(path, offsets)
+        ]
+        time.sleep(0.05)
+
+    assert len(consumed) == 1
+    assert consumed[0] in {f"secrets.worker{index}.log" for index in (1, 2, 3)}
+    assert message not in read_appended(log_dir / "secrets.log", offsets)
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """Unix ドメインソケットに接続する HTTPConnection."""
+
+    def __init__(self, path):
+        super().__init__("localhost", timeout=5)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+@pytest.fixture
+def unix_socket_path():
+    """ソケットファイルのパス（AF_UNIX のパス長制限のため短いディレクトリに作成する）."""
+    directory = tempfile.mkdtemp(prefix="sock-", dir="/tmp")
+    yield os.path.join(directory, "secrets-api.sock")
+    for name in os.listdir(directory):
+        os.unlink(os.path.join(directory, name))
+    os.rmdir(directory)
+
+def test_unix_socket_serves_secrets(app, unix_socket_path):
+    """Unix ドメインソケット経由で機密情報を取得でき、ソケットの権限が設定されることを確認."""
+    with app.app_context():
+        TokenService.generate_tokens()
+    server = make_unix_server(app, unix_socket_path, mode=0o600)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert stat.S_IMODE(os.stat(unix_socket_path).st_mode) == 0o600
+        token = DATABASE_TOKEN_FILE.read_text().strip()
+
+        statuses = []
+        auth = {"Authorization": f"Bearer {token}"}
+        for headers in ({}, auth, auth):
+            conn = UnixHTTPConnection(unix_socket_path)
+            try:
+                conn.request("GET", "/secrets/database/password", headers=headers)
+                response = conn.getresponse()
+                statuses.append(response.status)
+                response.read()
+            finally:
+                conn.close()
+
+        assert statuses == [401, 200, 403]
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
+
+def test_prefork_serves_tcp_and_unix_socket(app, unix_socket_path):
+    """TCP と Unix ドメインソケットの両方でワーカーがリクエストを処理することを確認."""
+    with app.app_context():
+        TokenService.generate_tokens()
+    servers = create_servers(app, "127.0.0.1", 0, unix_socket=unix_socket_path)
+    server = PreforkServer(app, servers, workers=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert fetch_password(server, DATABASE_TOKEN_FILE.read_text().strip()) == 200
+
+        conn = UnixHTTPConnection(unix_socket_path)
+        try:
+            token = BACKEND_TOKEN_FILE.read_text().strip()
+            conn.request("GET", "/secrets/bundle", headers={"Authorization": f"Bearer {token}"})
+            assert conn.getresponse().status == 200
+        finally:
+            conn.close()
+        assert TokenService.wait_for_all_consumed(timeout=5) is True
+    finally:
+        server.stop()
+        thread.join(timeout=5)
+    assert not os.path.exists(unix_socket_path)
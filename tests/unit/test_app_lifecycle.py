@@ -1,54 +1,180 @@
+import asyncio
 import pytest
 import os
-import time
+import threading
 from unittest.mock import patch, MagicMock
 from flask import Flask
 
 # テスト対象モジュールのインポート
 import app as app_module
-from services.token_service import TokenService
+from services.token_service import (
+    TokenService, DATABASE_TOKEN_FILE, BACKEND_TOKEN_FILE, READY_MARKER,
+)
 
 @pytest.fixture
 def mock_app():
     """アプリケーションのモック."""
     mock = MagicMock(spec=Flask)
     mock.logger = MagicMock()
+    mock.extensions = {}
     return mock
 
 @pytest.mark.unit
 class TestAppLifecycle:
     @patch('os._exit')
-    @patch('time.sleep', return_value=None) # sleepをスキップ
-    @patch('services.token_service.TokenService.check_all_tokens_consumed')
-    def test_monitor_shutdown_all_tokens_consumed(self, mock_check_tokens, mock_sleep, mock_exit, mock_app):
+    @patch('services.token_service.TokenService.expired_services', return_value=[])
+    @patch('services.token_service.TokenService.wait_for_all_consumed', return_value=True)
+    def test_monitor_shutdown_all_tokens_consumed(
+        self, mock_wait, mock_expired, mock_exit, mock_app
+    ):
         """全てのトークンが消費された場合にシャットダウンすることを確認."""
-        mock_check_tokens.side_effect = [False, True]
-        
         with patch('app.app', mock_app):
-            # monitor_shutdownが無限ループなので、os._exitが呼ばれたら例外を投げるようにする
-            mock_exit.side_effect = SystemExit
-            
-            with pytest.raises(SystemExit):
-                app_module.monitor_shutdown()
-        
+            app_module.monitor_shutdown()
+
         mock_exit.assert_called_once_with(0)
         mock_app.logger.info.assert_any_call("All tokens consumed. Shutting down secrets-api.")
 
     @patch('os._exit')
-    @patch('time.sleep', return_value=None)
-    @patch('services.token_service.TokenService.check_all_tokens_consumed', return_value=False)
-    def test_monitor_shutdown_timeout(self, mock_check_tokens, mock_sleep, mock_exit, mock_app):
-        """タイムアウトした場合にシャットダウンすることを確認."""
-        mock_exit.side_effect = SystemExit
-        
-        # time.time() の挙動をモック
-        with patch('time.time') as mock_time:
-            # 初期時間、1回目のループ、2回目のループ（タイムアウト）
-            mock_time.side_effect = [1000, 1000, 1301]
-            
-            with patch('app.app', mock_app):
-                with pytest.raises(SystemExit):
-                    app_module.monitor_shutdown()
-        
+    @patch('services.token_service.TokenService.expired_services', return_value=["backend"])
+    @patch('services.token_service.TokenService.wait_for_all_consumed', return_value=True)
+    def test_monitor_shutdown_timeout(self, mock_wait, mock_expired, mock_exit, mock_app):
+        """トークンが有効期限切れで失効した場合にシャットダウンすることを確認."""
+        with patch('app.app', mock_app):
+            app_module.monitor_shutdown()
+
+        mock_exit.assert_called_once_with(0)
+        mock_app.logger.info.assert_any_call(
+            "Token lifetime expired for: backend. Shutting down secrets-api."
+        )
+
+    @patch('os._exit')
+    def test_monitor_shutdown_wakes_on_last_consumption(self, mock_exit, app):
+        """最後のトークンが消費された直後に自動終了することを確認."""
+        with app.app_context():
+            TokenService.generate_tokens()
+            db_token = DATABASE_TOKEN_FILE.read_text().strip()
+            backend_token = BACKEND_TOKEN_FILE.read_text().strip()
+
+            monitor = threading.Thread(target=app_module.monitor_shutdown)
+            monitor.start()
+
+            TokenService.verify_and_consume_token(db_token)
+            monitor.join(timeout=0.1)
+            assert monitor.is_alive()
+
+            TokenService.verify_and_consume_token(backend_token)
+            monitor.join(timeout=1)
+            assert not monitor.is_alive()
+
         mock_exit.assert_called_once_with(0)
-        mock_app.logger.info.assert_any_call("Token lifetime expired. Shutting down secrets-api.")
+
+    @patch('os._exit')
+    def test_monitor_shutdown_wakes_on_last_expiry(self, mock_exit, app):
+        """最後のトークンが有効期限切れになった直後に自動終了することを確認."""
+        with app.app_context():
+            TokenService.generate_tokens(ttls={"database": 0.05, "backend": 0.1})
+
+            monitor = threading.Thread(target=app_module.monitor_shutdown)
+            monitor.start()
+            monitor.join(timeout=2)
+            assert not monitor.is_alive()
+
+        assert TokenService.expired_services() == ["database", "backend"]
+        mock_exit.assert_called_once_with(0)
+
+    def test_serve_async_stops_after_last_expiry(self, app):
+        """非同期サーバーが、最後のトークンの失効後に待ち受けを停止して戻ることを確認."""
+        with app.app_context():
+            TokenService.generate_tokens(ttls={"database": 0.05, "backend": 0.1})
+
+        with patch('app.app', app), patch('app.DEV_MODE', False), \
+             patch('app.LISTEN_TCP', False), patch('app.UNIX_SOCKET', None), \
+             patch('asgi.AsyncHTTPServer.start') as mock_start:
+            asyncio.run(asyncio.wait_for(app_module.serve_async(), 2))
+
+        mock_start.assert_called_once()
+        assert TokenService.expired_services() == ["database", "backend"]
+
+    @patch('os._exit')
+    def test_shutdown_drains_log_writer_before_exit(self, mock_exit, mock_app):
+        """終了前にログの書き込みスレッドを停止（未書き込みのログを書き出し）することを確認."""
+        calls = []
+        log_writer = MagicMock()
+        log_writer.stop.side_effect = lambda: calls.append("stop")
+        mock_exit.side_effect = lambda code: calls.append("exit")
+        mock_app.extensions = {"log_writer": log_writer}
+
+        with patch('app.app', mock_app):
+            app_module.shutdown(0)
+
+        assert calls == ["stop", "exit"]
+
+    @patch('os._exit')
+    def test_shutdown_and_startup_remove_ready_marker(self, mock_exit, app, mock_app):
+        """終了時に未消費のトークンと完了マーカーが削除され、起動時に古いマーカーが片付けられることを確認."""
+        with app.app_context():
+            TokenService.generate_tokens()
+        with patch('app.app', mock_app):
+            app_module.shutdown(0)
+        assert not READY_MARKER.exists()
+        assert not DATABASE_TOKEN_FILE.exists()
+
+        # 異常終了したプロセスが残したマーカーとトークンファイル
+        READY_MARKER.write_text("batch=deadbeef\ndatabase\n")
+        DATABASE_TOKEN_FILE.write_text("stale")
+        with patch('app._build_app', side_effect=RuntimeError("stop")):
+            with pytest.raises(RuntimeError):
+                app_module.create_app()
+        assert not READY_MARKER.exists()
+        assert not DATABASE_TOKEN_FILE.exists()
+
+@pytest.mark.unit
+class TestProfilingHooks:
+    def test_profile_startup_and_first_requests(self, tmp_path):
+        """PROFILE=true で起動処理と最初の N 件のリクエストのプロファイルが書き出されることを確認."""
+        with patch("app.PROFILE_ENABLED", True), patch("app.PROFILE_REQUESTS", 2), \
+             patch.dict(os.environ, {"LOG_DIR": str(tmp_path)}):
+            profiled_app = app_module.create_app()
+
+        assert (tmp_path / "startup.prof").exists()
+        assert (tmp_path / "startup.tracemalloc").exists()
+        assert "_build_app" in (tmp_path / "startup.txt").read_text()
+
+        token = DATABASE_TOKEN_FILE.read_text().strip()
+        client = profiled_app.test_client()
+        client.get("/health")
+        client.get("/secrets/database/password", headers={"Authorization": f"Bearer {token}"})
+        client.get("/health")
+
+        report_file = tmp_path / f"requests-{os.getpid()}.txt"
+        assert report_file.exists()
+        assert (tmp_path / f"requests-{os.getpid()}.prof").exists()
+        assert token not in report_file.read_text()
+
+@pytest.mark.unit
+class TestConfigReloadHooks:
+    def test_reload_on_file_change(self, tmp_path):
+        """RELOAD_CONFIG=true で設定ファイルの変更が監視され、変更後の値に置き換えられることを確認."""
+        from config import Config
+        from config.secrets import SecretManager
+
+        config_file = tmp_path / "config.yaml"
+        secrets_file = tmp_path / "secrets.yaml.encrypted"
+        manager = SecretManager("reload_key")
+        config_file.write_text("secret_key: reload_key\n")
+        secrets_file.write_text(f'database:\n  password: "encrypted:{manager.encrypt("v1")}"\n')
+
+        with patch("app.RELOAD_ENABLED", True), \
+             patch("app.CONFIG_FILE", config_file), patch("app.SECRETS_FILE", secrets_file), \
+             patch("config.CONFIG_FILE", config_file), patch("config.SECRETS_FILE", secrets_file), \
+             patch.object(Config, "_decryption_cache", None):
+            reloading_app = app_module.create_app()
+            watcher = reloading_app.extensions["config_watcher"]
+            watcher.stop()
+            assert Config.DB_PASSWORD == "v1"
+
+            secrets_file.write_text(
+                f'database:\n  password: "encrypted:{manager.encrypt("v2")}"\n'
+            )
+            assert watcher.check() is True
+            assert Config.DB_PASSWORD == "v2"
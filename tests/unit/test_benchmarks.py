@@ -0,0 +1,69 @@
+import pytest
+
+from benchmarks.load import LoadReport, Outcome, check_invariants
+from benchmarks.run import CALIBRATION_KEY, compare, load_baseline, save_baseline
+
+@pytest.mark.unit
+class TestBenchmarkComparison:
+    def test_regression_beyond_threshold(self):
+        """しきい値を超えて遅くなったケースのみ劣化として報告されることを確認."""
+        baseline = {"kdf": 0.020, "encrypt": 0.010, "tiny": 0.0001}
+        results = {"kdf": 0.030, "encrypt": 0.011, "tiny": 0.0003, "new_case": 1.0}
+
+        regressions = compare(baseline, results, threshold=0.25)
+
+        assert [regression.name for regression in regressions] == ["kdf"]
+        assert regressions[0].ratio == pytest.approx(1.5)
+
+    def test_calibration_scales_baseline(self):
+        """マシン全体が遅い場合は校正用の計測値で補正され、劣化と判定されないことを確認."""
+        baseline = {CALIBRATION_KEY: 0.1, "kdf": 0.020}
+        results = {CALIBRATION_KEY: 0.15, "kdf": 0.030}
+        assert compare(baseline, results, threshold=0.25) == []
+
+        results = {CALIBRATION_KEY: 0.1, "kdf": 0.030}
+        assert [regression.name for regression in compare(baseline, results, 0.25)] == ["kdf"]
+
+    def test_save_baseline_merges_results(self, tmp_path):
+        """ベースラインの保存時に既存のケースが保持されることを確認."""
+        path = tmp_path / "baseline.json"
+        save_baseline({"a": 1.0, "b": 2.0}, path)
+        save_baseline({"b": 3.0}, path)
+        assert load_baseline(path) == {"a": 1.0, "b": 3.0}
+
+@pytest.mark.unit
+class TestLoadInvariants:
+    def test_valid_token_must_succeed_exactly_once(self):
+        """有効なトークンの成功が一度でない場合に違反として報告されることを確認."""
+        tokens = {"a": "token-a", "b": "token-b"}
+        outcomes = [
+            Outcome("valid", "token-a", 200, 0.01),
+            Outcome("valid", "token-a", 403, 0.01),
+            Outcome("valid", "token-b", 200, 0.01),
+            Outcome("valid", "token-b", 200, 0.01),
+            Outcome("invalid", "bogus", 401, 0.01),
+            Outcome("missing", None, 401, 0.01),
+        ]
+
+        assert check_invariants(outcomes, tokens) == ["token for b succeeded 2 times"]
+
+    def test_errors_are_violations(self):
+        """500・接続エラー・無効なトークンの成功が違反として報告されることを確認."""
+        outcomes = [
+            Outcome("invalid", "bogus", 200, 0.01),
+            Outcome("missing", None, 500, 0.01),
+            Outcome("valid", "token-a", 0, 0.01),
+        ]
+
+        assert check_invariants(outcomes, {}) == [
+            "invalid token got 200", "500 response (missing)", "connection error (valid)",
+        ]
+
+    def test_percentile(self):
+        """レイテンシのパーセンタイルが nearest-rank で計算されることを確認."""
+        outcomes = [Outcome("valid", None, 200, i / 100) for i in range(1, 101)]
+        report = LoadReport(outcomes, 2.0, [])
+
+        assert report.percentile(50) == 0.5
+        assert report.percentile(99) == 0.99
+        assert report.throughput == 50.0
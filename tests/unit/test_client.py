@@ -0,0 +1,214 @@
+import fcntl
+import json
+import os
+import pytest
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+import client
+from client import SecretsClient, SecretsClientError, wait_for_token_file
+
+TEST_TOKEN_DIR = Path("/tmp/test_client_tokens")
+
+@pytest.fixture
+def token_dir():
+    """空のトークンディレクトリを用意する."""
+    TEST_TOKEN_DIR.mkdir(parents=True, exist_ok=True)
+    for path in TEST_TOKEN_DIR.iterdir():
+        path.unlink()
+    yield TEST_TOKEN_DIR
+    for path in TEST_TOKEN_DIR.iterdir():
+        path.unlink()
+    TEST_TOKEN_DIR.rmdir()
+
+def publish(path, content):
+    """secrets-api と同じく、一時ファイルに書き込んでから rename で公開する."""
+    temp_path = path.parent / f".{path.name}.tmp"
+    temp_path.write_text(content)
+    os.replace(temp_path, path)
+
+def publish_marker(token_dir, services, batch="b1"):
+    """secrets-api と同じく、排他ロックを保持した完了マーカーを公開する（戻り値を閉じるとロックを解放する）."""
+    temp_path = token_dir / f".{client.READY_MARKER_NAME}.tmp"
+    temp_path.write_text(f"batch={batch}\n" + "".join(f"{service}\n" for service in services))
+    fd = os.open(temp_path, os.O_RDONLY)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    os.replace(temp_path, token_dir / client.READY_MARKER_NAME)
+    return fd
+
+def publish_later(path, content, delay=0.05):
+    """少し遅れてファイルを公開する."""
+    threading.Timer(delay, publish, args=(path, content)).start()
+
+@pytest.mark.unit
+class TestWaitForTokenFile:
+    def test_existing_file_returned_immediately(self, token_dir):
+        """既に存在するトークンファイルがすぐに読み込まれることを確認."""
+        (token_dir / "backend_token.txt").write_text("abc\n")
+        assert wait_for_token_file(token_dir / "backend_token.txt", timeout=1) == "abc"
+
+    def test_wakes_on_file_publication(self, token_dir):
+        """変更通知によりファイルの公開（rename）直後に待機が終わることを確認."""
+        token_file = token_dir / "backend_token.txt"
+        publish_later(token_file, "abc")
+
+        started_at = time.monotonic()
+        with patch("client.POLL_MAX_INTERVAL", 5.0):
+            assert wait_for_token_file(token_file, timeout=5) == "abc"
+        assert time.monotonic() - started_at < 1
+
+    def test_polling_fallback(self, token_dir):
+        """変更通知が使えない場合、ポーリングで検知することを確認."""
+        token_file = token_dir / "backend_token.txt"
+        publish_later(token_file, "abc")
+
+        with patch.object(client._DirectoryWatch, "open", return_value=None) as mock_open:
+            assert wait_for_token_file(token_file, timeout=5) == "abc"
+        assert mock_open.called
+
+    def test_timeout(self, token_dir):
+        """ファイルが作成されない場合はタイムアウトすることを確認."""
+        with pytest.raises(TimeoutError):
+            wait_for_token_file(token_dir / "backend_token.txt", timeout=0.05)
+
+    def test_fails_fast_when_batch_published_without_token(self, token_dir):
+        """完了マーカーがあるのにトークンファイルがない場合、待機せずに失敗することを確認."""
+        publish(token_dir / "database_token.txt", "abc")
+        marker_fd = publish_marker(token_dir, ["database", "backend"], batch="b1")
+
+        started_at = time.monotonic()
+        try:
+            with pytest.raises(SecretsClientError, match="batch b1"):
+                wait_for_token_file(token_dir / "backend_token.txt", timeout=5)
+            assert time.monotonic() - started_at < 1
+            assert wait_for_token_file(token_dir / "database_token.txt", timeout=1) == "abc"
+        finally:
+            os.close(marker_fd)
+
+    def test_ignores_stale_marker_and_leftover_token(self, token_dir):
+        """異常終了したプロセスのマーカー（ロックなし）と残ったトークンは無視し、新しい公開を待つことを確認."""
+        publish(token_dir / "database_token.txt", "old")
+        os.close(publish_marker(token_dir, ["database", "backend"]))
+
+        with pytest.raises(TimeoutError):
+            wait_for_token_file(token_dir / "backend_token.txt", timeout=0.05)
+        with pytest.raises(TimeoutError):
+            wait_for_token_file(token_dir / "database_token.txt", timeout=0.05)
+
+        def restart():
+            # 再起動した secrets-api は古いマーカーを削除してから新しいバッチを公開する
+            (token_dir / client.READY_MARKER_NAME).unlink()
+            publish(token_dir / "database_token.txt", "new")
+            marker_fds.append(publish_marker(token_dir, ["database"], batch="b2"))
+
+        marker_fds = []
+        timer = threading.Timer(0.05, restart)
+        timer.start()
+        try:
+            assert wait_for_token_file(token_dir / "database_token.txt", timeout=5) == "new"
+        finally:
+            timer.join()
+            for fd in marker_fds:
+                os.close(fd)
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """接続を維持して固定の応答を返すハンドラ（接続数を記録する）."""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_GET(self):
+        body = json.dumps({"ready": True, "secrets": {"k": "v"}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    """Unix ドメインソケットで待ち受ける HTTP サーバー."""
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        socketserver.TCPServer.server_bind(self)  # HTTPServer はホスト名とポートを前提とするため使わない
+
+@pytest.fixture
+def keep_alive_server():
+    """接続を維持するサーバーを起動する."""
+    KeepAliveHandler.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.unit
+class TestSecretsClient:
+    def test_reuses_persistent_connection(self, keep_alive_server, token_dir):
+        """サーバーが接続を維持する場合、全てのリクエストで一つの接続を使うことを確認."""
+        port = keep_alive_server.server_address[1]
+        with SecretsClient(
+            "backend", base_url=f"http://127.0.0.1:{port}", token_dir=token_dir
+        ) as secrets_client:
+            secrets_client.wait_until_ready(wait=1)
+            assert secrets_client.fetch_bundle(token="a") == {"k": "v"}
+            assert secrets_client.fetch_bundle(token="b") == {"k": "v"}
+        assert KeepAliveHandler.connections == 1
+
+    def test_connection_refused_retried_then_reported(self, token_dir):
+        """接続できない場合、再試行した上でエラーになることを確認."""
+        secrets_client = SecretsClient(
+            "backend", base_url="http://127.0.0.1:1", token_dir=token_dir, retries=2
+        )
+        with patch("client.time.sleep") as mock_sleep, pytest.raises(SecretsClientError):
+            secrets_client.fetch_bundle(token="abc")
+        assert mock_sleep.call_count == 2
+
+    def test_missing_unix_socket_retried_until_server_binds(self, token_dir, tmp_path):
+        """Unix ドメインソケットのファイルがまだない場合も再試行し、待ち受けの開始後に取得できることを確認."""
+        socket_path = str(tmp_path / "api.sock")
+        servers = []
+
+        def bind_on_second_retry(delay):
+            if mock_sleep.call_count == 2:
+                server = UnixHTTPServer(socket_path, KeepAliveHandler)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                servers.append(server)
+
+        secrets_client = SecretsClient(
+            "backend", base_url=f"unix://{socket_path}", token_dir=token_dir, retries=3
+        )
+        with patch("client.time.sleep", side_effect=bind_on_second_retry) as mock_sleep:
+            try:
+                assert secrets_client.fetch_bundle(token="abc") == {"k": "v"}
+            finally:
+                secrets_client.close()
+                for server in servers:
+                    server.shutdown()
+                    server.server_close()
+        assert mock_sleep.call_count == 2
+
+        missing = SecretsClient(
+            "backend", base_url=f"unix://{tmp_path / 'none.sock'}", token_dir=token_dir, retries=2
+        )
+        with patch("client.time.sleep") as mock_sleep, pytest.raises(SecretsClientError):
+            missing.fetch_bundle(token="abc")
+        assert mock_sleep.call_count == 2
+
+    def test_unsupported_scheme(self):
+        """未対応の接続先が拒否されることを確認."""
+        with pytest.raises(ValueError):
+            SecretsClient("backend", base_url="ftp://localhost")
@@ -1,9 +1,12 @@
 import pytest
+import yaml
 import os
 import shutil
 from pathlib import Path
 from unittest.mock import patch
 
+from cryptography.fernet import Fernet
+
 # テスト対象モジュールのインポート
 import config
 from config import Config, _load_config
@@ -73,3 +76,283 @@ class TestConfig:
             TEST_SECRETS_FILE.unlink()
         Config.load_app_config()
         assert Config.DB_PASSWORD is None
+
+    def test_create_app_loads_config_once(self):
+        """create_app() で設定の読み込みと復号が一度だけ行われることを確認."""
+        create_dummy_config_files()
+        from app import create_app
+        with patch("config._read_config_file", wraps=config._read_config_file) as mock_read, \
+             patch("config._get_secrets_from_encrypted_file",
+                   wraps=config._get_secrets_from_encrypted_file) as mock_secrets:
+            app = create_app()
+        assert mock_read.call_count == 1
+        assert mock_secrets.call_count == 1
+        assert Config.DB_PASSWORD == "test_db_password"
+        assert {"config", "secrets", "flask", "logging", "tokens", "total"} <= set(
+            app.extensions["startup_timings"]
+        )
+
+    def test_services_default(self):
+        """services の定義がない場合に既定のサービスが使われることを確認."""
+        create_dummy_config_files()
+        Config.load_app_config()
+        assert Config.SERVICES == {
+            "database": ["database.password"],
+            "backend": ["database.password"],
+        }
+
+    def test_services_and_bundle_from_config(self):
+        """config.yaml の services 定義からサービスごとの機密情報がまとめて取得できることを確認."""
+        create_dummy_config_files()
+        with open(TEST_CONFIG_FILE, "a", encoding="utf-8") as f:
+            f.write(
+                "cache:\n"
+                "  url: redis://cache:6379\n"
+                "services:\n"
+                "  worker:\n"
+                "    secrets:\n"
+                "      - database.password\n"
+                "      - cache.url\n"
+                "  search: {}\n"
+                "  ../evil:\n"
+                "    secrets: [database.password]\n"
+            )
+        Config.load_app_config()
+
+        assert Config.SERVICES == {
+            "worker": ["database.password", "cache.url"],
+            "search": [],
+        }
+        assert Config.get_secret("database.password") == "test_db_password"
+        assert Config.get_secret("database.missing") is None
+        assert Config.get_bundle(Config.SERVICES["worker"]) == {
+            "database": {"password": "test_db_password"},
+            "cache": {"url": "redis://cache:6379"},
+        }
+        assert Config.get_bundle(Config.SERVICES["search"]) == {}
+
+    def test_token_ttls_from_config(self):
+        """token_ttl とサービスごとの ttl が反映され、不正な値は既定値になることを確認."""
+        TEST_CONFIG_FILE.write_text(
+            "token_ttl: 120\n"
+            "services:\n"
+            "  database:\n"
+            "    ttl: 30\n"
+            "  backend: {}\n"
+            "  worker:\n"
+            "    ttl: -1\n"
+        )
+        Config.load_app_config()
+        assert Config.TOKEN_TTLS == {"database": 30, "backend": 120, "worker": 120}
+
+    def test_load_config_from_bundle(self):
+        """バンドル形式の機密情報ファイルが読み込めることを確認."""
+        create_dummy_config_files()
+        bundle = SecretManager("test_secret_key").encrypt_bundle(
+            {"database": {"password": "bundled_password"}, "cache": {"url": "redis://cache"}}
+        )
+        TEST_SECRETS_FILE.write_bytes(bundle)
+
+        Config.load_app_config()
+        assert Config.DB_PASSWORD == "bundled_password"
+        assert Config.get_secret("cache.url") == "redis://cache"
+
+    def test_load_config_with_kdf_metadata(self):
+        """YAMLの `_meta.kdf` に記録されたKDFで復号されることを確認."""
+        TEST_CONFIG_FILE.write_text("secret_key: test_secret_key\n")
+        kdf = {"name": "scrypt", "n": 2**10, "salt": "c2FsdHNhbHQ="}
+        sm = SecretManager(secret_key="test_secret_key", kdf=kdf)
+        secrets = {
+            "_meta": sm.yaml_metadata(),
+            "database": {"password": f"encrypted:{sm.encrypt('scrypt_password')}"},
+        }
+        TEST_SECRETS_FILE.write_text(yaml.safe_dump(secrets))
+
+        Config.load_app_config()
+        assert Config.DB_PASSWORD == "scrypt_password"
+        assert Config.get_secret("_meta") is None
+
+    def test_load_config_with_non_mapping_kdf(self, capsys):
+        """`_meta.kdf` が辞書でない場合、例外を送出せずに機密情報の読み込み失敗として報告されることを確認."""
+        create_dummy_config_files()
+        content = TEST_SECRETS_FILE.read_text()
+        TEST_SECRETS_FILE.write_text("_meta:\n  kdf: scrypt\n" + content)
+
+        Config.load_app_config()
+
+        assert "KDF parameters must be a mapping" in capsys.readouterr().out
+        assert Config.CONFIG_LOADED is True
+        assert Config.missing_secrets() == ["database.password"]
+
+    def test_load_config_from_bundle_with_raw_key(self):
+        """raw 指定のバンドルでは secret_key を Fernet 鍵として直接使うことを確認."""
+        raw_key = Fernet.generate_key().decode()
+        TEST_CONFIG_FILE.write_text(f"secret_key: {raw_key}\n")
+        bundle = SecretManager(raw_key, kdf={"name": "raw"}).encrypt_bundle(
+            {"database": {"password": "raw_password"}}
+        )
+        TEST_SECRETS_FILE.write_bytes(bundle)
+
+        with patch("config.kdf.PBKDF2HMAC") as mock_kdf:
+            Config.load_app_config()
+        mock_kdf.assert_not_called()
+        assert Config.DB_PASSWORD == "raw_password"
+
+    def test_load_config_reports_failed_paths(self, capsys):
+        """復号できない値がある場合にパスごとに報告されることを確認."""
+        TEST_CONFIG_FILE.write_text("secret_key: test_secret_key\n")
+        wrong = SecretManager(secret_key="wrong_secret_key")
+        TEST_SECRETS_FILE.write_text(
+            "database:\n"
+            f"  password: \"encrypted:{wrong.encrypt('x')}\"\n"
+            "search:\n"
+            "  auth:\n"
+            f"    api_key: \"encrypted:{wrong.encrypt('y')}\"\n"
+        )
+
+        Config.load_app_config()
+
+        output = capsys.readouterr().out
+        assert "Error decrypting secret 'database.password'" in output
+        assert "Error decrypting secret 'search.auth.api_key'" in output
+        assert Config.DB_PASSWORD is None
+        assert Config.CONFIG_LOADED is True
+        assert Config.missing_secrets() == ["database.password"]
+
+    def test_load_config_keeps_values_that_decrypted(self, capsys):
+        """一部の値を復号できない場合、その値のみを除き、復号できた値は読み込まれることを確認."""
+        TEST_CONFIG_FILE.write_text(
+            "secret_key: test_secret_key\n"
+            "services:\n"
+            "  backend:\n"
+            "    secrets: [database.password, search.auth.api_key]\n"
+        )
+        manager = SecretManager(secret_key="test_secret_key")
+        wrong = SecretManager(secret_key="wrong_secret_key")
+        TEST_SECRETS_FILE.write_text(
+            "database:\n"
+            f"  password: \"encrypted:{manager.encrypt('db')}\"\n"
+            "search:\n"
+            "  auth:\n"
+            f"    api_key: \"encrypted:{wrong.encrypt('y')}\"\n"
+            "  hosts:\n"
+            f"    - \"encrypted:{wrong.encrypt('h')}\"\n"
+            f"    - \"encrypted:{manager.encrypt('h2')}\"\n"
+        )
+
+        Config.load_app_config()
+
+        output = capsys.readouterr().out
+        assert "Error decrypting secret 'search.auth.api_key'" in output
+        assert "search.hosts[0]" in output
+        assert Config.DB_PASSWORD == "db"
+        assert Config.get_secret("search.hosts") == [None, "h2"]
+        assert Config.missing_secrets() == ["search.auth.api_key"]
+
+    def test_load_config_with_non_string_secret_key(self, capsys):
+        """secret_key が文字列でない場合、例外を送出せずに機密情報の読み込み失敗として報告されることを確認."""
+        create_dummy_config_files()
+        TEST_CONFIG_FILE.write_text("secret_key: 12345\n")
+
+        Config.load_app_config()
+
+        assert "secret_key must be a string" in capsys.readouterr().out
+        assert Config.CONFIG_LOADED is True
+        assert Config.missing_secrets() == ["database.password"]
+
+    def test_unexpected_error_does_not_escape_secrets_loading(self, capsys):
+        """暗号化ファイルの読み込みで予期しない例外が発生しても、報告して起動を続けることを確認."""
+        create_dummy_config_files()
+
+        with patch("config.decode_secrets", side_effect=RuntimeError("boom")):
+            Config.load_app_config()
+
+        assert "Error loading encrypted secrets: RuntimeError: boom" in capsys.readouterr().out
+        assert Config.CONFIG_LOADED is True
+        assert Config.missing_secrets() == ["database.password"]
+
+    def test_missing_secrets_empty_when_decrypted(self):
+        """全ての機密情報を復号できた場合、取得できない機密情報がないことを確認."""
+        create_dummy_config_files()
+        Config.load_app_config()
+        assert Config.CONFIG_LOADED is True
+        assert Config.missing_secrets() == []
+
+    def test_load_yaml_matches_safe_load(self):
+        """C 実装のローダー（利用できる場合）でも yaml.safe_load と同じ結果になり、任意のオブジェクトは作成しないことを確認."""
+        document = "a:\n  b: [1, 'x', true, null]\n  c: 2024-01-01\nd: encrypted:abc\n"
+        assert config.load_yaml(document) == yaml.safe_load(document)
+        assert config.load_yaml(document.encode()) == yaml.safe_load(document)
+        with pytest.raises(yaml.YAMLError):
+            config.load_yaml("!!python/object/apply:os.getcwd []")
+
+    def test_lazy_decrypt_on_first_use(self):
+        """遅延復号モードでは読み込み時に復号せず、最初の取得時に復号することを確認."""
+        create_dummy_config_files()
+        with open(TEST_CONFIG_FILE, "a", encoding="utf-8") as f:
+            f.write("lazy_decrypt: true\n")
+
+        with patch("config.secrets.SecretManager.decrypt_strict", autospec=True,
+                   side_effect=SecretManager.decrypt_strict) as mock_decrypt:
+            Config.load_app_config()
+            assert mock_decrypt.call_count == 0
+            assert Config.LAZY_DECRYPT is True
+            assert Config.DB_PASSWORD is None
+
+            assert Config.get_secret("database.password") == "test_db_password"
+            assert Config.get_secret("database.password") == "test_db_password"
+            assert mock_decrypt.call_count == 1
+
+            # 保持対象でない平文は破棄され、次回の取得時に再度復号される
+            Config.release_secrets(keep={"other.secret"})
+            assert Config._plaintext == {}
+            assert Config.get_secret("database.password") == "test_db_password"
+            assert mock_decrypt.call_count == 2
+
+@pytest.mark.unit
+class TestConfigReload:
+    @pytest.fixture(autouse=True)
+    def reset_decryption_cache(self):
+        with patch.object(Config, "_decryption_cache", None):
+            yield
+
+    def write_secrets(self, manager, values):
+        """値ごとに暗号化した secrets.yaml.encrypted を書き出し、暗号文を返す."""
+        encrypted = {key: f"encrypted:{manager.encrypt(value)}" for key, value in values.items()}
+        TEST_SECRETS_FILE.write_text(yaml.safe_dump({"database": encrypted}))
+        return encrypted
+
+    def test_reload_decrypts_only_changed_values(self):
+        """再読み込みで鍵を再導出せず、暗号文が変わった値のみを復号することを確認."""
+        TEST_CONFIG_FILE.write_text("secret_key: test_secret_key\n")
+        manager = SecretManager(secret_key="test_secret_key")
+        encrypted = self.write_secrets(manager, {"password": "old_pw", "user": "app"})
+        Config.enable_reload()
+        Config.load_app_config()
+        assert Config.DB_PASSWORD == "old_pw"
+
+        encrypted["password"] = f"encrypted:{manager.encrypt('rotated_pw')}"
+        TEST_SECRETS_FILE.write_text(yaml.safe_dump({"database": encrypted}))
+        with patch("config.secrets.derive_fernet_key") as mock_derive, \
+             patch("config.secrets.SecretManager.decrypt_strict", autospec=True,
+                   side_effect=SecretManager.decrypt_strict) as mock_decrypt:
+            assert Config.reload() is True
+
+        mock_derive.assert_not_called()
+        assert mock_decrypt.call_count == 1
+        assert Config.DB_PASSWORD == "rotated_pw"
+        assert Config.get_secret("database.user") == "app"
+
+    def test_reload_keeps_current_config_on_failure(self, capsys):
+        """復号できない値がある場合は現在の設定を維持することを確認."""
+        create_dummy_config_files()
+        Config.load_app_config()
+
+        self.write_secrets(SecretManager(secret_key="wrong_secret_key"), {"password": "x"})
+        assert Config.reload() is False
+        assert "Error reloading secret 'database.password'" in capsys.readouterr().out
+        assert Config.DB_PASSWORD == "test_db_password"
+
+        TEST_CONFIG_FILE.unlink()
+        assert Config.reload() is False
+        assert Config.DB_PASSWORD == "test_db_password"
@@ -0,0 +1,44 @@
+import os
+import threading
+
+import pytest
+
+from services.config_watcher import ConfigWatcher
+
+@pytest.mark.unit
+class TestConfigWatcher:
+    def test_detects_modification_and_replacement(self, tmp_path):
+        """ファイルの変更・置き換え・作成が検知され、変更がなければ呼び出されないことを確認."""
+        config_file = tmp_path / "config.yaml"
+        secrets_file = tmp_path / "secrets.yaml.encrypted"
+        config_file.write_text("secret_key: a\n")
+        calls = []
+        watcher = ConfigWatcher([config_file, secrets_file], lambda: calls.append(1))
+
+        assert watcher.check() is False
+
+        config_file.write_text("secret_key: ab\n")
+        assert watcher.check() is True
+        assert watcher.check() is False
+
+        # 一時ファイルからの置き換え（inode の変化）
+        replacement = tmp_path / "config.yaml.tmp"
+        replacement.write_text("secret_key: ba\n")
+        os.replace(replacement, config_file)
+        assert watcher.check() is True
+
+        secrets_file.write_text("database: {}\n")
+        assert watcher.check() is True
+        assert len(calls) == 3
+
+    def test_background_thread(self, tmp_path):
+        """監視スレッドが変更を検知してコールバックを呼び出すことを確認."""
+        config_file = tmp_path / "config.yaml"
+        changed = threading.Event()
+        watcher = ConfigWatcher([config_file], changed.set, interval=0.01)
+        watcher.start()
+        try:
+            config_file.write_text("secret_key: a\n")
+            assert changed.wait(timeout=5)
+        finally:
+            watcher.stop()
@@ -0,0 +1,174 @@
+import copy
+import io
+import os
+import stat
+import sys
+
+import pytest
+import yaml
+
+from config import decode_secrets
+from config.encrypt import diff_paths, encrypt_sections, main, stringify_scalars
+from config.secrets import SecretManager
+
+PLAINTEXT = """
+database:
+  password: p@ss
+  port: 5432
+services:
+  search:
+    auth:
+      api_key: search-key
+webhooks:
+  - secret: hook
+  - 日本語
+"""
+
+EXPECTED = {
+    "database": {"password": "p@ss", "port": "5432"},
+    "services": {"search": {"auth": {"api_key": "search-key"}}},
+    "webhooks": [{"secret": "hook"}, "日本語"],
+}
+
+
+@pytest.fixture
+def plaintext_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "cli_key")
+    path = tmp_path / "secrets.yaml"
+    path.write_text(PLAINTEXT, encoding="utf-8")
+    return path
+
+
+@pytest.mark.unit
+class TestEncryptCli:
+    def test_encrypts_every_value_and_round_trips(self, plaintext_file, tmp_path, capsys):
+        """全ての値が暗号化され、起動時と同じ処理で復号できることを確認."""
+        output = tmp_path / "secrets.yaml.encrypted"
+
+        assert main([str(plaintext_file), "-o", str(output), "--workers", "4", "--verify"]) == 0
+
+        raw = output.read_bytes()
+        data = yaml.safe_load(raw)
+        assert "_meta" in data
+        assert all(
+            SecretManager.is_encrypted(value)
+            for value in (data["database"]["password"], data["webhooks"][1])
+        )
+        assert decode_secrets(raw, "cli_key") == EXPECTED
+        assert stat.S_IMODE(os.stat(output).st_mode) == 0o600
+        assert "database.port" in capsys.readouterr().err  # 数値は文字列になる旨の警告
+
+    def test_reads_stdin_and_writes_stdout(self, monkeypatch, capsysbinary):
+        """標準入力から読み込み、標準出力に書き出せることを確認."""
+        monkeypatch.setenv("SECRET_KEY", "cli_key")
+        monkeypatch.setattr(sys, "stdin", io.StringIO("api:\n  key: value\n"))
+
+        assert main(["-", "--kdf", "scrypt"]) == 0
+
+        raw = capsysbinary.readouterr().out
+        assert yaml.safe_load(raw)["_meta"]["kdf"]["name"] == "scrypt"
+        assert decode_secrets(raw, "cli_key") == {"api": {"key": "value"}}
+
+    def test_reads_secret_key_from_config(self, plaintext_file, tmp_path, monkeypatch):
+        """--config で指定した config.yaml の secret_key が使われることを確認."""
+        monkeypatch.delenv("SECRET_KEY")
+        config = tmp_path / "config.yaml"
+        config.write_text("secret_key: from_config\n")
+        output = tmp_path / "out"
+
+        assert main([str(plaintext_file), "-o", str(output), "--config", str(config)]) == 0
+        assert decode_secrets(output.read_bytes(), "from_config") == EXPECTED
+
+    def test_missing_secret_key_fails(self, plaintext_file, monkeypatch, capsys):
+        """secret_key が見つからない場合に失敗することを確認."""
+        monkeypatch.delenv("SECRET_KEY")
+
+        assert main([str(plaintext_file)]) == 1
+        assert "secret_key not found" in capsys.readouterr().err
+
+    def test_bundle_output(self, plaintext_file, tmp_path):
+        """--bundle でバンドル形式が出力されることを確認."""
+        output = tmp_path / "bundle"
+
+        assert main([str(plaintext_file), "-o", str(output), "--bundle", "--verify"]) == 0
+        assert output.read_bytes().startswith(b"ART-GALLERY-SECRETS-BUNDLE/")
+        assert decode_secrets(output.read_bytes(), "cli_key") == EXPECTED
+
+    def test_reencrypting_keeps_existing_ciphertexts(self, plaintext_file, tmp_path):
+        """暗号化済みのファイルを入力にした場合、同じ鍵であれば暗号文がそのまま残ることを確認."""
+        first = tmp_path / "first"
+        second = tmp_path / "second"
+        assert main([str(plaintext_file), "-o", str(first)]) == 0
+
+        assert main([str(first), "-o", str(second), "--verify"]) == 0
+        assert first.read_bytes() == second.read_bytes()
+
+    def test_changing_kdf_reencrypts_existing_ciphertexts(self, plaintext_file, tmp_path):
+        """KDF を変更した場合、暗号化済みの値も新しい鍵で暗号化し直されることを確認."""
+        first = tmp_path / "first"
+        second = tmp_path / "second"
+        assert main([str(plaintext_file), "-o", str(first)]) == 0
+
+        assert main([str(first), "-o", str(second), "--kdf", "scrypt", "--verify"]) == 0
+        assert decode_secrets(second.read_bytes(), "cli_key") == EXPECTED
+
+    def test_wrong_key_for_existing_ciphertexts_fails(self, plaintext_file, tmp_path, monkeypatch,
+                                                      capsys):
+        """暗号化済みの値を復号できない場合、出力せずに失敗することを確認."""
+        encrypted = tmp_path / "encrypted"
+        output = tmp_path / "output"
+        assert main([str(plaintext_file), "-o", str(encrypted)]) == 0
+        monkeypatch.setenv("SECRET_KEY", "other_key")
+
+        assert main([str(encrypted), "-o", str(output)]) == 1
+        assert "database.password" in capsys.readouterr().err
+        assert not output.exists()
+
+    def test_failed_verification_keeps_existing_output(self, plaintext_file, tmp_path, capsys):
+        """検証に失敗した場合、既存の出力ファイルが置き換えられないことを確認."""
+        output = tmp_path / "secrets.yaml.encrypted"
+        output.write_text("previous")
+
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr("config.encrypt.decode_secrets", lambda raw, key: {"database": {}})
+            assert main([str(plaintext_file), "-o", str(output), "--verify"]) == 1
+
+        assert "Verification failed" in capsys.readouterr().err
+        assert output.read_text() == "previous"
+        assert sorted(tmp_path.iterdir()) == sorted([plaintext_file, output])  # 一時ファイルも残らない
+
+    def test_parallel_encryption_spans_sections_in_order(self, monkeypatch):
+        """値の多い入力はセクションをまたいでまとめてプロセスプールで暗号化され、キーの順に出力されることを確認."""
+        monkeypatch.setattr("config.encrypt.ENCRYPT_CHUNK_SIZE", 7)
+        monkeypatch.setattr("config.encrypt.PARALLEL_ENCRYPT_THRESHOLD", 10)
+        manager = SecretManager("cli_key")
+        existing = f"encrypted:{manager.encrypt('kept')}"
+        plaintext = {f"service{i}": {"a": f"a{i}", "b": [f"b{i}", existing]} for i in range(20)}
+        data = copy.deepcopy(plaintext)
+
+        chunks = list(encrypt_sections(manager, data, workers=2))
+
+        assert len(chunks) == 1 + len(plaintext)
+        assert [next(iter(yaml.safe_load(chunk))) for chunk in chunks[1:]] == list(plaintext)
+        decoded = decode_secrets(b"".join(chunks), "cli_key")
+        expected = {f"service{i}": {"a": f"a{i}", "b": [f"b{i}", "kept"]} for i in range(20)}
+        assert decoded == expected
+        assert all(data[f"service{i}"]["b"][1] == existing for i in range(20))
+
+    def test_invalid_input_kdf_fails(self, tmp_path, monkeypatch, capsys):
+        """入力のメタデータの KDF が不正な場合、トレースバックではなくエラーを表示して失敗することを確認."""
+        monkeypatch.setenv("SECRET_KEY", "cli_key")
+        path = tmp_path / "secrets.yaml"
+        path.write_text("_meta:\n  kdf: scrypt\napi:\n  key: value\n")
+
+        assert main([str(path)]) == 1
+        assert "invalid _meta.kdf" in capsys.readouterr().err
+
+    def test_stringify_scalars_and_diff_paths(self):
+        """数値・真偽値の文字列化と、差分のパスの報告を確認."""
+        data = {"a": 1, "b": {"c": True, "d": None}, "e": [2.5, "x"]}
+
+        assert stringify_scalars(data) == ["a", "b.c", "e[0]"]
+        assert data == {"a": "1", "b": {"c": "true", "d": None}, "e": ["2.5", "x"]}
+        assert diff_paths({"a": "1", "b": {"c": "x"}}, {"a": "1", "b": {"c": "y"}, "z": 1}) == \
+            ["b.c", "z"]
@@ -0,0 +1,68 @@
+import base64
+
+import pytest
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+from config.kdf import derive_fernet_key, generate_kdf_params, normalize_kdf_params
+
+@pytest.mark.unit
+class TestKdf:
+    def test_default_matches_legacy_pbkdf2(self):
+        """メタデータがない場合は従来の PBKDF2 設定で導出されることを確認."""
+        legacy = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=b"art_gallery_salt",
+            iterations=100000,
+        )
+        expected = base64.urlsafe_b64encode(legacy.derive(b"legacy_key"))
+
+        assert derive_fernet_key("legacy_key") == expected
+        assert derive_fernet_key("legacy_key", {"name": "pbkdf2-sha256"}) == expected
+
+    def test_scrypt_depends_on_salt(self):
+        """scrypt で導出でき、ソルトが異なれば鍵も異なることを確認."""
+        first = derive_fernet_key("key", {"name": "scrypt", "n": 2**10, "salt": "AAAA"})
+        second = derive_fernet_key("key", {"name": "scrypt", "n": 2**10, "salt": "BBBB"})
+
+        Fernet(first)  # Fernet 鍵として有効
+        assert first != second
+
+    def test_raw_key_is_used_directly(self):
+        """raw の場合は secret_key をそのまま Fernet 鍵として使うことを確認."""
+        key = Fernet.generate_key()
+        assert derive_fernet_key(key.decode(), {"name": "raw"}) == key
+
+        with pytest.raises(ValueError):
+            derive_fernet_key("too-short", {"name": "raw"})
+
+    def test_unsupported_kdf_rejected(self):
+        """未対応のKDFが拒否されることを確認."""
+        with pytest.raises(ValueError):
+            normalize_kdf_params({"name": "md5"})
+
+    @pytest.mark.parametrize("params", [
+        "scrypt",
+        ["scrypt"],
+        {"name": ["scrypt"]},
+        {"name": "scrypt", "n": "16384"},
+        {"name": "scrypt", "n": 1.5},
+        {"name": "scrypt", "r": 0},
+        {"name": "pbkdf2-sha256", "iterations": True},
+        {"name": "pbkdf2-sha256", "salt": 12345},
+        {"name": "pbkdf2-sha256", "salt": "not*base64"},
+    ])
+    def test_malformed_params_rejected_with_value_error(self, params):
+        """辞書でない指定（`kdf: scrypt` など）や型・値が不正なパラメータが ValueError になることを確認."""
+        with pytest.raises(ValueError):
+            normalize_kdf_params(params)
+
+    def test_generate_kdf_params_uses_random_salt(self):
+        """新規作成用のパラメータはランダムなソルトを持つことを確認."""
+        first = generate_kdf_params("scrypt")
+        second = generate_kdf_params("scrypt")
+
+        assert first["name"] == "scrypt"
+        assert first["salt"] != second["salt"]
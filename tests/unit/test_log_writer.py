@@ -0,0 +1,90 @@
+import pytest
+import logging
+import threading
+from unittest.mock import patch
+
+from services.log_writer import BatchFlushingFileHandler, QueueLogWriter
+
+@pytest.fixture
+def log_file(tmp_path):
+    return tmp_path / "secrets.log"
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger("test_log_writer")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    yield logger
+    logger.handlers.clear()
+
+@pytest.mark.unit
+class TestQueueLogWriter:
+    def test_stop_drains_queued_records(self, log_file, logger):
+        """stop() でキューに残っているレコードが全て書き込まれることを確認."""
+        writer = QueueLogWriter(BatchFlushingFileHandler(log_file))
+        writer.start()
+        logger.addHandler(writer.queue_handler())
+
+        for i in range(100):
+            logger.info("record %d", i)
+        writer.stop()
+
+        lines = log_file.read_text().splitlines()
+        assert lines == [f"record {i}" for i in range(100)]
+
+    def test_records_are_flushed_in_batches(self, log_file, logger):
+        """キューに溜まったレコードが一度のフラッシュでまとめて書き込まれることを確認."""
+        handler = BatchFlushingFileHandler(log_file)
+        writer = QueueLogWriter(handler)
+        logger.addHandler(writer.queue_handler())
+
+        for i in range(50):
+            logger.info("record %d", i)
+
+        with patch.object(handler, "flush_batch", wraps=handler.flush_batch) as mock_flush:
+            writer.start()
+            writer.stop()
+
+        assert mock_flush.call_count == 1
+        assert len(log_file.read_text().splitlines()) == 50
+
+    def test_logging_does_not_wait_for_disk(self, log_file, logger):
+        """書き込みが遅い場合でも、ログ出力の呼び出しが待たされないことを確認."""
+        handler = BatchFlushingFileHandler(log_file)
+        release = threading.Event()
+        original_emit = handler.emit
+
+        def slow_emit(record):
+            release.wait(timeout=5)
+            original_emit(record)
+
+        writer = QueueLogWriter(handler)
+        writer.start()
+        logger.addHandler(writer.queue_handler())
+
+        with patch.object(handler, "emit", side_effect=slow_emit):
+            logger.info("blocked write")
+            logger.info("not blocked")
+            release.set()
+            writer.stop()
+
+        assert log_file.read_text().splitlines() == ["blocked write", "not blocked"]
+
+    def test_worker_handler_writes_to_separate_file(self, log_file, logger):
+        """ワーカー用のハンドラは同じ設定で別のファイルに書き込み、置き換え前のハンドラは閉じられることを確認."""
+        handler = BatchFlushingFileHandler(log_file, maxBytes=1024, backupCount=3)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        writer = QueueLogWriter(handler)
+
+        worker_handler = handler.for_worker(2)
+        writer.replace_handler(worker_handler)
+        writer.start()
+        logger.addHandler(writer.queue_handler())
+        logger.info("from worker")
+        writer.stop()
+
+        assert worker_handler.baseFilename == str(log_file.parent / "secrets.worker2.log")
+        assert (worker_handler.maxBytes, worker_handler.backupCount) == (1024, 3)
+        assert handler.stream is None
+        assert (log_file.parent / "secrets.worker2.log").read_text() == "INFO from worker\n"
+        assert not log_file.exists() or log_file.read_text() == ""
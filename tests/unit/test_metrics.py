@@ -0,0 +1,50 @@
+import pytest
+
+from services.metrics import Histogram, Metrics
+
+@pytest.mark.unit
+class TestMetrics:
+    def test_histogram_cumulative_buckets(self):
+        """ヒストグラムの累積件数・合計が正しいことを確認."""
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        assert histogram.cumulative() == [("0.1", 2), ("1.0", 3), ("+Inf", 4)]
+        assert histogram.count == 4
+        assert histogram.sum == pytest.approx(2.65)
+
+    def test_render_prometheus(self):
+        """Prometheus のテキスト形式で出力されることを確認."""
+        metrics = Metrics()
+        metrics.set_phases({"config": 0.002})
+        metrics.record_phase("kdf", 0.1)
+        metrics.record_phase("kdf", 0.1)
+        metrics.observe_request("/secrets/bundle", 0.003)
+        metrics.count_auth_failure(403)
+        metrics.count_auth_failure(403)
+        metrics.observe_token_consumption("backend", 1.5)
+
+        text = metrics.render_prometheus()
+        assert 'secrets_api_phase_seconds{phase="config"} 0.002000' in text
+        assert 'secrets_api_phase_seconds{phase="kdf"} 0.200000' in text
+        assert (
+            'secrets_api_request_duration_seconds_bucket{route="/secrets/bundle",le="0.005"} 1'
+            in text
+        )
+        assert 'secrets_api_request_duration_seconds_count{route="/secrets/bundle"} 1' in text
+        assert 'secrets_api_auth_failures_total{status="403"} 2' in text
+        assert 'secrets_api_token_consumption_seconds{service="backend"} 1.500000' in text
+
+    def test_summary_line(self):
+        """終了時のサマリーが一行にまとまることを確認."""
+        metrics = Metrics()
+        metrics.set_phases({"total": 0.25})
+        metrics.observe_request("/health", 0.001)
+        metrics.count_auth_failure(401)
+
+        summary = metrics.summary()
+        assert "\n" not in summary
+        assert "total=250.0ms" in summary
+        assert "/health=1/1.0ms" in summary
+        assert "401=1" in summary
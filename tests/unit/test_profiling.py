@@ -0,0 +1,57 @@
+import pytest
+import pstats
+import shutil
+import threading
+import tracemalloc
+from pathlib import Path
+
+from services.profiling import Profiler, redact
+
+TEST_PROFILE_DIR = Path("/tmp/test_profiling")
+
+@pytest.fixture
+def profile_dir():
+    """出力先ディレクトリを用意する."""
+    yield TEST_PROFILE_DIR
+    if TEST_PROFILE_DIR.exists():
+        shutil.rmtree(TEST_PROFILE_DIR)
+
+def busy_work():
+    """プロファイル対象の処理."""
+    return sum(i * i for i in range(10000))
+
+@pytest.mark.unit
+class TestProfiling:
+    def test_redact(self):
+        """Bearer トークンと機密情報の値が伏せ字になることを確認."""
+        text = "Authorization: Bearer abc.def password=hunter22 key=hunter2"
+        assert redact(text, ["hunter2", "hunter22"]) == (
+            "Authorization: Bearer [REDACTED] password=[REDACTED] key=[REDACTED]"
+        )
+
+    def test_dump_merges_thread_profiles(self, profile_dir):
+        """別スレッドのプロファイルもまとめて標準形式で書き出されることを確認."""
+        profiler = Profiler("startup")
+        with profiler.profile():
+            thread = threading.Thread(target=profiler.wrap(busy_work))
+            thread.start()
+            thread.join()
+
+        report_file = profiler.dump(profile_dir, ["busy_work"])
+
+        stats = pstats.Stats(str(profile_dir / "startup.prof"))
+        assert any(func[2] == "busy_work" for func in stats.stats)
+        assert tracemalloc.Snapshot.load(str(profile_dir / "startup.tracemalloc")).traces
+        assert not tracemalloc.is_tracing()
+        report = report_file.read_text()
+        assert "busy_work" not in report
+        assert "[REDACTED]" in report
+
+    def test_disabled_profiler_does_nothing(self, profile_dir):
+        """無効な場合は計測も書き出しも行わないことを確認."""
+        profiler = Profiler("startup", enabled=False)
+        assert profiler.wrap(busy_work) is busy_work
+        with profiler.profile():
+            busy_work()
+        assert profiler.dump(profile_dir) is None
+        assert not profile_dir.exists()
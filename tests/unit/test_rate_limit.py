@@ -0,0 +1,66 @@
+import pytest
+
+from services.rate_limit import MAX_RETRY_AFTER, FailureLimiter
+
+class FakeClock:
+    """テスト用に時刻を進められる時計."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.mark.unit
+class TestFailureLimiter:
+    def test_limits_after_burst_and_refills(self):
+        """容量分の失敗で制限され、時間の経過で補充されることを確認."""
+        clock = FakeClock()
+        limiter = FailureLimiter(burst=3, rate=0.5, clock=clock)
+
+        assert [limiter.record_failure("10.0.0.1") for _ in range(3)] == [False, False, True]
+        assert limiter.retry_after("10.0.0.1") == pytest.approx(2.0)
+
+        clock.now = 1.0
+        assert limiter.retry_after("10.0.0.1") == pytest.approx(1.0)
+        clock.now = 2.0
+        assert limiter.retry_after("10.0.0.1") == 0.0
+
+    def test_clients_are_independent(self):
+        """他のクライアントの失敗で制限されないことを確認."""
+        limiter = FailureLimiter(burst=1, rate=1.0, clock=FakeClock())
+        limiter.record_failure("10.0.0.1")
+
+        assert limiter.retry_after("10.0.0.1") > 0
+        assert limiter.retry_after("10.0.0.2") == 0.0
+
+    def test_tracked_clients_are_bounded(self):
+        """保持するクライアント数が上限を超えた場合、最も古いクライアントから破棄されることを確認."""
+        limiter = FailureLimiter(burst=1, rate=1.0, max_clients=2, clock=FakeClock())
+        for client in ("a", "b", "c"):
+            limiter.record_failure(client)
+
+        assert limiter.retry_after("a") == 0.0
+        assert limiter.retry_after("b") > 0
+        assert limiter.retry_after("c") > 0
+
+    def test_disabled_when_burst_is_zero(self):
+        """容量が0の場合はレート制限を行わないことを確認."""
+        limiter = FailureLimiter(burst=0)
+        assert limiter.record_failure("10.0.0.1") is False
+        assert limiter.retry_after("10.0.0.1") == 0.0
+
+    def test_zero_rate_never_refills_with_finite_retry_after(self):
+        """補充しない設定（rate=0）でも、Retry-After として返せる有限の秒数を返すことを確認."""
+        clock = FakeClock()
+        limiter = FailureLimiter(burst=1, rate=0.0, clock=clock)
+        limiter.record_failure("10.0.0.1")
+
+        clock.now = 10 * MAX_RETRY_AFTER
+        assert limiter.retry_after("10.0.0.1") == MAX_RETRY_AFTER
+        assert FailureLimiter(burst=1, rate=1e-9).retry_after("x") == 0.0
+
+    def test_negative_rate_rejected(self):
+        """負の補充レートが拒否されることを確認."""
+        with pytest.raises(ValueError):
+            FailureLimiter(burst=1, rate=-1.0)
@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+import threading
+import time
+
+from services.readiness import Readiness
+
+@pytest.mark.unit
+class TestReadiness:
+    def test_ready_when_all_stages_ready(self):
+        """全ての段階が完了した時点で準備完了になることを確認."""
+        readiness = Readiness()
+        readiness.mark_ready("config")
+        readiness.mark_ready("secrets")
+        assert readiness.is_ready() is False
+        assert readiness.snapshot()["tokens"] == {"state": "pending"}
+
+        readiness.mark_ready("tokens")
+        assert readiness.is_ready() is True
+
+    def test_wait_wakes_on_completion(self):
+        """待機中のスレッドが最後の段階の完了で起こされることを確認."""
+        readiness = Readiness(["secrets"])
+        threading.Timer(0.05, readiness.mark_ready, args=("secrets",)).start()
+
+        started_at = time.monotonic()
+        assert readiness.wait(timeout=5) is True
+        assert time.monotonic() - started_at < 1
+
+    def test_wait_returns_on_failure(self):
+        """いずれかの段階が失敗した場合は待機を打ち切り、理由を報告することを確認."""
+        readiness = Readiness(["config", "secrets"])
+        threading.Timer(0.05, readiness.mark_failed, args=("secrets", "unavailable")).start()
+
+        started_at = time.monotonic()
+        assert readiness.wait(timeout=5) is False
+        assert time.monotonic() - started_at < 1
+        assert readiness.snapshot()["secrets"] == {"state": "failed", "reason": "unavailable"}
+
+    def test_wait_times_out(self):
+        """完了しない場合はタイムアウトで戻ることを確認."""
+        readiness = Readiness(["secrets"])
+        assert readiness.wait(timeout=0.05) is False
+
+    def test_wait_async_wakes_on_change_from_another_thread(self):
+        """イベントループ上の待機が、他のスレッドからの完了・失敗の通知で起こされることを確認."""
+        async def wait_all(readiness):
+            return await asyncio.gather(*[readiness.wait_async(timeout=5) for _ in range(50)])
+
+        ready = Readiness(["secrets"])
+        threading.Timer(0.05, ready.mark_ready, args=("secrets",)).start()
+        failed = Readiness(["secrets"])
+        threading.Timer(0.05, failed.mark_failed, args=("secrets", "unavailable")).start()
+
+        started_at = time.monotonic()
+        assert asyncio.run(wait_all(ready)) == [True] * 50
+        assert asyncio.run(wait_all(failed)) == [False] * 50
+        assert time.monotonic() - started_at < 2
+        assert ready._listeners == [] and failed._listeners == []  # 待機の終了時に登録を解除する
+
+    def test_wait_async_times_out(self):
+        """完了しない場合はタイムアウトで戻ることを確認."""
+        readiness = Readiness(["secrets"])
+        assert asyncio.run(readiness.wait_async(timeout=0.05)) is False
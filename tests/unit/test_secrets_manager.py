@@ -1,5 +1,10 @@
 import pytest
-from config.secrets import SecretManager
+from unittest.mock import patch
+
+from cryptography.fernet import InvalidToken
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+from config.secrets import SecretDecryptionError, SecretManager
 
 @pytest.mark.unit
 class TestSecretManager:
@@ -48,3 +53,137 @@ class TestSecretManager:
         encrypted = manager.encrypt(plaintext)
         decrypted = manager.decrypt(encrypted)
         assert decrypted == plaintext
+
+    def test_cipher_is_cached_per_secret_key(self):
+        """同じsecret_keyでは鍵導出が一度だけ行われることを確認."""
+        SecretManager.clear_cipher_cache()
+        with patch("config.kdf.PBKDF2HMAC", wraps=PBKDF2HMAC) as mock_kdf:
+            first = SecretManager("cached_key")
+            second = SecretManager("cached_key")
+            assert mock_kdf.call_count == 1
+            assert first._cipher is second._cipher
+
+            SecretManager("another_key")
+            assert mock_kdf.call_count == 2
+
+        # キャッシュされた暗号器でも相互に復号できる
+        assert second.decrypt(first.encrypt("value")) == "value"
+
+    def test_bundle_round_trip(self):
+        """バンドル形式で暗号化した機密情報全体を復号できることを確認."""
+        manager = SecretManager("bundle_key")
+        secrets = {"database": {"password": "p@ss", "port": 5432}, "api_keys": ["a", "b"]}
+
+        bundle = manager.encrypt_bundle(secrets)
+
+        assert SecretManager.is_bundle(bundle) is True
+        assert bundle.startswith(b"ART-GALLERY-SECRETS-BUNDLE/1 ")
+        assert b"p@ss" not in bundle
+        assert manager.decrypt_bundle(bundle) == secrets
+
+    def test_bundle_rejects_tampering_and_unknown_version(self):
+        """改ざんされたバンドルや未対応のバージョンが拒否されることを確認."""
+        manager = SecretManager("bundle_key")
+        bundle = manager.encrypt_bundle({"database": {"password": "p@ss"}})
+
+        with pytest.raises(InvalidToken):
+            SecretManager("wrong_key").decrypt_bundle(bundle)
+        with pytest.raises(ValueError):
+            manager.decrypt_bundle(bundle.replace(b"/1 ", b"/9 ", 1))
+        assert SecretManager.is_bundle(b"database:\n  password: x\n") is False
+
+    def test_bundle_records_kdf_in_header(self):
+        """バンドルのヘッダーにKDFが記録され、それを使って復号できることを確認."""
+        kdf = {"name": "scrypt", "n": 2**10, "salt": "c2FsdHNhbHQ="}
+        bundle = SecretManager("bundle_key", kdf=kdf).encrypt_bundle({"k": "v"})
+
+        metadata = SecretManager.bundle_metadata(bundle)
+        assert metadata["kdf"] == {
+            "name": "scrypt", "n": 1024, "r": 8, "p": 1, "salt": "c2FsdHNhbHQ="
+        }
+
+        reader = SecretManager("bundle_key", kdf=metadata["kdf"])
+        assert reader.decrypt_bundle(bundle) == {"k": "v"}
+        with pytest.raises(InvalidToken):
+            SecretManager("bundle_key").decrypt_bundle(bundle)
+
+    def test_decrypt_tree_nested_and_lists(self):
+        """任意の深さ・リスト内の暗号化値が復号され、その場で置き換えられることを確認."""
+        manager = SecretManager("tree_key")
+        data = {
+            "database": {"password": f"encrypted:{manager.encrypt('db')}", "port": 5432},
+            "services": {"search": {"auth": {"api_key": f"encrypted:{manager.encrypt('search')}"}}},
+            "webhooks": [{"secret": f"encrypted:{manager.encrypt('hook')}"}, "plain"],
+        }
+
+        result = manager.decrypt_tree(data)
+
+        assert result is data
+        assert data == {
+            "database": {"password": "db", "port": 5432},
+            "services": {"search": {"auth": {"api_key": "search"}}},
+            "webhooks": [{"secret": "hook"}, "plain"],
+        }
+
+    def test_decrypt_tree_with_cache_decrypts_only_changed_values(self):
+        """キャッシュを指定した場合、暗号文が変わった値のみが復号されることを確認."""
+        manager = SecretManager("tree_key")
+        unchanged = f"encrypted:{manager.encrypt('same')}"
+        cache = {}
+        previous = {"a": unchanged, "b": f"encrypted:{manager.encrypt('old')}"}
+        manager.decrypt_tree(previous, cache=cache)
+        assert len(cache) == 2
+
+        data = {"a": unchanged, "b": f"encrypted:{manager.encrypt('new')}"}
+        with patch.object(manager, "decrypt_strict", wraps=manager.decrypt_strict) as mock_decrypt:
+            manager.decrypt_tree(data, cache=cache)
+
+        assert mock_decrypt.call_count == 1
+        assert data == {"a": "same", "b": "new"}
+        assert len(cache) == 2  # 置き換えられた値の平文は保持しない
+
+    def test_decrypt_tree_cache_is_bound_to_key(self):
+        """別の鍵での復号結果がキャッシュから使われないことを確認."""
+        manager = SecretManager("tree_key")
+        value = f"encrypted:{manager.encrypt('secret')}"
+        cache = {}
+        manager.decrypt_tree({"a": value}, cache=cache)
+
+        with pytest.raises(SecretDecryptionError):
+            SecretManager("other_key").decrypt_tree({"a": value}, cache=cache)
+        assert len(cache) == 1  # 失敗した場合はキャッシュを変更しない
+
+    def test_decrypt_tree_reports_failed_paths(self):
+        """復号に失敗した値のパスが報告されることを確認."""
+        manager = SecretManager("tree_key")
+        other = SecretManager("other_key")
+        data = {
+            "database": {"password": f"encrypted:{other.encrypt('x')}"},
+            "list": ["encrypted:!!not-base64!!"],
+            "ok": f"encrypted:{manager.encrypt('fine')}",
+        }
+
+        with pytest.raises(SecretDecryptionError) as exc_info:
+            manager.decrypt_tree(data)
+
+        assert set(exc_info.value.errors) == {"database.password", "list[0]"}
+        assert data["ok"] == "fine"
+        # 失敗した値は暗号文のまま残さない（辞書からは削除し、リストでは位置を保って None にする）
+        assert exc_info.value.decrypted is data
+        assert data == {"database": {}, "list": [None], "ok": "fine"}
+
+    def test_encrypt_tree_encrypts_plaintext_and_keeps_encrypted_values(self):
+        """平文の値のみが暗号化され、暗号化済みの値と文字列以外の値はそのままであることを確認."""
+        manager = SecretManager("tree_key")
+        existing = f"encrypted:{manager.encrypt('kept')}"
+        data = {"database": {"password": "db", "port": 5432}, "list": ["a", existing], "none": None}
+
+        result = manager.encrypt_tree(data)
+
+        assert result is data
+        assert SecretManager.is_encrypted(data["database"]["password"])
+        assert data["list"][1] == existing
+        assert data["database"]["port"] == 5432 and data["none"] is None
+        assert manager.decrypt_tree(data) == {
+            "database": {"password": "db", "port": 5432}, "list": ["a", "kept"], "none": None,
+        }
@@ -0,0 +1,39 @@
+import pytest
+import threading
+import time
+
+from services.startup import StartupPipeline
+
+@pytest.mark.unit
+class TestStartupPipeline:
+    def test_background_phase_overlaps_foreground(self):
+        """バックグラウンドのフェーズがフォアグラウンドと並行して実行されることを確認."""
+        pipeline = StartupPipeline()
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            time.sleep(0.1)
+
+        pipeline.run_in_background("secrets", slow)
+        with pipeline.phase("foreground"):
+            assert started.wait(timeout=1)
+            time.sleep(0.1)
+        pipeline.join()
+
+        assert pipeline.timings["secrets"] >= 0.1
+        assert pipeline.timings["foreground"] >= 0.1
+        assert pipeline.timings["total"] < 0.19
+        assert "secrets=" in pipeline.summary()
+
+    def test_join_propagates_background_error(self):
+        """バックグラウンドの処理で発生した例外が join() で送出されることを確認."""
+        pipeline = StartupPipeline()
+
+        def fail():
+            raise RuntimeError("boom")
+
+        pipeline.run_in_background("secrets", fail)
+        with pytest.raises(RuntimeError):
+            pipeline.join()
+        assert "secrets" in pipeline.timings
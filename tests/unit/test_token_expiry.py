@@ -0,0 +1,36 @@
+import pytest
+import threading
+import time
+
+from services.token_expiry import ExpiryScheduler
+
+@pytest.mark.unit
+class TestExpiryScheduler:
+    def test_expires_in_deadline_order(self):
+        """登録順に関わらず、期限の早い順にコールバックが呼ばれることを確認."""
+        expired = []
+        done = threading.Event()
+
+        def on_expire(key):
+            expired.append(key)
+            if len(expired) == 3:
+                done.set()
+
+        scheduler = ExpiryScheduler(on_expire)
+        now = time.monotonic()
+        scheduler.schedule(now + 0.15, "slow")
+        scheduler.schedule(now + 0.05, "fast")
+        scheduler.schedule(now + 0.1, "medium")
+
+        assert done.wait(timeout=2)
+        assert expired == ["fast", "medium", "slow"]
+
+    def test_clear_discards_pending_deadlines(self):
+        """clear() で登録済みの期限が破棄されることを確認."""
+        expired = []
+        scheduler = ExpiryScheduler(expired.append)
+        scheduler.schedule(time.monotonic() + 0.05, "discarded")
+        scheduler.clear()
+
+        time.sleep(0.15)
+        assert expired == []
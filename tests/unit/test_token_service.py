@@ -1,5 +1,23 @@
+import asyncio
+import fcntl
 import pytest
-from services.token_service import TokenService, DATABASE_TOKEN_FILE, BACKEND_TOKEN_FILE
+import multiprocessing
+import os
+import stat
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+from services.token_service import (
+    TokenService,
+    DATABASE_TOKEN_FILE,
+    BACKEND_TOKEN_FILE,
+    READY_MARKER,
+    TOKEN_DIR,
+    token_file_for,
+)
 
 @pytest.mark.unit
 class TestTokenService:
@@ -26,3 +44,250 @@ class TestTokenService:
             backend_token = BACKEND_TOKEN_FILE.read_text().strip()
             TokenService.verify_and_consume_token(backend_token)
             assert TokenService.check_all_tokens_consumed() is True
+
+    def test_status_and_consume_do_not_read_token_files(self, app):
+        """検証・消費時にトークンファイルを読まないことを確認."""
+        with app.app_context():
+            TokenService.generate_tokens()
+            db_token = DATABASE_TOKEN_FILE.read_text().strip()
+
+            with patch.object(Path, "read_text", side_effect=AssertionError("file read")):
+                assert TokenService.get_token_status(db_token) is True
+                assert TokenService.get_token_status("invalid_token") is False
+                assert TokenService.verify_and_consume_token(db_token) is True
+
+    def test_concurrent_consume_succeeds_once(self, app):
+        """同じトークンを並行して消費しても成功するのは一度だけであることを確認."""
+        with app.app_context():
+            TokenService.generate_tokens()
+            db_token = DATABASE_TOKEN_FILE.read_text().strip()
+
+            def consume(_):
+                with app.app_context():
+                    return TokenService.verify_and_consume_token(db_token)
+
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                results = list(executor.map(consume, range(64)))
+
+            assert results.count(True) == 1
+
+    def test_generate_tokens_for_configured_services(self, app):
+        """設定されたサービスごとにトークンが発行され、許可された機密情報のみ取得できることを確認."""
+        services = {"worker": ["database.password"], "search": ["search.api_key"]}
+        with app.app_context():
+            TokenService.generate_tokens(services)
+            worker_token = token_file_for("worker").read_text().strip()
+            search_token = token_file_for("search").read_text().strip()
+
+            # 許可されていない機密情報の場合は消費されない
+            assert TokenService.consume_token(search_token, "database.password") is None
+            assert TokenService.get_token_status(search_token) is True
+
+            entry = TokenService.consume_token(worker_token, "database.password")
+            assert entry.service == "worker"
+            assert entry.secrets == ("database.password",)
+            assert not token_file_for("worker").exists()
+            assert TokenService.consume_token(search_token).service == "search"
+            assert TokenService.check_all_tokens_consumed() is True
+
+    def test_tokens_expire_individually(self, app):
+        """トークンごとの有効期限で個別に失効することを確認."""
+        with app.app_context():
+            TokenService.generate_tokens(ttls={"database": 0.05, "backend": 60})
+            db_token = DATABASE_TOKEN_FILE.read_text().strip()
+            backend_token = BACKEND_TOKEN_FILE.read_text().strip()
+
+            time.sleep(0.2)
+
+            assert TokenService.get_token_status(db_token) is False
+            assert TokenService.verify_and_consume_token(db_token) is False
+            assert not DATABASE_TOKEN_FILE.exists()
+            assert TokenService.expired_services() == ["database"]
+
+            assert TokenService.verify_and_consume_token(backend_token) is True
+            assert TokenService.wait_for_all_consumed(timeout=0) is True
+
+    def test_expired_token_rejected_before_eviction(self, app):
+        """スケジューラによる削除前でも、期限切れのトークンは拒否されることを確認."""
+        with app.app_context():
+            with patch("services.token_service._expiry_scheduler"):
+                TokenService.generate_tokens(ttls={"database": 0, "backend": 60})
+            db_token = DATABASE_TOKEN_FILE.read_text().strip()
+
+            assert TokenService.get_token_status(db_token) is False
+            assert TokenService.consume_token(db_token) is None
+
+    def test_cross_process_consume_succeeds_once(self, app):
+        """複数のプロセスが同じトークンを同時に消費しても成功するのは一つだけであることを確認."""
+        with app.app_context():
+            TokenService.generate_tokens()
+            db_token = DATABASE_TOKEN_FILE.read_text().strip()
+
+        barrier = multiprocessing.get_context("fork").Barrier(8)
+        pids = []
+        for _ in range(8):
+            pid = os.fork()
+            if pid == 0:
+                # 子プロセス: 全員が揃ってから消費を試み、結果を終了コードで返す
+                try:
+                    barrier.wait(timeout=5)
+                    with app.app_context():
+                        consumed = TokenService.verify_and_consume_token(db_token)
+                    os._exit(0 if consumed else 1)
+                except BaseException:
+                    os._exit(2)
+            pids.append(pid)
+
+        exit_codes = [os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) for pid in pids]
+        assert sorted(exit_codes) == [0] + [1] * 7
+        assert not DATABASE_TOKEN_FILE.exists()
+
+    def test_wait_for_all_consumed_async(self, app):
+        """全てのトークンが消費された時点で、イベントループ上の待機が終わることを確認."""
+        with app.app_context():
+            TokenService.generate_tokens()
+        tokens = [DATABASE_TOKEN_FILE.read_text().strip(), BACKEND_TOKEN_FILE.read_text().strip()]
+
+        async def scenario():
+            waiter = asyncio.create_task(TokenService.wait_for_all_consumed_async())
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, TokenService.verify_and_consume_token, tokens[0])
+            await asyncio.sleep(0.05)
+            assert not waiter.done()
+            await loop.run_in_executor(None, TokenService.verify_and_consume_token, tokens[1])
+            await asyncio.wait_for(waiter, 5)
+            # 全て消費済みの場合はすぐに戻る
+            await asyncio.wait_for(TokenService.wait_for_all_consumed_async(), 1)
+
+        asyncio.run(scenario())
+
+    def test_tokens_published_atomically_with_ready_marker(self, app):
+        """トークンファイルが権限 0600 で rename により公開され、最後に完了マーカーが置かれることを確認."""
+        published = []
+        real_replace = os.replace
+
+        def record_replace(src, dst):
+            # 公開前の一時ファイルは作成時点から 0600 であること
+            assert stat.S_IMODE(os.stat(src).st_mode) == 0o600
+            published.append(Path(dst).name)
+            real_replace(src, dst)
+
+        with app.app_context(), patch("services.token_service.os.replace", record_replace):
+            TokenService.generate_tokens({"database": [], "backend": [], "worker": []})
+
+        assert published == [
+            "database_token.txt", "backend_token.txt", "worker_token.txt", READY_MARKER.name,
+        ]
+        batch_line, *services = READY_MARKER.read_text().splitlines()
+        assert batch_line.startswith("batch=")
+        assert services == ["database", "backend", "worker"]
+        for service in ("database", "backend", "worker"):
+            assert stat.S_IMODE(os.stat(token_file_for(service)).st_mode) == 0o600
+        assert not list(TOKEN_DIR.glob(".*.tmp"))
+
+    def test_staged_files_synced_once_before_publication(self, app):
+        """一時ファイルの内容が一度の同期で書き出されてから、rename で公開されることを確認."""
+        events = []
+        real_replace = os.replace
+
+        def record_replace(src, dst):
+            events.append(("replace", Path(dst).name))
+            real_replace(src, dst)
+
+        with app.app_context(), \
+             patch("services.token_service._sync_filesystem",
+                   side_effect=lambda directory: events.append(("sync", directory))), \
+             patch("services.token_service.os.replace", record_replace):
+            TokenService.generate_tokens()
+
+        assert events[0] == ("sync", TOKEN_DIR)
+        assert [event for event in events if event[0] == "sync"] == [("sync", TOKEN_DIR)]
+        assert [name for kind, name in events[1:]] == [
+            "database_token.txt", "backend_token.txt", READY_MARKER.name,
+        ]
+
+    def test_published_token_is_usable_on_first_sight(self, app):
+        """ファイルが公開された時点で、トークンが既にレジストリに登録されていることを確認."""
+        results = []
+        real_replace = os.replace
+
+        def check_after_replace(src, dst):
+            real_replace(src, dst)
+            if Path(dst) == DATABASE_TOKEN_FILE:
+                results.append(TokenService.get_token_status(DATABASE_TOKEN_FILE.read_text()))
+
+        with app.app_context(), patch("services.token_service.os.replace", check_after_replace):
+            TokenService.generate_tokens()
+
+        assert results == [True]
+
+    def test_failed_generation_leaves_no_partial_batch(self, app):
+        """書き込みに失敗した場合、一時ファイルと完了マーカーが残らないことを確認."""
+        with app.app_context():
+            TokenService.generate_tokens()
+        assert READY_MARKER.exists()
+
+        real_mkstemp = tempfile.mkstemp
+        calls = []
+
+        def failing_mkstemp(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            return real_mkstemp(*args, **kwargs)
+
+        with app.app_context(), patch("services.token_service.tempfile.mkstemp", failing_mkstemp):
+            with pytest.raises(OSError):
+                TokenService.generate_tokens()
+
+        assert not READY_MARKER.exists()
+        assert not list(TOKEN_DIR.glob(".*.tmp"))
+
+    def test_ready_marker_locked_until_all_consumed(self, app):
+        """完了マーカーはバッチが有効な間ロックされ、全てのトークンの消費後に削除されることを確認."""
+        with app.app_context():
+            TokenService.generate_tokens()
+            db_token = DATABASE_TOKEN_FILE.read_text().strip()
+            backend_token = BACKEND_TOKEN_FILE.read_text().strip()
+
+            fd = os.open(READY_MARKER, os.O_RDONLY)
+            try:
+                with pytest.raises(BlockingIOError):
+                    fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            finally:
+                os.close(fd)
+
+            assert TokenService.verify_and_consume_token(db_token) is True
+            assert READY_MARKER.exists()
+            assert TokenService.verify_and_consume_token(backend_token) is True
+            assert not READY_MARKER.exists()
+
+    def test_ready_marker_removed_on_expiry_and_deletion(self, app):
+        """全てのトークンの失効時と、残りのトークンの削除時に完了マーカーが削除されることを確認."""
+        with app.app_context():
+            TokenService.generate_tokens(ttls={"database": 0.05, "backend": 0.05})
+            assert TokenService.wait_for_all_consumed(timeout=5) is True
+            assert not READY_MARKER.exists()
+
+            TokenService.generate_tokens()
+            TokenService.delete_remaining_tokens()
+            assert not READY_MARKER.exists()
+            assert not DATABASE_TOKEN_FILE.exists()
+            assert not BACKEND_TOKEN_FILE.exists()
+
+    def test_remove_stale_batch(self, app):
+        """異常終了したプロセスが残した完了マーカーと、記載されたトークンファイルが削除されることを確認."""
+        TOKEN_DIR.mkdir(parents=True, exist_ok=True)
+        READY_MARKER.write_text("batch=deadbeef\ndatabase\nbackend\n")
+        DATABASE_TOKEN_FILE.write_text("stale")
+        BACKEND_TOKEN_FILE.write_text("stale")
+        unrelated = TOKEN_DIR / "notes.txt"
+        unrelated.write_text("keep")
+
+        TokenService.remove_stale_batch()
+
+        assert not READY_MARKER.exists()
+        assert not DATABASE_TOKEN_FILE.exists()
+        assert not BACKEND_TOKEN_FILE.exists()
+        assert unrelated.read_text() == "keep"
+        unrelated.unlink()